@@ -0,0 +1,257 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import bindparam, func, update
+
+from extensions import db
+from models import User, ViewAnalytics
+from rollups import record_view_updates
+
+
+class HeartbeatBuffer:
+    """Write-coalescing buffer for player heartbeats (/api/analytics/update).
+
+    Heartbeats are kept in memory, keyed by view_id, so only the latest position
+    of each view survives until the next flush. Every ANALYTICS_FLUSH_INTERVAL
+    seconds a background thread writes the whole batch with one executemany
+    UPDATE for ViewAnalytics and one for the aggregated student XP, and moves
+    the VideoStats rollups by the difference in the same transaction. Watched
+    intervals reported by the player are merged into VideoRetention histograms
+    in that transaction too.
+
+    Each heartbeat is also appended to a journal file before it is acknowledged.
+    The journal is rotated on every flush and deleted once the batch is
+    committed; leftovers from a crash are replayed on start, which gives
+    at-least-once delivery. Replayed XP may be awarded twice.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._oldest = None
+        self._journal = None
+        self._rotated = []
+        self._thread = None
+        self._stop = threading.Event()
+        self._metrics = {
+            'flushes': 0,
+            'heartbeats': 0,
+            'rows_written': 0,
+            'last_flush_at': None,
+            'last_flush_lag': 0.0,
+            'max_flush_lag': 0.0,
+            'last_flush_seconds': 0.0,
+            'last_error': None
+        }
+
+    def init_app(self, app):
+        app.config.setdefault('ANALYTICS_FLUSH_INTERVAL', 2)
+        app.config.setdefault('ANALYTICS_JOURNAL', os.path.join(app.instance_path, 'heartbeats.journal'))
+        self.app = app
+        app.extensions['heartbeat_buffer'] = self
+        atexit.register(self.shutdown)
+
+    @property
+    def journal_path(self):
+        return self.app.config['ANALYTICS_JOURNAL']
+
+    def start(self):
+        """Replay any journal left by a previous process and start the flush thread (idempotent)."""
+        with self._lock:
+            if self._thread:
+                return
+            os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+            leftovers = sorted(glob.glob(self.journal_path + '.*')) + [self.journal_path]
+            for path in leftovers:
+                if os.path.exists(path):
+                    with open(path) as f:
+                        for line in f:
+                            try:
+                                self._coalesce(**json.loads(line))
+                            except (ValueError, TypeError):
+                                continue  # Torn final line from a crash
+            self._journal = open(self.journal_path, 'a')
+            for path in leftovers:
+                if path != self.journal_path and os.path.exists(path):
+                    os.remove(path)
+            # Replayed heartbeats are now only in memory; keep them in the live journal too
+            for view_id, entry in self._pending.items():
+                record = self._journal_record(view_id, entry, intervals=entry['intervals'])
+                self._journal.write(json.dumps(dict(record, beats=entry['beats'])) + '\n')
+            self._journal.flush()
+            self._thread = threading.Thread(target=self._run, name='heartbeat-flusher', daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        """Stop the flush thread and write whatever is still buffered."""
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join(timeout=10)
+        self._thread = None
+        self.flush()
+
+    def record(self, view_id, user_id, position, total_duration=None, award_xp=False, intervals=()):
+        if not self._thread:
+            self.start()
+        with self._lock:
+            entry = self._coalesce(view_id, user_id, position, total_duration, award_xp,
+                                   ts=datetime.utcnow().isoformat(), intervals=intervals)
+            self._journal.write(json.dumps(self._journal_record(view_id, entry, award_xp, intervals)) + '\n')
+            self._journal.flush()
+            self._metrics['heartbeats'] += 1
+
+    def _journal_record(self, view_id, entry, award_xp=False, intervals=()):
+        return {
+            'view_id': view_id, 'user_id': entry['user_id'], 'position': entry['position'],
+            'total_duration': entry['total_duration'], 'award_xp': award_xp, 'ts': entry['ts'],
+            'intervals': list(intervals)
+        }
+
+    def _coalesce(self, view_id, user_id, position, total_duration=None, award_xp=False, ts=None, beats=None,
+                  intervals=()):
+        entry = self._pending.get(view_id)
+        if entry is None:
+            entry = self._pending[view_id] = {'beats': 0, 'completed': False, 'intervals': []}
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+        entry.update(user_id=user_id, position=position, total_duration=total_duration, ts=ts)
+        entry['intervals'].extend(tuple(pair) for pair in intervals)
+        if total_duration and total_duration > 0 and position / total_duration * 100 >= 90:
+            entry['completed'] = True
+        if beats is not None:
+            entry['beats'] += beats
+        elif award_xp:
+            entry['beats'] += 1
+        return entry
+
+    def _run(self):
+        interval = self.app.config['ANALYTICS_FLUSH_INTERVAL']
+        while not self._stop.wait(interval):
+            self.flush()
+
+    def flush(self):
+        """Write the buffered batch. On failure the batch is merged back and retried next time."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            oldest, self._oldest = self._oldest, None
+            # Rotate the journal so heartbeats arriving during the write go to a fresh file
+            rotated = f'{self.journal_path}.{time.time_ns()}'
+            self._journal.close()
+            os.replace(self.journal_path, rotated)
+            self._journal = open(self.journal_path, 'a')
+            # Journals of earlier failed flushes are covered by this batch too
+            self._rotated.append(rotated)
+            rotated_files = list(self._rotated)
+
+        started = time.monotonic()
+        try:
+            with self.app.app_context():
+                written = self._write(batch)
+        except Exception as e:
+            print(f"Heartbeat flush failed, will retry: {e}")
+            with self._lock:
+                self._metrics['last_error'] = str(e)
+                for view_id, entry in batch.items():
+                    newer = self._pending.get(view_id)
+                    if newer:
+                        newer['beats'] += entry['beats']
+                        newer['completed'] = newer['completed'] or entry['completed']
+                        newer['intervals'][:0] = entry['intervals']
+                    else:
+                        self._pending[view_id] = entry
+                if self._oldest is None or oldest < self._oldest:
+                    self._oldest = oldest
+            return 0
+
+        finished = time.monotonic()
+        with self._lock:
+            for path in rotated_files:
+                self._rotated.remove(path)
+                if os.path.exists(path):
+                    os.remove(path)
+            lag = finished - oldest
+            self._metrics['flushes'] += 1
+            self._metrics['rows_written'] += written
+            self._metrics['last_flush_at'] = datetime.utcnow().isoformat()
+            self._metrics['last_flush_lag'] = round(lag, 3)
+            self._metrics['max_flush_lag'] = round(max(self._metrics['max_flush_lag'], lag), 3)
+            self._metrics['last_flush_seconds'] = round(finished - started, 3)
+            self._metrics['last_error'] = None
+        return written
+
+    def _write(self, batch):
+        # Heartbeats are only applied to views owned by the user who sent them. The
+        # current values come along so the rollup tables can be moved by the delta.
+        current = {
+            row.id: row for row in db.session.query(
+                ViewAnalytics.id, ViewAnalytics.user_id, ViewAnalytics.video_id, ViewAnalytics.start_time,
+                ViewAnalytics.duration_seconds, ViewAnalytics.percent_watched, ViewAnalytics.completed
+            ).filter(ViewAnalytics.id.in_(list(batch)))
+        }
+        rows = []
+        changes = []
+        watched = {}
+        durations = {}
+        xp = {}
+        for view_id, entry in batch.items():
+            old = current.get(view_id)
+            if old is None or old.user_id != entry['user_id']:
+                continue
+            row = {
+                'id': view_id,
+                'duration_seconds': int(entry['position']),
+                'end_time': datetime.fromisoformat(entry['ts']) if entry['ts'] else datetime.utcnow()
+            }
+            if entry['total_duration'] and entry['total_duration'] > 0:
+                row['percent_watched'] = entry['position'] / entry['total_duration'] * 100
+            if entry['completed']:
+                row['completed'] = True
+            rows.append(row)
+            old = old._asdict()
+            changes.append((old, {
+                'duration_seconds': row['duration_seconds'],
+                'percent_watched': row.get('percent_watched', old['percent_watched']),
+                'completed': row.get('completed', old['completed'])
+            }))
+            if entry['intervals']:
+                watched.setdefault(old['video_id'], []).extend(entry['intervals'])
+                if entry['total_duration']:
+                    durations[old['video_id']] = max(durations.get(old['video_id'], 0), entry['total_duration'])
+            if entry['beats']:
+                xp[entry['user_id']] = xp.get(entry['user_id'], 0) + entry['beats']
+
+        if rows:
+            # ORM bulk UPDATE by primary key: one executemany per distinct column set
+            db.session.execute(update(ViewAnalytics), rows)
+            record_view_updates(changes)
+            from retention import merge_intervals  # Imported here so numpy stays out of startup
+            merge_intervals(watched, durations)
+        if xp:
+            user_table = User.__table__
+            db.session.execute(
+                user_table.update()
+                .where(user_table.c.id == bindparam('uid'))
+                .values(xp=func.coalesce(user_table.c.xp, 0) + bindparam('inc')),
+                [{'uid': uid, 'inc': inc} for uid, inc in xp.items()]
+            )
+        db.session.commit()
+        return len(rows)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._metrics)
+            stats['buffered_views'] = len(self._pending)
+            stats['current_lag'] = round(time.monotonic() - self._oldest, 3) if self._oldest else 0.0
+        return stats
+
+
+heartbeat_buffer = HeartbeatBuffer()
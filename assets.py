@@ -0,0 +1,89 @@
+import os
+import shutil
+
+from database import dialect_insert
+from extensions import db
+from models import MediaAsset, Video
+
+OUTPUT_FIELDS = ('hls_playlist_path', 'thumbnail_path', 'preview_track_path')
+
+
+def asset_folder(asset):
+    """HLS_FOLDER-relative directory of an asset's outputs."""
+    return f'media/{asset.digest}'
+
+def acquire_asset(digest, size):
+    """Get or create the asset for these bytes and take a reference to it.
+
+    The insert ignores a concurrent upload of the same file, and the count is
+    raised with a single UPDATE, so simultaneous uploads neither duplicate the
+    asset nor lose a reference.
+    """
+    insert = dialect_insert(MediaAsset)
+    while True:
+        if insert is not None:
+            db.session.execute(insert.values(digest=digest, size=size, status='pending', ref_count=0)
+                               .on_conflict_do_nothing(index_elements=['digest']))
+        asset = MediaAsset.query.filter_by(digest=digest).populate_existing().first()
+        if asset is None:
+            asset = MediaAsset(digest=digest, size=size, status='pending', ref_count=0)
+            db.session.add(asset)
+            db.session.flush()
+        # Zero rows means the last holder released it since the lookup; create it again
+        if MediaAsset.query.filter_by(id=asset.id).update(
+                {'ref_count': MediaAsset.ref_count + 1}, synchronize_session=False):
+            db.session.refresh(asset)
+            return asset
+
+def release_asset(asset_id, hls_folder):
+    """Drop one reference. Returns the directory to remove once committed, if this was the last one."""
+    MediaAsset.query.filter_by(id=asset_id).update({'ref_count': MediaAsset.ref_count - 1}, synchronize_session=False)
+    asset = MediaAsset.query.filter_by(id=asset_id).populate_existing().first()
+    if asset is None or asset.ref_count > 0:
+        return None
+    db.session.delete(asset)
+    return os.path.join(hls_folder, asset_folder(asset))
+
+def link_video(video, asset):
+    """Point a video at an asset's finished outputs."""
+    for field in OUTPUT_FIELDS:
+        setattr(video, field, getattr(asset, field))
+    video.status = 'completed'
+    video.processing_progress = 100
+
+def complete_asset(asset, video):
+    """Record the outputs `video` just produced and finish every other video waiting on the same bytes.
+
+    Returns the videos it finished, whose progress the caller publishes once committed.
+    """
+    for field in OUTPUT_FIELDS:
+        setattr(asset, field, getattr(video, field))
+    asset.status = 'completed'
+    waiting = Video.query.filter(Video.asset_id == asset.id, Video.id != video.id,
+                                 Video.status != 'completed').all()
+    for other in waiting:
+        link_video(other, asset)
+    return waiting
+
+def claim_asset(asset):
+    """Make the caller the only job encoding these bytes. False if another job already holds the asset.
+
+    A single conditional UPDATE, so of two workers (or processes) racing for
+    the same asset exactly one wins, whatever the order their jobs were queued in.
+    """
+    claimed = MediaAsset.query.filter_by(id=asset.id, status='pending').update(
+        {'status': 'encoding'}, synchronize_session=False)
+    db.session.commit()
+    return bool(claimed)
+
+def unclaim_asset(asset_id):
+    """Hand a failed encode back, so the next job for the same bytes can take it."""
+    MediaAsset.query.filter_by(id=asset_id, status='encoding').update({'status': 'pending'}, synchronize_session=False)
+    db.session.commit()
+
+def remove_outputs(path):
+    try:
+        if path and os.path.exists(path):
+            shutil.rmtree(path)
+    except Exception as e:
+        print(f"File deletion error: {e}")
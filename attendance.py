@@ -0,0 +1,80 @@
+from datetime import datetime
+
+from database import dialect_insert
+from extensions import db
+from models import Attendance, User, student_classes
+from reports import month_bounds
+
+STATUSES = ('Present', 'Late', 'Absent')
+LATE_WARNING = 3  # Lates in a calendar month before the parent is notified
+ABSENT_STREAK = 3  # Consecutive absent records before the compensation warning
+
+
+def default_status(now):
+    """Present within 5 minutes of the 9:10 start, Late after that."""
+    class_start = now.replace(hour=9, minute=10, second=0, microsecond=0)
+    return 'Present' if (now - class_start).total_seconds() / 60 <= 5 else 'Late'
+
+def upsert_attendance(class_id, statuses, day, now=None):
+    """Write {student_id: status} for one class and day with a single INSERT ... ON CONFLICT executemany.
+
+    Backends without upserts fall back to a lookup of the day's existing rows.
+    """
+    now = now or datetime.utcnow()
+    rows = [{'student_id': student_id, 'classroom_id': class_id, 'date': day, 'status': status, 'arrival_time': now}
+            for student_id, status in statuses.items()]
+    if not rows:
+        return
+    insert = dialect_insert(Attendance)
+    if insert is not None:
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=['student_id', 'classroom_id', 'date'],
+            set_={'status': insert.excluded.status, 'arrival_time': insert.excluded.arrival_time}
+        ), rows)
+        return
+    existing = {record.student_id: record for record in Attendance.query.filter(
+        Attendance.classroom_id == class_id, Attendance.date == day, Attendance.student_id.in_(list(statuses)))}
+    for row in rows:
+        record = existing.get(row['student_id'])
+        if record is None:
+            db.session.add(Attendance(**row))
+        else:
+            record.status = row['status']
+            record.arrival_time = row['arrival_time']
+
+def enrolled_students(class_id, student_ids):
+    """The subset of student_ids enrolled in the class, in one query."""
+    return set(db.session.scalars(db.select(student_classes.c.student_id).where(
+        student_classes.c.classroom_id == class_id, student_classes.c.student_id.in_(list(student_ids)))))
+
+def late_warnings(student_ids, day):
+    """[(student_id, username, lates)] for students late LATE_WARNING+ times in day's month, across all classes."""
+    start, end = month_bounds(day)
+    return db.session.query(Attendance.student_id, User.username, db.func.count(Attendance.id)).join(
+        User, User.id == Attendance.student_id
+    ).filter(
+        Attendance.student_id.in_(list(student_ids)),
+        Attendance.status == 'Late',
+        Attendance.date >= start,
+        Attendance.date < end
+    ).group_by(Attendance.student_id, User.username).having(
+        db.func.count(Attendance.id) >= LATE_WARNING
+    ).order_by(Attendance.student_id).all()
+
+def absence_streaks(student_ids):
+    """[(student_id, username)] whose latest ABSENT_STREAK records are all Absent.
+
+    One window-function query for the whole class instead of a last-3 lookup per student.
+    """
+    ranked = db.session.query(
+        Attendance.student_id,
+        Attendance.status,
+        db.func.row_number().over(partition_by=Attendance.student_id,
+                                  order_by=(Attendance.date.desc(), Attendance.id.desc())).label('recency')
+    ).filter(Attendance.student_id.in_(list(student_ids))).subquery()
+    absent = db.func.sum(db.case((ranked.c.status == 'Absent', 1), else_=0))
+    return db.session.query(ranked.c.student_id, User.username).join(
+        User, User.id == ranked.c.student_id
+    ).filter(ranked.c.recency <= ABSENT_STREAK).group_by(ranked.c.student_id, User.username).having(
+        db.and_(db.func.count() == ABSENT_STREAK, absent == ABSENT_STREAK)
+    ).order_by(ranked.c.student_id).all()
@@ -0,0 +1,78 @@
+"""Compare the FTS5 search index with the old LIKE '%q%' title scan.
+
+    python benchmarks/search_benchmark.py [--videos 100000] [--repeat 20]
+
+Builds a throwaway SQLite database in a temporary directory, fills it with
+synthetic videos and playlists, then times both paths for a few queries.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from extensions import db
+from models import Playlist, User, Video
+from search import install_search_index, search
+
+WORDS = ('algebra calculus geometry physics chemistry biology history grammar essay lecture revision '
+         'introduction advanced basics chapter lesson exam practice theory lab quadratic equations '
+         'photosynthesis thermodynamics vectors matrices probability statistics poetry shakespeare').split()
+QUERIES = ['quadratic', 'photo', 'calculus lecture', 'advanced vectors practice', 'shakes']
+
+
+def build(videos, playlists):
+    admin_id = db.session.execute(db.insert(User).values(username='bench', password_hash='x', role='teacher')).inserted_primary_key[0]
+    rng = random.Random(42)
+    rows = [{'title': ' '.join(rng.choices(WORDS, k=rng.randint(3, 8))), 'filename': f'{i}.mp4',
+             'uploader_id': admin_id, 'status': 'completed'} for i in range(videos)]
+    for i in range(0, len(rows), 10000):
+        db.session.execute(db.insert(Video), rows[i:i + 10000])
+    db.session.execute(db.insert(Playlist), [{'title': ' '.join(rng.choices(WORDS, k=3)), 'creator_id': admin_id}
+                                             for _ in range(playlists)])
+    db.session.commit()
+
+def timed(fn, repeat):
+    fn()  # Warm the page cache
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--videos', type=int, default=100000)
+    parser.add_argument('--playlists', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            install_search_index()
+            start = time.perf_counter()
+            build(args.videos, args.playlists)
+            print(f"Inserted {args.videos} videos and {args.playlists} playlists with triggers "
+                  f"in {time.perf_counter() - start:.1f}s")
+
+            print(f"{'query':<28}{'LIKE ms':>10}{'rows':>8}{'FTS5 ms':>10}{'rows':>8}")
+            for q in QUERIES:
+                like_ms, like_rows = timed(lambda: (
+                    Playlist.query.filter(Playlist.title.contains(q)).all(),
+                    Video.query.filter(Video.title.contains(q), Video.status == 'completed').all()
+                ), args.repeat)
+                fts_ms, (hits, _) = timed(lambda: search(q, kinds=['playlist', 'video'], per_page=50), args.repeat)
+                print(f"{q:<28}{like_ms:>10.2f}{sum(map(len, like_rows)):>8}{fts_ms:>10.2f}{len(hits):>8}")
+    print("LIKE returns every unranked match; FTS5 returns the 50 best by BM25 with prefix matching.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Readers and writers against SQLite under the 'basic' and 'production' profiles.
+
+    python benchmarks/sqlite_concurrency_benchmark.py [--seconds 10] [--writers 4] [--readers 8]
+
+Writers mimic heartbeat flushes and chat posts (small UPDATE/INSERT + commit);
+readers run the analytics summary aggregate. With the rollback journal a commit
+locks readers out; with WAL both proceed, which shows up as reader latency and
+'database is locked' errors.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+
+from database import init_database, read_session
+from extensions import db
+from models import ChatMessage, Classroom, User, Video, ViewAnalytics
+
+
+def make_app(path, profile, readonly):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLITE_PROFILE'] = profile
+    app.config['SQLITE_READONLY_ENGINE'] = readonly
+    # The SQLite default busy timeout, so the basic profile behaves as before
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'check_same_thread': False, 'timeout': 5}}
+    init_database(app)
+    return app
+
+def seed(views, videos):
+    teacher = User(username='teacher', password_hash='x', role='teacher')
+    db.session.add(teacher)
+    db.session.flush()
+    classroom = Classroom(name='bench', teacher_id=teacher.id)
+    db.session.add(classroom)
+    db.session.execute(db.insert(Video), [{'title': f'v{i}', 'filename': f'{i}.mp4', 'uploader_id': teacher.id,
+                                           'status': 'completed'} for i in range(videos)])
+    video_ids = [v for (v,) in db.session.query(Video.id)]
+    db.session.execute(db.insert(ViewAnalytics), [{'user_id': teacher.id, 'video_id': random.choice(video_ids),
+                                                   'duration_seconds': 0} for _ in range(views)])
+    db.session.commit()
+    return teacher.id, classroom.id
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))] * 1000 if values else 0.0
+
+def run(app, seconds, writers, readers, views, user_id, class_id):
+    stop = threading.Event()
+    stats = {'write': [], 'read': [], 'locked': 0}
+    lock = threading.Lock()
+
+    def writer():
+        with app.app_context():
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    db.session.query(ViewAnalytics).filter_by(id=random.randint(1, views)).update(
+                        {'duration_seconds': ViewAnalytics.duration_seconds + 1})
+                    db.session.add(ChatMessage(classroom_id=class_id, user_id=user_id, content='hi'))
+                    db.session.commit()
+                except OperationalError:
+                    db.session.rollback()
+                    with lock:
+                        stats['locked'] += 1
+                    continue
+                with lock:
+                    stats['write'].append(time.perf_counter() - start)
+
+    def reader():
+        with app.app_context():
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    session = read_session()
+                    session.query(ViewAnalytics.video_id, db.func.count(), db.func.sum(ViewAnalytics.duration_seconds)) \
+                        .group_by(ViewAnalytics.video_id).all()
+                    session.rollback()  # End the read transaction so the next one sees new commits
+                except OperationalError:
+                    with lock:
+                        stats['locked'] += 1
+                    continue
+                with lock:
+                    stats['read'].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)] + \
+              [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--views', type=int, default=50000)
+    parser.add_argument('--videos', type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'profile':<22}{'writes/s':>10}{'w p95 ms':>10}{'reads/s':>10}{'r p95 ms':>10}{'locked':>8}")
+    for profile, readonly in (('basic', False), ('production', False), ('production', True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            app = make_app(os.path.join(tmp, 'bench.db'), profile, readonly)
+            with app.app_context():
+                db.create_all()
+                user_id, class_id = seed(args.views, args.videos)
+            stats = run(app, args.seconds, args.writers, args.readers, args.views, user_id, class_id)
+            with app.app_context():
+                db.session.remove()
+                for engine in db.engines.values():
+                    engine.dispose()
+        label = profile + (' +readonly' if readonly else '')
+        print(f"{label:<22}{len(stats['write']) / args.seconds:>10.0f}{percentile(stats['write'], 0.95):>10.1f}"
+              f"{len(stats['read']) / args.seconds:>10.0f}{percentile(stats['read'], 0.95):>10.1f}{stats['locked']:>8}")
+
+
+if __name__ == '__main__':
+    main()
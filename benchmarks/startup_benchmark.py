@@ -0,0 +1,95 @@
+"""Measure cold start and per-test app setup, optionally recording the result.
+
+    python benchmarks/startup_benchmark.py [--runs 10] [--record benchmarks/startup_history.jsonl]
+
+Cold start is `import app` plus create_app() in a fresh interpreter, timed
+inside the child so interpreter startup is excluded. Per-test setup is what
+the conftest.py fixtures pay for every test: create_app() on an in-memory
+database, db.create_all() and a first request. --record appends one JSON line
+per run (commit, timings in ms) so regressions show up in the history.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+COLD_START = """
+import sys, time
+start = time.perf_counter()
+import app
+app.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'UPLOAD_FOLDER': sys.argv[1], 'HLS_FOLDER': sys.argv[1],
+                'UPLOAD_TMP_FOLDER': sys.argv[1]})
+print(time.perf_counter() - start)
+"""
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def summary(seconds):
+    ms = [s * 1000 for s in seconds]
+    return {'median_ms': round(statistics.median(ms), 1), 'p95_ms': round(percentile(ms, 95), 1)}
+
+def cold_start(runs, folder):
+    return [float(subprocess.run([sys.executable, '-c', COLD_START, folder], cwd=ROOT, check=True,
+                                 capture_output=True, text=True).stdout)
+            for _ in range(runs)]
+
+def test_setup(runs, folder):
+    from app import create_app
+    from extensions import db
+
+    config = {'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'UPLOAD_FOLDER': folder,
+              'HLS_FOLDER': folder, 'UPLOAD_TMP_FOLDER': folder}
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        app = create_app(config)
+        with app.app_context():
+            db.create_all()
+            app.test_client().get('/healthz')
+            timings.append(time.perf_counter() - start)
+            db.engine.dispose()
+    return timings
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--record', help='append the result as a JSON line to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = {
+            'commit': current_commit(),
+            'recorded_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'cold_start': summary(cold_start(args.runs, tmp)),
+            'test_setup': summary(test_setup(args.runs, tmp)),
+        }
+    for name in ('cold_start', 'test_setup'):
+        print(f"{name:<12}median {result[name]['median_ms']:>8.1f} ms   p95 {result[name]['p95_ms']:>8.1f} ms")
+    if args.record:
+        with open(args.record, 'a') as f:
+            f.write(json.dumps(result) + '\n')
+        print(f"Recorded in {args.record}")
+
+
+if __name__ == '__main__':
+    main()
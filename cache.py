@@ -0,0 +1,233 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from database import read_session
+from events import broker, relay
+from extensions import db
+from models import Attendance, Playlist, SiteSettings, User, Video
+
+try:
+    import redis
+except ImportError:  # Only needed for CACHE_BACKEND = 'redis'
+    redis = None
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry expiry. Each worker process has its own copy."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Redis (or any server speaking its protocol) shared by all workers.
+
+    Values are pickled; eviction is left to the server's maxmemory-policy
+    (allkeys-lru) and expiry to SETEX.
+    """
+
+    def __init__(self, url, prefix='good:'):
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND is 'redis' but the redis package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.evictions = 0
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.setex(self.prefix + key, max(1, int(ttl)), pickle.dumps(value))
+
+    def delete(self, keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def size(self):
+        return None
+
+
+class Cache:
+    """Read-through cache for dashboard data with explicit invalidation.
+
+    Only plain values (dicts, lists, numbers) are cached, never ORM instances,
+    so entries survive the session that built them and can be pickled to Redis.
+    Writers call the invalidate_* helpers below after committing. Under the
+    prefork server, invalidations of the memory backend are relayed to the
+    other workers so no process keeps serving a deleted entry until its TTL.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.backend = None
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'invalidations': 0, 'errors': 0}
+        relay.on('cache:', self._remote_delete)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'memory')  # 'memory' or 'redis'
+        app.config.setdefault('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+        app.config.setdefault('CACHE_DEFAULT_TTL', 60)
+        app.config.setdefault('CACHE_MAX_ENTRIES', 1024)
+        if app.config['CACHE_BACKEND'] == 'redis':
+            self.backend = RedisBackend(app.config['CACHE_REDIS_URL'])
+        else:
+            self.backend = MemoryBackend(app.config['CACHE_MAX_ENTRIES'])
+        self.app = app
+        app.extensions['cache'] = self
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def get_or_set(self, key, factory, ttl=None):
+        """Return the cached value for key, calling factory() to fill it on a miss."""
+        try:
+            value = self.backend.get(key)
+        except Exception as e:  # A cache outage must not take the page down
+            print(f"Cache read failed for {key}: {e}")
+            self._count('errors')
+            return factory()
+        if value is not None:
+            self._count('hits')
+            return value
+        self._count('misses')
+        value = factory()
+        try:
+            self.backend.set(key, value, ttl or self.app.config['CACHE_DEFAULT_TTL'])
+        except Exception as e:
+            print(f"Cache write failed for {key}: {e}")
+            self._count('errors')
+        return value
+
+    def delete(self, *keys):
+        try:
+            self.backend.delete(keys)
+        except Exception as e:
+            print(f"Cache invalidation failed for {keys}: {e}")
+            self._count('errors')
+        self._count('invalidations')
+        if relay.attached and isinstance(self.backend, MemoryBackend):
+            broker.publish('cache:invalidate', 'delete', list(keys))
+
+    def _remote_delete(self, channel, event, keys):
+        if isinstance(self.backend, MemoryBackend):
+            self.backend.delete(keys)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['backend'] = self.app.config['CACHE_BACKEND']
+        stats['entries'] = self.backend.size()
+        stats['evictions'] = self.backend.evictions
+        return stats
+
+
+cache = Cache()
+
+
+# ---- Cached dashboard data ----
+def _columns(obj):
+    return {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+
+def video_summary(video):
+    """The dict shape dashboards render videos from, cached or not."""
+    return {key: getattr(video, key) for key in ('id', 'title', 'thumbnail_path', 'hls_playlist_path',
+                                                  'upload_date', 'uploader_id', 'classroom_id', 'status')}
+
+def playlist_summary(playlist):
+    return dict(_columns(playlist), videos=[video_summary(v) for v in playlist.videos])
+
+def playlist_catalog():
+    """Every playlist with its videos, as dicts. Shared by all students."""
+    def load():
+        playlists = read_session().query(Playlist).order_by(Playlist.id).all()
+        return [playlist_summary(p) for p in playlists]
+    return cache.get_or_set('catalog:playlists', load)
+
+def latest_videos(limit=20):
+    def load():
+        videos = read_session().query(Video).filter_by(status='completed').order_by(Video.upload_date.desc()).limit(limit).all()
+        return [video_summary(v) for v in videos]
+    return cache.get_or_set(f'catalog:latest_videos:{limit}', load)
+
+def site_settings():
+    """SiteSettings as a dict, or None when the row has not been created yet."""
+    def load():
+        settings = read_session().query(SiteSettings).first()
+        return _columns(settings) if settings else {}
+    return cache.get_or_set('site:settings', load) or None
+
+def student_directory():
+    def load():
+        students = read_session().query(User).filter_by(role='student').order_by(User.id).all()
+        return [{key: getattr(s, key) for key in ('id', 'username', 'role', 'xp', 'parent_email',
+                                                   'parent_name', 'created_at')} for s in students]
+    return cache.get_or_set('users:students', load)
+
+def unread_count(user_id):
+    """Unread badge from the counter on the user row (see notifications.py); no cache needed."""
+    user = db.session.get(User, user_id)  # The signed-in user is already in the session
+    return user.unread_notifications if user else 0
+
+def attendance_pct(user_id):
+    def load():
+        total, attended = read_session().query(
+            db.func.count(Attendance.id),
+            db.func.sum(db.case((Attendance.status.in_(['Present', 'Late']), 1), else_=0))
+        ).filter(Attendance.student_id == user_id).one()
+        return int((attended or 0) / total * 100) if total else 0
+    return cache.get_or_set(f'user:{user_id}:attendance_pct', load)
+
+def invalidate_catalog():
+    """After a playlist or a completed video changes."""
+    cache.delete('catalog:playlists', 'catalog:latest_videos:20')
+
+def invalidate_settings():
+    cache.delete('site:settings')
+
+def invalidate_students():
+    cache.delete('users:students')
+
+def invalidate_user(user_id):
+    cache.delete(f'user:{user_id}:attendance_pct')
+
+def invalidate_users(user_ids):
+    """invalidate_user() for many users in a single delete."""
+    cache.delete(*[f'user:{user_id}:attendance_pct' for user_id in user_ids])
@@ -0,0 +1,193 @@
+import threading
+from collections import deque
+
+from sqlalchemy.orm import joinedload
+
+from events import broker, relay
+from models import ChatMessage
+
+
+def chat_payload(message, user):
+    """JSON shape shared by the chat stream, the send response and the history API."""
+    return {
+        'id': message.id,
+        'username': user.username,
+        'role': user.role,
+        'content': message.content,
+        'timestamp': message.timestamp.strftime('%I:%M %p'),
+        'user_id': message.user_id
+    }
+
+
+def fetch_chat_page(class_id, before=None, after=None, limit=50):
+    """Keyset page of a classroom's messages, oldest first, with authors joined.
+
+    `before` pages backwards through history, `after` fetches newer messages, and
+    neither returns the latest page. Served by the (classroom_id, id) index, so the
+    cost depends on the page size, not the length of the history.
+    Returns (messages, has_more) where has_more means older (or, with `after`, newer) rows exist.
+    """
+    query = ChatMessage.query.options(joinedload(ChatMessage.user)).filter(ChatMessage.classroom_id == class_id)
+    if after is not None:
+        rows = query.filter(ChatMessage.id > after).order_by(ChatMessage.id.asc()).limit(limit + 1).all()
+        return rows[:limit], len(rows) > limit
+    if before is not None:
+        query = query.filter(ChatMessage.id < before)
+    rows = query.order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+    return list(reversed(rows[:limit])), len(rows) > limit
+
+
+class ChatHub:
+    """Per-classroom fan-out for chat over the shared EventBroker.
+
+    A message is published once and every open stream in the classroom gets it
+    with no database read. The latest CHAT_BACKLOG messages of each active room
+    are kept in memory so a joining client receives recent history without a
+    query once the room is warm. Open streams are capped per worker process at
+    CHAT_MAX_CONNECTIONS, since each one holds a server thread.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.backlog_size = 50
+        self.max_connections = 200
+        self.heartbeat = 15
+        self._lock = threading.Lock()
+        self._backlogs = {}
+        self._warming = {}  # class_id -> event logs of streams loading that cold room's backlog
+        self._connections = 0
+        # Other workers' posts and deletes keep this worker's backlogs current too
+        relay.on('chat:', self._remote)
+
+    def init_app(self, app):
+        app.config.setdefault('CHAT_BACKLOG', 50)
+        app.config.setdefault('CHAT_MAX_CONNECTIONS', 200)
+        self.backlog_size = app.config['CHAT_BACKLOG']
+        self.max_connections = app.config['CHAT_MAX_CONNECTIONS']
+        self.heartbeat = app.config.get('SSE_HEARTBEAT_INTERVAL', 15)
+        with self._lock:
+            self._backlogs = {}  # Rooms warmed against another app's database would serve its messages
+        app.extensions['chat_hub'] = self
+
+    @staticmethod
+    def channel(class_id):
+        return f'chat:{class_id}'
+
+    def is_full(self):
+        return self._connections >= self.max_connections
+
+    def stats(self):
+        with self._lock:
+            rooms = len(self._backlogs)
+            connections = self._connections
+        return {
+            'connections': connections,
+            'max_connections': self.max_connections,
+            'warm_rooms': rooms,
+            'subscribers': self.broker.subscriber_count()
+        }
+
+    def publish(self, class_id, payload):
+        with self._lock:
+            self._apply(class_id, 'message', payload)
+            self.broker.publish(self.channel(class_id), 'message', payload, event_id=payload['id'])
+
+    def remove(self, class_id, message_id):
+        with self._lock:
+            self._apply(class_id, 'delete', {'id': message_id})
+            self.broker.publish(self.channel(class_id), 'delete', {'id': message_id})
+
+    def _apply(self, class_id, event, data):
+        """Update a warm room's backlog for a message or delete event. Call with the lock held."""
+        for log in self._warming.get(class_id, ()):
+            log.append((event, data))
+        backlog = self._backlogs.get(class_id)
+        if backlog is not None:
+            self._backlogs[class_id] = _updated_backlog(backlog, event, data)
+
+    def _stop_warming(self, class_id, log):
+        """Call with the lock held."""
+        self._warming[class_id].remove(log)
+        if not self._warming[class_id]:
+            del self._warming[class_id]
+
+    def _remote(self, channel, event, data):
+        with self._lock:
+            self._apply(int(channel.split(':', 1)[1]), event, data)
+
+    def stream(self, class_id, load_backlog, after_id=0):
+        """Subscribe to a room. Returns (SSE generator starting with the backlog, release).
+
+        `load_backlog(limit)` is only called on a cold room and must return payloads
+        oldest first; it runs outside the hub's lock, so a slow query holds up no other
+        room. Messages with an id <= after_id (e.g. Last-Event-ID) are skipped.
+        The subscription is taken now, so `release` must also be registered with
+        Response.call_on_close(): a body that is never iterated, as for HEAD, never
+        reaches the generator's cleanup. Calling it more than once is harmless.
+        """
+        channel = self.channel(class_id)
+        with self._lock:
+            # Subscribing under the same lock as publish() means nothing slips between backlog and live feed
+            subscription = self.broker.subscribe(channel)
+            self._connections += 1
+            backlog = self._backlogs.get(class_id)
+            if backlog is not None:
+                history = list(backlog)
+            else:
+                log = []
+                self._warming.setdefault(class_id, []).append(log)
+        released = []
+
+        def release():
+            with self._lock:
+                if released:
+                    return
+                released.append(True)
+                self.broker.unsubscribe(channel, subscription)
+                self._connections -= 1
+                # Let idle rooms go cold so memory tracks active classrooms only
+                if not self.broker.subscriber_count(channel):
+                    self._backlogs.pop(class_id, None)
+
+        if backlog is None:
+            try:
+                rows = load_backlog(self.backlog_size)
+            except Exception:
+                with self._lock:
+                    self._stop_warming(class_id, log)
+                release()
+                raise
+            with self._lock:
+                self._stop_warming(class_id, log)
+                backlog = self._backlogs.get(class_id)
+                if backlog is None:  # Unless another stream warmed the room meanwhile
+                    backlog = deque(rows, maxlen=self.backlog_size)
+                    for event, data in log:  # Posts and deletes since subscribing
+                        backlog = _updated_backlog(backlog, event, data)
+                    self._backlogs[class_id] = backlog
+                # Posts since subscribing are already queued on the subscription
+                posted = {data['id'] for event, data in log if event == 'message'}
+                history = [m for m in backlog if m['id'] not in posted]
+        history = [('message', m, m['id']) for m in history if m['id'] > after_id]
+
+        def generate():
+            try:
+                yield from self.broker.stream(channel, initial=history, heartbeat=self.heartbeat,
+                                              subscription=subscription)
+            finally:
+                release()
+
+        return generate(), release
+
+
+def _updated_backlog(backlog, event, data):
+    """The backlog after a message or delete event; a message it already holds is not added twice."""
+    if event == 'message':
+        if all(m['id'] != data['id'] for m in backlog):
+            backlog.append(data)
+    elif event == 'delete':
+        backlog = deque((m for m in backlog if m['id'] != data['id']), maxlen=backlog.maxlen)
+    return backlog
+
+
+chat_hub = ChatHub(broker)
@@ -0,0 +1,85 @@
+from sqlalchemy.orm import aliased, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from extensions import db
+from models import Comment
+
+
+def comment_payload(comment):
+    """JSON shape of a comment and the replies loaded with it."""
+    return {
+        'id': comment.id,
+        'parent_id': comment.parent_id,
+        'username': comment.author.username,
+        'role': comment.author.role,
+        'content': comment.content,
+        'timestamp': comment.timestamp.strftime('%b %d, %Y %I:%M %p'),
+        'reply_count': comment.reply_count,
+        'replies': [comment_payload(reply) for reply in comment.replies]
+    }
+
+
+def fetch_comment_threads(video_id=None, parent_id=None, cursor=None, limit=20, depth=3, replies=5):
+    """One page of comment threads, with authors and replies, in a single query.
+
+    With video_id the threads are the video's top-level comments, newest first,
+    and `cursor` is the last id of the previous page. With parent_id they are the
+    replies of that comment, oldest first, continuing after `cursor` ("load more").
+    Below each thread a recursive CTE walks at most `depth` levels of replies and
+    keeps the first `replies` of every comment. Each returned comment has its
+    loaded replies set on Comment.replies, so walking the tree never lazy-loads,
+    and a reply_count attribute; reply_count > len(replies) means more to load.
+    Returns (threads, has_more).
+    """
+    page = db.select(Comment.id, db.func.row_number().over(
+        order_by=Comment.id.desc() if parent_id is None else Comment.id.asc()).label('rank'))
+    if parent_id is None:
+        page = page.where(Comment.video_id == video_id, Comment.parent_id.is_(None))
+        if cursor is not None:
+            page = page.where(Comment.id < cursor)
+        page = page.order_by(Comment.id.desc())
+    else:
+        page = page.where(Comment.parent_id == parent_id)
+        if cursor is not None:
+            page = page.where(Comment.id > cursor)
+        page = page.order_by(Comment.id.asc())
+    # One thread past the page tells us there is a next page; its replies are not walked
+    page = page.limit(limit + 1).subquery()
+
+    tree = db.select(page.c.id, db.literal(0).label('depth'), page.c.rank).cte('comment_tree', recursive=True)
+    tree = tree.union_all(
+        db.select(Comment.id, tree.c.depth + 1, tree.c.rank)
+        .join(tree, Comment.parent_id == tree.c.id)
+        .where(tree.c.depth < depth, tree.c.rank <= limit)
+    )
+    ranked = db.select(
+        tree.c.id, tree.c.depth, tree.c.rank,
+        db.func.row_number().over(partition_by=Comment.parent_id, order_by=Comment.id).label('position')
+    ).join(Comment, Comment.id == tree.c.id).subquery()
+
+    reply = aliased(Comment)
+    reply_count = db.select(db.func.count(reply.id)).where(reply.parent_id == Comment.id) \
+        .correlate(Comment).scalar_subquery()
+    rows = db.session.query(Comment, ranked.c.depth, ranked.c.rank, reply_count).join(
+        ranked, ranked.c.id == Comment.id
+    ).filter(
+        db.or_(ranked.c.depth == 0, ranked.c.position <= replies)
+    ).options(joinedload(Comment.author)).order_by(ranked.c.depth, ranked.c.rank, Comment.id).all()
+
+    threads, loaded, children, has_more = [], [], {}, False
+    for comment, level, rank, count in rows:
+        if level == 0:
+            if rank > limit:
+                has_more = True
+                continue
+            threads.append(comment)
+        elif comment.parent_id in children:
+            children[comment.parent_id].append(comment)
+        else:
+            continue  # Under a reply that was cut off by the per-comment limit
+        comment.reply_count = count
+        children[comment.id] = []
+        loaded.append(comment)
+    for comment in loaded:
+        set_committed_value(comment, 'replies', children[comment.id])
+    return threads, has_more
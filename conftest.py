@@ -0,0 +1,57 @@
+"""Shared fixtures: a fresh app on an in-memory database for every test.
+
+    def test_something(client, login):
+        login('admin')
+        assert client.get('/api/db/stats').status_code == 200
+"""
+import pytest
+
+from app import create_app
+from extensions import db
+from models import User
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    """create_app() overrides that keep the database in memory and every file under tmp_path."""
+    return {
+        'TESTING': True,
+        'SECRET_KEY': 'test',
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'HLS_FOLDER': str(tmp_path / 'hls'),
+        'UPLOAD_TMP_FOLDER': str(tmp_path / 'uploads_tmp'),
+        'ANALYTICS_JOURNAL': str(tmp_path / 'heartbeats.journal'),
+    }
+
+
+@pytest.fixture
+def app(app_config):
+    app = create_app(app_config)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """Create a user with the given role (unless it exists) and sign the test client in as them."""
+    def login(role, username=None, password='secret'):
+        username = username or role
+        user = User.query.filter_by(username=username).first()
+        if not user:
+            user = User(username=username, role=role)
+            user.set_password(password)
+            db.session.add(user)
+            db.session.commit()
+        response = client.post('/login', data={'username': username, 'password': password})
+        assert response.status_code == 302, response.status_code
+        return user
+    return login
@@ -0,0 +1,180 @@
+import csv
+import io
+
+from flask import g
+from flask_sqlalchemy.query import Query
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from extensions import db
+
+# Applied to every new SQLite connection under the 'production' profile
+PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',  # Readers no longer block the writer, nor the writer readers
+    'synchronous': 'NORMAL',  # Safe with WAL; fsync at checkpoints rather than every commit
+    'temp_store': 'MEMORY',
+}
+
+
+def init_database(app):
+    """Build engine options for the configured database, then initialise Flask-SQLAlchemy.
+
+    Any SQLAlchemy URL works (SQLite file, PostgreSQL, ...). Server databases get
+    a pre-pinged, recycled pool of DATABASE_POOL_SIZE + DATABASE_MAX_OVERFLOW
+    connections. For SQLite, SQLITE_PROFILE 'basic' keeps its defaults while
+    'production' turns on WAL, a busy timeout, a larger page cache and
+    memory-mapped reads. Report and dashboard queries use read_session(), which
+    goes to DATABASE_READONLY_URL (e.g. a streaming replica) when set, or to a
+    read-only SQLite engine with SQLITE_READONLY_ENGINE.
+    """
+    app.config.setdefault('DATABASE_POOL_SIZE', 10)
+    app.config.setdefault('DATABASE_MAX_OVERFLOW', 20)
+    app.config.setdefault('DATABASE_POOL_TIMEOUT', 30)
+    app.config.setdefault('DATABASE_POOL_RECYCLE', 1800)  # seconds; below typical server idle timeouts
+    app.config.setdefault('DATABASE_READONLY_URL', None)
+    app.config.setdefault('SQLITE_PROFILE', 'production')
+    app.config.setdefault('SQLITE_BUSY_TIMEOUT', 5000)  # ms a writer waits for the lock before failing
+    app.config.setdefault('SQLITE_CACHE_SIZE', -64000)  # negative = KiB, so 64 MB per connection
+    app.config.setdefault('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+    app.config.setdefault('SQLITE_READONLY_ENGINE', False)
+
+    uri = normalize_database_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    url = make_url(uri)
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    pool = {
+        'pool_size': app.config['DATABASE_POOL_SIZE'],
+        'max_overflow': app.config['DATABASE_MAX_OVERFLOW'],
+        'pool_timeout': app.config['DATABASE_POOL_TIMEOUT'],
+    }
+    readonly_url = app.config['DATABASE_READONLY_URL']
+
+    sqlite = url.get_backend_name() == 'sqlite'
+    in_memory = sqlite and url.database in (None, '', ':memory:')
+    production = sqlite and app.config['SQLITE_PROFILE'] == 'production'
+    if sqlite:
+        connect_args = options.setdefault('connect_args', {})
+        # Connections are shared by the request, worker and flusher threads
+        connect_args.setdefault('check_same_thread', False)
+        if production:
+            connect_args['timeout'] = app.config['SQLITE_BUSY_TIMEOUT'] / 1000
+            if not in_memory:
+                for key, value in pool.items():
+                    options.setdefault(key, value)
+            if app.config['SQLITE_READONLY_ENGINE'] and not in_memory and not readonly_url:
+                readonly_url = f'sqlite:///file:{url.database}?mode=ro&uri=true'
+    else:
+        for key, value in pool.items():
+            options.setdefault(key, value)
+        options.setdefault('pool_pre_ping', True)
+        options.setdefault('pool_recycle', app.config['DATABASE_POOL_RECYCLE'])
+        if url.get_driver_name() == 'psycopg2':
+            # execute_batch for executemany UPDATEs, e.g. the heartbeat flush
+            options.setdefault('executemany_mode', 'values_plus_batch')
+    if readonly_url:
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        binds['readonly'] = dict(options, url=normalize_database_url(readonly_url))
+
+    db.init_app(app)
+    if production:
+        with app.app_context():
+            for key, engine in db.engines.items():
+                if engine.dialect.name == 'sqlite':
+                    event.listen(engine, 'connect', _pragma_listener(app.config, readonly=key == 'readonly'))
+    app.teardown_appcontext(_close_read_session)
+
+def normalize_database_url(uri):
+    # Hosting platforms still hand out the postgres:// scheme SQLAlchemy 1.4+ rejects
+    if uri.startswith('postgres://'):
+        return 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+def _pragma_listener(config, readonly):
+    pragmas = {} if readonly else dict(PRODUCTION_PRAGMAS)
+    pragmas.update({
+        'busy_timeout': config['SQLITE_BUSY_TIMEOUT'],
+        'cache_size': config['SQLITE_CACHE_SIZE'],
+        'mmap_size': config['SQLITE_MMAP_SIZE'],
+    })
+    if readonly:
+        pragmas['query_only'] = 1
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return on_connect
+
+def read_session():
+    """Session for report and dashboard reads: the read-only engine when configured, else db.session.
+
+    One per app context, closed on teardown. It sees everything committed before
+    its first query, which is all a request that has just redirected after a write needs.
+    """
+    if 'readonly' not in db.engines:
+        return db.session
+    if 'read_session' not in g:
+        g.read_session = Session(bind=db.engines['readonly'], query_cls=Query)
+    return g.read_session
+
+def _close_read_session(exc=None):
+    session = g.pop('read_session', None)
+    if session is not None:
+        session.close()
+
+def sqlite_settings():
+    """Current values of the tuned pragmas on a pooled connection, for health checks."""
+    if db.engine.dialect.name != 'sqlite':
+        return {}
+    with db.engine.connect() as conn:
+        return {name: conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+                for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size')}
+
+def dialect_insert(model_or_table):
+    """INSERT with on_conflict_do_update() for the current backend, or None where it has no upsert."""
+    name = db.session.get_bind().dialect.name
+    if name == 'postgresql':
+        return postgresql.insert(model_or_table)
+    if name == 'sqlite':
+        return sqlite.insert(model_or_table)
+    return None
+
+def bulk_insert(model_or_table, rows, batch_size=5000):
+    """Insert many rows in the current transaction using the fastest path the backend has.
+
+    PostgreSQL gets COPY ... FROM STDIN; everything else a batched executemany
+    INSERT. Rows are dicts with the same keys; Python-side column defaults are
+    not applied on the COPY path, so include every column that needs a value.
+    """
+    if not rows:
+        return 0
+    table = getattr(model_or_table, '__table__', model_or_table)
+    bind = db.session.get_bind()
+    driver = bind.dialect.driver if bind.dialect.name == 'postgresql' else None
+    if driver in ('psycopg2', 'psycopg'):
+        columns = list(rows[0])
+        copy_sql = (f'COPY {bind.dialect.identifier_preparer.format_table(table)} '
+                    f'({", ".join(bind.dialect.identifier_preparer.quote(c) for c in columns)}) '
+                    f"FROM STDIN WITH (FORMAT csv, NULL '\\N')")
+        dbapi_connection = db.session.connection().connection.dbapi_connection
+        with dbapi_connection.cursor() as cursor:
+            if driver == 'psycopg2':
+                cursor.copy_expert(copy_sql, _csv_buffer(rows, columns))
+            else:
+                with cursor.copy(copy_sql) as copy:
+                    copy.write(_csv_buffer(rows, columns).getvalue())
+        return len(rows)
+    for i in range(0, len(rows), batch_size):
+        db.session.execute(table.insert(), rows[i:i + batch_size])
+    return len(rows)
+
+def _csv_buffer(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if row[c] is None else row[c] for c in columns])
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,194 @@
+import json
+import queue
+import threading
+import time
+
+
+class EventBroker:
+    """In-process publish/subscribe hub used to push events to Server-Sent Event streams.
+
+    Each subscriber gets its own bounded queue. A subscriber that stops reading
+    loses its oldest events rather than blocking the publisher, so a stalled
+    browser tab can never slow down a transcode worker.
+    """
+
+    def __init__(self, max_queue=256):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self.relay = None  # Set by EventRelay.attach() under the prefork server
+
+    def subscribe(self, channel):
+        q = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(q)
+        return q
+
+    def unsubscribe(self, channel, q):
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers:
+                subscribers.discard(q)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def publish(self, channel, event, data, event_id=None):
+        """Deliver to this process's subscribers and, under the prefork server, to every other worker."""
+        if self.relay is not None:
+            self.relay.send(channel, event, data, event_id)
+        return self.deliver(channel, event, data, event_id)
+
+    def deliver(self, channel, event, data, event_id=None):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for q in subscribers:
+            _put_latest(q, (event, data, event_id))
+        return len(subscribers)
+
+    def close_all(self):
+        """End every open stream, e.g. when a worker drains; EventSource reconnects to another worker."""
+        with self._lock:
+            subscribers = [q for qs in self._subscribers.values() for q in qs]
+        for q in subscribers:
+            _put_latest(q, None, attempts=10)
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return sum(len(s) for s in self._subscribers.values())
+
+    def stream(self, channel, initial=(), heartbeat=15, subscription=None):
+        """Generator of SSE frames for a channel; unsubscribes when the client goes away.
+
+        `initial` is a list of (event, data) or (event, data, event_id) tuples sent
+        first, e.g. a snapshot of current state. Pass a queue from subscribe() as
+        `subscription` when the snapshot must be taken after subscribing.
+        """
+        q = subscription or self.subscribe(channel)
+        try:
+            yield 'retry: 3000\n\n'
+            for item in initial:
+                yield format_sse(*item)
+            while True:
+                try:
+                    item = q.get(timeout=heartbeat)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield f': keepalive {int(time.time())}\n\n'
+                    continue
+                if item is None:
+                    return
+                yield format_sse(*item)
+        finally:
+            self.unsubscribe(channel, q)
+
+
+def _put_latest(q, item, attempts=2):
+    """Queue item for a slow subscriber, evicting its oldest event when full.
+
+    A racing publisher can refill the queue between the eviction and the put;
+    after `attempts` tries the item is dropped like any other overflow, rather
+    than raising queue.Full into the publisher (e.g. a transcode job).
+    """
+    for _ in range(attempts):
+        try:
+            q.put_nowait(item)
+            return True
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+    return False
+
+def format_sse(event, data, event_id=None):
+    # An id lets EventSource send Last-Event-ID when it reconnects
+    frame = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{frame}event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+class EventRelay:
+    """Carries broker events between the worker processes of one server.
+
+    Under the prefork server (server.py) each worker holds one end of a socket
+    pair and the master copies every frame it reads to all the other workers,
+    so a chat message or progress update published in one process reaches SSE
+    streams in all of them. Incoming frames go to the local broker and to any
+    handler registered with on() for their channel prefix. In a single process
+    nothing is attached and publishing stays in memory.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._handlers = []
+
+    @property
+    def attached(self):
+        return self._sock is not None
+
+    def on(self, prefix, handler):
+        """Call handler(channel, event, data) for frames from other processes whose channel starts with prefix."""
+        self._handlers.append((prefix, handler))
+
+    def attach(self, sock):
+        self._sock = sock
+        self.broker.relay = self
+        threading.Thread(target=self._read, name='event-relay', daemon=True).start()
+
+    def send(self, channel, event, data, event_id=None):
+        frame = json.dumps([channel, event, data, event_id]).encode() + b'\n'
+        try:
+            with self._send_lock:
+                self._sock.sendall(frame)
+        except OSError as e:
+            print(f"Event relay send failed: {e}")
+
+    def _read(self):
+        with self._sock.makefile('rb') as frames:
+            for line in frames:
+                try:
+                    channel, event, data, event_id = json.loads(line)
+                except ValueError:
+                    continue  # Frame torn by a send timeout in the master
+                self.dispatch(channel, event, data, event_id)
+
+    def dispatch(self, channel, event, data, event_id=None):
+        """Handle one frame from another process: registered handlers first, then local subscribers."""
+        for prefix, handler in self._handlers:
+            if channel.startswith(prefix):
+                handler(channel, event, data)
+        self.broker.deliver(channel, event, data, event_id)
+
+
+broker = EventBroker()
+relay = EventRelay(broker)
+
+# Latest processing state per video id, kept only while a video is queued or encoding
+live_progress = {}
+
+
+def publish_progress(video, **extra):
+    """Push a video's processing state to its uploader's stream without touching the database."""
+    data = {
+        'id': video.id,
+        'title': video.title,
+        'status': video.status,
+        'progress': video.processing_progress
+    }
+    data.update(extra)
+    _remember_progress('progress', data)
+    broker.publish(f'uploads:{video.uploader_id}', 'progress', data)
+
+
+def _remember_progress(event, data):
+    if data['status'] in ('pending', 'processing'):
+        live_progress[data['id']] = data
+    else:
+        live_progress.pop(data['id'], None)
+
+
+# Progress published by the transcode process keeps /api/video_status answering from memory
+relay.on('uploads:', lambda channel, event, data: _remember_progress(event, data))
@@ -0,0 +1,200 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+from events import broker, publish_progress, relay
+from extensions import db
+from models import MediaAsset, TranscodeJob, Video
+
+
+class TranscodeDeferred(Exception):
+    """Raised by the handler to run the job again after `delay` seconds without using up an attempt."""
+
+    def __init__(self, reason, delay=30):
+        super().__init__(reason)
+        self.delay = delay
+
+
+class TranscodeQueue:
+    """Persistent transcode queue stored in the TranscodeJob table.
+
+    A fixed pool of worker threads claims jobs in priority order, so at most
+    TRANSCODE_WORKERS ffmpeg processes run at once no matter how many uploads
+    arrive. Failed jobs are retried with exponential backoff, and jobs left
+    behind by a restart are picked up again by recover().
+
+    With TRANSCODE_IN_PROCESS off (the prefork server's web workers) enqueue()
+    only writes the job and wakes the separate transcode process through the
+    event relay, so encoding never competes with requests for the GIL.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.handler = None
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        relay.on('transcode:', lambda channel, event, data: self._wakeup.set())
+
+    def init_app(self, app, handler):
+        app.config.setdefault('TRANSCODE_WORKERS', os.cpu_count() or 1)
+        app.config.setdefault('TRANSCODE_MAX_ATTEMPTS', 3)
+        app.config.setdefault('TRANSCODE_RETRY_BACKOFF', 30)  # seconds, doubled per attempt
+        app.config.setdefault('TRANSCODE_POLL_INTERVAL', 5)  # seconds between idle queue checks
+        app.config.setdefault('TRANSCODE_QUEUE_LIMIT', 200)  # max jobs waiting before uploads are refused
+        app.config.setdefault('TRANSCODE_IN_PROCESS', True)  # Run the worker pool in this process
+        self.app = app
+        self.handler = handler
+        app.extensions['transcode_queue'] = self
+
+    @property
+    def started(self):
+        return bool(self._threads)
+
+    def start(self):
+        """Recover interrupted jobs and start the worker pool (idempotent)."""
+        with self._start_lock:
+            if self._threads:
+                return
+            with self.app.app_context():
+                self.recover()
+            for i in range(max(1, int(self.app.config['TRANSCODE_WORKERS']))):
+                thread = threading.Thread(target=self._work, name=f'transcode-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._stop.clear()
+
+    def is_full(self):
+        waiting = TranscodeJob.query.filter(TranscodeJob.status.in_(['pending', 'processing'])).count()
+        return waiting >= self.app.config['TRANSCODE_QUEUE_LIMIT']
+
+    def enqueue(self, video, input_path, priority=0):
+        """Persist a job for the video and wake an idle worker.
+
+        Commits the session, so a new Video and its job are written together and
+        recover() never sees one without the other.
+        """
+        job = TranscodeJob(
+            video=video,
+            input_path=input_path,
+            priority=priority,
+            max_attempts=self.app.config['TRANSCODE_MAX_ATTEMPTS']
+        )
+        db.session.add(job)
+        db.session.commit()
+        publish_progress(video)
+        if not self.app.config['TRANSCODE_IN_PROCESS']:
+            broker.publish('transcode:queue', 'enqueued', {'job_id': job.id})
+            return job
+        if not self.started:
+            self.start()
+        self._wakeup.set()
+        return job
+
+    def recover(self):
+        """Requeue jobs orphaned by a restart. Must be called inside an app context."""
+        interrupted = TranscodeJob.query.filter_by(status='processing').update(
+            {'status': 'pending', 'run_after': datetime.utcnow()}, synchronize_session=False)
+        # Their shared-output claims died with them
+        MediaAsset.query.filter_by(status='encoding').update({'status': 'pending'}, synchronize_session=False)
+
+        # Videos from before the queue existed (or whose job row was lost) get a fresh job
+        queued_ids = db.session.query(TranscodeJob.video_id).filter(TranscodeJob.status == 'pending')
+        orphans = Video.query.filter(Video.status.in_(['pending', 'processing']), ~Video.id.in_(queued_ids)).all()
+        requeued = 0
+        for video in orphans:
+            input_path = os.path.join(self.app.config['UPLOAD_FOLDER'], video.filename)
+            if os.path.exists(input_path):
+                db.session.add(TranscodeJob(video_id=video.id, input_path=input_path,
+                                            max_attempts=self.app.config['TRANSCODE_MAX_ATTEMPTS']))
+                requeued += 1
+            else:
+                video.status = 'failed'
+        db.session.commit()
+        if interrupted or orphans:
+            print(f"Transcode queue recovered {interrupted} interrupted job(s), requeued {requeued} orphaned video(s).")
+
+    def _claim(self):
+        """Atomically move the next runnable job to 'processing'. Safe across threads and processes."""
+        now = datetime.utcnow()
+        candidates = TranscodeJob.query.filter(
+            TranscodeJob.status == 'pending',
+            TranscodeJob.run_after <= now
+        ).order_by(TranscodeJob.priority.asc(), TranscodeJob.created_at.asc()).limit(5).all()
+        for job in candidates:
+            claimed = TranscodeJob.query.filter_by(id=job.id, status='pending').update(
+                {'status': 'processing', 'attempts': TranscodeJob.attempts + 1, 'started_at': now},
+                synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                return TranscodeJob.query.get(job.id)
+        return None
+
+    def _work(self):
+        poll_interval = self.app.config['TRANSCODE_POLL_INTERVAL']
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    job = self._claim()
+                except Exception as e:
+                    print(f"Transcode queue error: {e}")
+                    db.session.rollback()
+                    job = None
+                if job:
+                    self._execute(job)
+                    continue
+            self._wakeup.wait(poll_interval)
+            self._wakeup.clear()
+
+    def _execute(self, job):
+        job_id, video_id = job.id, job.video_id
+        try:
+            self.handler(self.app, video_id, job.input_path)
+        except TranscodeDeferred as e:
+            db.session.rollback()
+            TranscodeJob.query.filter_by(id=job_id).update({
+                'status': 'pending',
+                'attempts': TranscodeJob.attempts - 1,
+                'run_after': datetime.utcnow() + timedelta(seconds=e.delay)
+            }, synchronize_session=False)
+            db.session.commit()
+            print(f"Transcode job {job_id} for video {video_id} deferred: {e}")
+            return
+        except Exception as e:
+            print(f"Transcode job {job_id} for video {video_id} failed: {e}")
+            db.session.rollback()
+            job = TranscodeJob.query.get(job_id)
+            if not job:  # Video was deleted while encoding
+                return
+            job.last_error = str(e)
+            video = Video.query.get(video_id)
+            if job.attempts < job.max_attempts:
+                backoff = self.app.config['TRANSCODE_RETRY_BACKOFF'] * 2 ** (job.attempts - 1)
+                job.status = 'pending'
+                job.run_after = datetime.utcnow() + timedelta(seconds=backoff)
+                if video:
+                    video.status = 'pending'
+            else:
+                job.status = 'failed'
+                job.finished_at = datetime.utcnow()
+                if video:
+                    video.status = 'failed'
+            db.session.commit()
+            if video:
+                publish_progress(video)
+            return
+
+        TranscodeJob.query.filter_by(id=job_id).update(
+            {'status': 'completed', 'finished_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+
+
+transcode_queue = TranscodeQueue()
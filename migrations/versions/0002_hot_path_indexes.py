@@ -0,0 +1,73 @@
+"""hot path indexes
+
+Composite indexes matched to the filters and sort orders of the route
+queries (see test_query_plans.py), plus one attendance record per student,
+class and day. Duplicate attendance rows are collapsed to the newest first.
+
+Revision ID: 0002_hot_path_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-17 06:09:08.266929
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_hot_path_indexes'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep only the newest attendance record per student, class and day before enforcing uniqueness
+    op.execute("DELETE FROM attendance WHERE id NOT IN "
+               "(SELECT max(id) FROM attendance GROUP BY student_id, classroom_id, date)")
+    op.create_index('uq_attendance_student_class_date', 'attendance', ['student_id', 'classroom_id', 'date'], unique=True, if_not_exists=True)
+    op.create_index(op.f('ix_chat_message_user_id'), 'chat_message', ['user_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_classroom_teacher_id'), 'classroom', ['teacher_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_comment_parent_id'), 'comment', ['parent_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_comment_video_id_parent_id_timestamp', 'comment', ['video_id', 'parent_id', 'timestamp'], unique=False, if_not_exists=True)
+    op.create_index('ix_notification_user_id_is_read', 'notification', ['user_id', 'is_read'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_playlist_creator_id'), 'playlist', ['creator_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_playlist_videos_video_id', 'playlist_videos', ['video_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_question_quiz_id'), 'question', ['quiz_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_quiz_teacher_id'), 'quiz', ['teacher_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_quiz_result_quiz_id'), 'quiz_result', ['quiz_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_quiz_result_student_id'), 'quiz_result', ['student_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_student_classes_classroom_id', 'student_classes', ['classroom_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_transcode_job_status_priority_created_at', 'transcode_job', ['status', 'priority', 'created_at'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_transcode_job_video_id'), 'transcode_job', ['video_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_upload_session_user_id'), 'upload_session', ['user_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_user_role'), 'user', ['role'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_video_classroom_id'), 'video', ['classroom_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_video_status_upload_date', 'video', ['status', 'upload_date'], unique=False, if_not_exists=True)
+    op.create_index('ix_video_uploader_id_status', 'video', ['uploader_id', 'status'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_view_analytics_user_id'), 'view_analytics', ['user_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_view_analytics_video_id_user_id_start_time', 'view_analytics', ['video_id', 'user_id', 'start_time'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_view_analytics_video_id_user_id_start_time', table_name='view_analytics')
+    op.drop_index(op.f('ix_view_analytics_user_id'), table_name='view_analytics')
+    op.drop_index('ix_video_uploader_id_status', table_name='video')
+    op.drop_index('ix_video_status_upload_date', table_name='video')
+    op.drop_index(op.f('ix_video_classroom_id'), table_name='video')
+    op.drop_index(op.f('ix_user_role'), table_name='user')
+    op.drop_index(op.f('ix_upload_session_user_id'), table_name='upload_session')
+    op.drop_index(op.f('ix_transcode_job_video_id'), table_name='transcode_job')
+    op.drop_index('ix_transcode_job_status_priority_created_at', table_name='transcode_job')
+    op.drop_index('ix_student_classes_classroom_id', table_name='student_classes')
+    op.drop_index(op.f('ix_quiz_result_student_id'), table_name='quiz_result')
+    op.drop_index(op.f('ix_quiz_result_quiz_id'), table_name='quiz_result')
+    op.drop_index(op.f('ix_quiz_teacher_id'), table_name='quiz')
+    op.drop_index(op.f('ix_question_quiz_id'), table_name='question')
+    op.drop_index('ix_playlist_videos_video_id', table_name='playlist_videos')
+    op.drop_index(op.f('ix_playlist_creator_id'), table_name='playlist')
+    op.drop_index('ix_notification_user_id_is_read', table_name='notification')
+    op.drop_index('ix_comment_video_id_parent_id_timestamp', table_name='comment')
+    op.drop_index(op.f('ix_comment_parent_id'), table_name='comment')
+    op.drop_index(op.f('ix_classroom_teacher_id'), table_name='classroom')
+    op.drop_index(op.f('ix_chat_message_user_id'), table_name='chat_message')
+    op.drop_index('uq_attendance_student_class_date', table_name='attendance')
@@ -0,0 +1,39 @@
+"""notification counters
+
+Denormalised unread count on each user, so unread badges read one row
+instead of counting notifications, backfilled from the existing rows, plus
+an index for the newest-first notification list.
+
+Revision ID: 0003_notification_counters
+Revises: 0002_hot_path_indexes
+Create Date: 2026-10-17 06:36:41.823923
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_notification_counters'
+down_revision = '0002_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_notification_user_id_id', 'notification', ['user_id', 'id'], unique=False, if_not_exists=True)
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_notifications', sa.Integer(), server_default='0', nullable=False))
+
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('unread_notifications', sa.Integer))
+    notification = sa.table('notification', sa.column('user_id', sa.Integer), sa.column('is_read', sa.Boolean))
+    unread = (sa.select(sa.func.count())
+              .where(notification.c.user_id == user.c.id, notification.c.is_read == sa.false())
+              .scalar_subquery())
+    op.execute(user.update().values(unread_notifications=unread))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('unread_notifications')
+    op.drop_index('ix_notification_user_id_id', table_name='notification')
@@ -0,0 +1,29 @@
+"""comment threads
+
+Top-level comments are paged newest first by id, so the composite index
+ends in id instead of timestamp and the keyset page reads it in order.
+
+Revision ID: 0004_comment_threads
+Revises: 0003_notification_counters
+Create Date: 2026-10-17 07:12:05.418230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_comment_threads'
+down_revision = '0003_notification_counters'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_comment_video_id_parent_id_id', 'comment', ['video_id', 'parent_id', 'id'], unique=False, if_not_exists=True)
+    op.drop_index('ix_comment_video_id_parent_id_timestamp', table_name='comment', if_exists=True)
+
+
+def downgrade():
+    op.create_index('ix_comment_video_id_parent_id_timestamp', 'comment', ['video_id', 'parent_id', 'timestamp'], unique=False)
+    op.drop_index('ix_comment_video_id_parent_id_id', table_name='comment')
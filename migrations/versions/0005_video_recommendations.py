@@ -0,0 +1,38 @@
+"""video recommendations
+
+Precomputed related videos for the watch page, top-k per video keyed by
+(video_id, rank). Filled by `flask rebuild-recommendations`, or on first
+start by prepare_database(), and refreshed as videos finish processing.
+
+Revision ID: 0005_video_recommendations
+Revises: 0004_comment_threads
+Create Date: 2026-10-17 06:43:29.748278
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_video_recommendations'
+down_revision = '0004_comment_threads'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('video_recommendation',
+    sa.Column('video_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('related_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['related_id'], ['video.id'], ),
+    sa.ForeignKeyConstraint(['video_id'], ['video.id'], ),
+    sa.PrimaryKeyConstraint('video_id', 'rank')
+    )
+    op.create_index(op.f('ix_video_recommendation_related_id'), 'video_recommendation', ['related_id'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_video_recommendation_related_id'), table_name='video_recommendation')
+    op.drop_table('video_recommendation')
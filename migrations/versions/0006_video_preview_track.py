@@ -0,0 +1,30 @@
+"""video preview track
+
+Path of the WebVTT thumbnails track that transcoding now writes next to
+the sprite sheets, for hover-scrubbing previews on the seek bar. Videos
+processed before this revision have none until they are re-transcoded.
+
+Revision ID: 0006_video_preview_track
+Revises: 0005_video_recommendations
+Create Date: 2026-10-17 06:58:12.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_video_preview_track'
+down_revision = '0005_video_recommendations'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('video', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('preview_track_path', sa.String(length=500), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('video', schema=None) as batch_op:
+        batch_op.drop_column('preview_track_path')
@@ -0,0 +1,55 @@
+"""media assets
+
+One row per distinct uploaded file, keyed by its BLAKE2b digest, holding
+the shared transcode outputs and the number of videos that use them.
+Videos uploaded before this revision keep their per-video output folders
+and have no asset, since their original files are already gone.
+
+Revision ID: 0007_media_assets
+Revises: 0006_video_preview_track
+Create Date: 2026-10-17 07:14:26.381502
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_media_assets'
+down_revision = '0006_video_preview_track'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('media_asset',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('digest', sa.String(length=128), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('hls_playlist_path', sa.String(length=500), nullable=True),
+    sa.Column('thumbnail_path', sa.String(length=500), nullable=True),
+    sa.Column('preview_track_path', sa.String(length=500), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('digest')
+    )
+    # A plain ADD COLUMN rather than a batch recreate of video, which on SQLite would copy the
+    # legacy status DEFAULT "pending" that it rejects in a new table. SQLite cannot add a
+    # foreign key afterwards, so there the reference is declared inline on the column
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('ALTER TABLE video ADD COLUMN asset_id INTEGER '
+                   'CONSTRAINT fk_video_asset_id_media_asset REFERENCES media_asset (id)')
+    else:
+        op.add_column('video', sa.Column('asset_id', sa.Integer(), nullable=True))
+        op.create_foreign_key('fk_video_asset_id_media_asset', 'video', 'media_asset', ['asset_id'], ['id'])
+    op.create_index('ix_video_asset_id', 'video', ['asset_id'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_video_asset_id', table_name='video')
+    if op.get_bind().dialect.name != 'sqlite':
+        op.drop_constraint('fk_video_asset_id_media_asset', 'video', type_='foreignkey')
+    op.drop_column('video', 'asset_id')
+
+    op.drop_table('media_asset')
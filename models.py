@@ -6,21 +6,25 @@ from extensions import db
 # Association table for Playlist-Video
 playlist_videos = db.Table('playlist_videos',
     db.Column('playlist_id', db.Integer, db.ForeignKey('playlist.id'), primary_key=True),
-    db.Column('video_id', db.Integer, db.ForeignKey('video.id'), primary_key=True)
+    db.Column('video_id', db.Integer, db.ForeignKey('video.id'), primary_key=True),
+    db.Index('ix_playlist_videos_video_id', 'video_id')
 )
 
 # Association table for Student-Classroom
 student_classes = db.Table('student_classes',
     db.Column('student_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
-    db.Column('classroom_id', db.Integer, db.ForeignKey('classroom.id'), primary_key=True)
+    db.Column('classroom_id', db.Integer, db.ForeignKey('classroom.id'), primary_key=True),
+    db.Index('ix_student_classes_classroom_id', 'classroom_id')
 )
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(150), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
-    role = db.Column(db.String(20), nullable=False)  # 'admin', 'teacher', 'student'
+    role = db.Column(db.String(20), nullable=False, index=True)  # 'admin', 'teacher', 'student'
     xp = db.Column(db.Integer, default=0)
+    # Kept in step with Notification.is_read by notifications.py, so badges need no COUNT
+    unread_notifications = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     parent_email = db.Column(db.String(150))
     parent_name = db.Column(db.String(150))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -44,14 +48,21 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
 class Video(db.Model):
+    __table_args__ = (
+        db.Index('ix_video_uploader_id_status', 'uploader_id', 'status'),  # Teacher's own videos
+        db.Index('ix_video_status_upload_date', 'status', 'upload_date'),  # Latest completed videos
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     filename = db.Column(db.String(300), nullable=False)  # Original filename
     hls_playlist_path = db.Column(db.String(500))  # Path to master.m3u8
     thumbnail_path = db.Column(db.String(500))
+    preview_track_path = db.Column(db.String(500))  # WebVTT track of sprite thumbnails for seek previews
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
     uploader_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    classroom_id = db.Column(db.Integer, db.ForeignKey('classroom.id'), nullable=True)
+    classroom_id = db.Column(db.Integer, db.ForeignKey('classroom.id'), nullable=True, index=True)
+    asset_id = db.Column(db.Integer, db.ForeignKey('media_asset.id'), nullable=True, index=True)  # Shared transcode output
     
     # New fields for progress tracking
     status = db.Column(db.String(20), default='pending')  # 'pending', 'uploading', 'processing', 'completed', 'failed'
@@ -66,14 +77,14 @@ class Playlist(db.Model):
     title = db.Column(db.String(150), nullable=False)
     thumbnail_path = db.Column(db.String(500))  # Custom or global thumbnail
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     videos = db.relationship('Video', secondary=playlist_videos, lazy='subquery',
         backref=db.backref('playlists', lazy=True))
 
 class Classroom(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     start_time = db.Column(db.String(5), default="09:10") # HH:MM format
     
@@ -81,17 +92,23 @@ class Classroom(db.Model):
     videos = db.relationship('Video', backref='classroom', lazy=True)
 
 class Comment(db.Model):
+    # Top-level comments of a video, newest first, paged by id
+    __table_args__ = (db.Index('ix_comment_video_id_parent_id_id', 'video_id', 'parent_id', 'id'),)
+
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     video_id = db.Column(db.Integer, db.ForeignKey('video.id'), nullable=False)
-    parent_id = db.Column(db.Integer, db.ForeignKey('comment.id'), nullable=True)
+    parent_id = db.Column(db.Integer, db.ForeignKey('comment.id'), nullable=True, index=True)
     replies = db.relationship('Comment', backref=db.backref('parent', remote_side=[id]), lazy=True)
 
 class ViewAnalytics(db.Model):
+    # Per-video reports, and the "first view by this user" checks of the rollups
+    __table_args__ = (db.Index('ix_view_analytics_video_id_user_id_start_time', 'video_id', 'user_id', 'start_time'),)
+
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     video_id = db.Column(db.Integer, db.ForeignKey('video.id'), nullable=False)
     start_time = db.Column(db.DateTime, default=datetime.utcnow)
     end_time = db.Column(db.DateTime)
@@ -100,6 +117,11 @@ class ViewAnalytics(db.Model):
     completed = db.Column(db.Boolean, default=False)
 
 class Notification(db.Model):
+    __table_args__ = (
+        db.Index('ix_notification_user_id_is_read', 'user_id', 'is_read'),  # Mark all read
+        db.Index('ix_notification_user_id_id', 'user_id', 'id'),  # Newest first, paginated
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  # Teacher who receives
     message = db.Column(db.Text, nullable=False)
@@ -121,7 +143,7 @@ class Quiz(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
-    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     video_id = db.Column(db.Integer, db.ForeignKey('video.id'), nullable=True) # Optional link to video
     classroom_id = db.Column(db.Integer, db.ForeignKey('classroom.id'), nullable=True) # Optional link to class
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -131,7 +153,7 @@ class Quiz(db.Model):
 
 class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
     text = db.Column(db.Text, nullable=False)
     option_a = db.Column(db.String(200), nullable=False)
     option_b = db.Column(db.String(200), nullable=False)
@@ -141,16 +163,19 @@ class Question(db.Model):
 
 class QuizResult(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
-    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     score = db.Column(db.Integer, nullable=False)
     total_questions = db.Column(db.Integer, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
 class ChatMessage(db.Model):
+    # Keyset pagination walks a classroom's history by id
+    __table_args__ = (db.Index('ix_chat_message_classroom_id_id', 'classroom_id', 'id'),)
+
     id = db.Column(db.Integer, primary_key=True)
     classroom_id = db.Column(db.Integer, db.ForeignKey('classroom.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -158,6 +183,9 @@ class ChatMessage(db.Model):
     classroom = db.relationship('Classroom', backref=db.backref('messages', lazy='dynamic', cascade="all, delete-orphan"))
 
 class Attendance(db.Model):
+    # One record per student, class and day; also serves lookups by student
+    __table_args__ = (db.Index('uq_attendance_student_class_date', 'student_id', 'classroom_id', 'date', unique=True),)
+
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     classroom_id = db.Column(db.Integer, db.ForeignKey('classroom.id'), nullable=False)
@@ -168,3 +196,113 @@ class Attendance(db.Model):
     # Backrefs
     # student backref via User.attendance_records
     classroom_rel = db.relationship('Classroom', backref=db.backref('attendance_history', lazy=True))
+
+class TranscodeJob(db.Model):
+    # Workers claim pending jobs in priority order
+    __table_args__ = (db.Index('ix_transcode_job_status_priority_created_at', 'status', 'priority', 'created_at'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id'), nullable=False, index=True)
+    input_path = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), default='pending')  # 'pending', 'processing', 'completed', 'failed'
+    priority = db.Column(db.Integer, default=0)  # Lower runs first; source duration in seconds
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)  # Pushed forward on retry backoff
+    last_error = db.Column(db.Text)
+    speed = db.Column(db.Float)  # Encode speed as a multiple of realtime, from ffmpeg -progress
+    eta_seconds = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    video = db.relationship('Video', backref=db.backref('transcode_jobs', lazy=True, cascade="all, delete-orphan"))
+
+class UploadSession(db.Model):
+    id = db.Column(db.String(32), primary_key=True)  # Random hex token handed to the client
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    title = db.Column(db.String(200), nullable=False)
+    filename = db.Column(db.String(300), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    checksum = db.Column(db.String(200))  # Optional 'algorithm:hexdigest' supplied by the client
+    status = db.Column(db.String(20), default='uploading')  # 'uploading', 'finalizing', 'completed', 'failed'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    chunks = db.relationship('UploadChunk', backref='upload', lazy=True, cascade="all, delete-orphan")
+
+class UploadChunk(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    upload_id = db.Column(db.String(32), db.ForeignKey('upload_session.id'), nullable=False, index=True)
+    offset = db.Column(db.BigInteger, nullable=False)
+    length = db.Column(db.BigInteger, nullable=False)
+
+class VideoStats(db.Model):
+    """Running engagement totals per video, maintained incrementally by rollups.py."""
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id'), primary_key=True)
+    views = db.Column(db.Integer, default=0, nullable=False)
+    unique_viewers = db.Column(db.Integer, default=0, nullable=False)
+    total_watch_seconds = db.Column(db.Float, default=0, nullable=False)
+    completions = db.Column(db.Integer, default=0, nullable=False)
+    percent_sum = db.Column(db.Float, default=0, nullable=False)  # avg percent_watched = percent_sum / views
+
+    video = db.relationship('Video', backref=db.backref('stats', uselist=False, lazy=True, cascade="all, delete-orphan"))
+
+class VideoDailyStats(db.Model):
+    """Same totals bucketed by the day a view started."""
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    views = db.Column(db.Integer, default=0, nullable=False)
+    unique_viewers = db.Column(db.Integer, default=0, nullable=False)
+    total_watch_seconds = db.Column(db.Float, default=0, nullable=False)
+    completions = db.Column(db.Integer, default=0, nullable=False)
+    percent_sum = db.Column(db.Float, default=0, nullable=False)
+
+    video = db.relationship('Video', backref=db.backref('daily_stats', lazy=True, cascade="all, delete-orphan"))
+
+class VideoRetention(db.Model):
+    """Audience-retention histogram per video, merged from heartbeat intervals by retention.py.
+
+    `watched` is a packed little-endian float32 array: seconds watched inside each
+    bucket of `bucket_seconds`, summed over every view (rewatches count again).
+    """
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id'), primary_key=True)
+    bucket_seconds = db.Column(db.Integer, nullable=False)
+    duration = db.Column(db.Float, default=0, nullable=False)  # Longest total_duration reported by players
+    watched = db.Column(db.LargeBinary, nullable=False, default=b'')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    video = db.relationship('Video', backref=db.backref('retention', uselist=False, lazy=True, cascade="all, delete-orphan"))
+
+class VideoRecommendation(db.Model):
+    """Top related videos per video, ranked from 0, built by recommendations.py.
+
+    The primary key makes the watch-page lookup one index range read.
+    """
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    related_id = db.Column(db.Integer, db.ForeignKey('video.id'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+
+    video = db.relationship('Video', foreign_keys=[video_id],
+        backref=db.backref('recommendations', lazy=True, cascade="all, delete-orphan"))
+    related = db.relationship('Video', foreign_keys=[related_id],
+        backref=db.backref('recommended_from', lazy=True, cascade="all, delete-orphan"))
+
+class MediaAsset(db.Model):
+    """Transcode output shared by every Video uploaded with the same bytes, keyed by BLAKE2b digest.
+
+    ref_count is the number of videos pointing at it; the HLS directory is
+    removed only when the last of them is deleted (see assets.py).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    digest = db.Column(db.String(128), nullable=False, unique=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # 'pending', 'encoding' (one job owns it), 'completed'
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    hls_playlist_path = db.Column(db.String(500))
+    thumbnail_path = db.Column(db.String(500))
+    preview_track_path = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    videos = db.relationship('Video', backref='asset', lazy=True)
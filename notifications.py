@@ -0,0 +1,196 @@
+import atexit
+import threading
+from datetime import datetime
+
+from sqlalchemy import bindparam, event
+
+from database import bulk_insert
+from extensions import db
+from models import Notification, User
+
+
+class NotificationService:
+    """Queued, batched notification delivery with a per-user unread counter.
+
+    notify() only appends to an in-memory queue, so the request that caused
+    the notification does not pay for a second transaction. Every
+    NOTIFY_FLUSH_INTERVAL seconds a background thread inserts the queued rows
+    with one bulk insert and raises each recipient's User.unread_notifications
+    with one executemany UPDATE, in the same transaction. Marking read lowers
+    the counter by exactly the rows that changed, so unread badges are a read
+    of the user row rather than a COUNT over Notification. Rows still queued
+    are written on shutdown; a hard crash loses at most one interval of them.
+    A row that cannot be written is retried NOTIFY_MAX_ATTEMPTS times, then dropped.
+    With NOTIFY_ASYNC off (the default under TESTING) notify() writes at once.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._queue = []
+        self._thread = None
+        self._stop = threading.Event()
+        self._metrics = {'flushes': 0, 'delivered': 0, 'dropped': 0, 'last_error': None}
+
+    def init_app(self, app):
+        app.config.setdefault('NOTIFY_FLUSH_INTERVAL', 1)
+        app.config.setdefault('NOTIFY_ASYNC', not app.testing)
+        app.config.setdefault('NOTIFY_PAGE_SIZE', 20)
+        app.config.setdefault('NOTIFY_MAX_ATTEMPTS', 5)  # Flushes a failing row is retried in
+        self.app = app
+        app.extensions['notifications'] = self
+        atexit.register(self.shutdown)
+
+    def start(self):
+        """Start the flush thread (idempotent)."""
+        with self._lock:
+            if self._thread:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='notification-flusher', daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        """Stop the flush thread and write whatever is still queued."""
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join(timeout=10)
+        self._thread = None
+        self.flush()
+
+    def notify(self, user_id, message, video_id=None, comment_id=None):
+        row = {
+            'user_id': user_id,
+            'message': message,
+            'video_id': video_id,
+            'comment_id': comment_id,
+            'is_read': False,
+            'created_at': datetime.utcnow()
+        }
+        with self._lock:
+            self._queue.append((row, 0))
+        if not self.app.config['NOTIFY_ASYNC']:
+            self.flush()
+        elif not self._thread:
+            self.start()
+
+    def _run(self):
+        interval = self.app.config['NOTIFY_FLUSH_INTERVAL']
+        while not self._stop.wait(interval):
+            self.flush()
+
+    def flush(self):
+        """Write the queue; returns the number of rows delivered.
+
+        If the batch fails, its rows are written one at a time, so one bad row
+        (say its video was deleted since) cannot hold back the others. Rows that
+        still fail go back to the front of the queue until they run out of attempts.
+        """
+        with self._lock:
+            if not self._queue:
+                return 0
+            batch, self._queue = self._queue, []
+        failed = []
+        with self.app.app_context():
+            try:
+                self._write([row for row, _ in batch])
+            except Exception as e:
+                db.session.rollback()
+                print(f"Notification batch of {len(batch)} failed, writing rows one by one: {e}")
+                for row, attempts in batch:
+                    try:
+                        self._write([row])
+                    except Exception as e:
+                        db.session.rollback()
+                        failed.append((row, attempts + 1, str(e)))
+        max_attempts = self.app.config['NOTIFY_MAX_ATTEMPTS']
+        retry = [(row, attempts) for row, attempts, _ in failed if attempts < max_attempts]
+        for row, attempts, error in failed:
+            if attempts >= max_attempts:
+                print(f"Dropping notification for user {row['user_id']} after {attempts} attempts: {error}")
+        with self._lock:
+            self._queue[:0] = retry
+            self._metrics['flushes'] += 1
+            self._metrics['delivered'] += len(batch) - len(failed)
+            self._metrics['dropped'] += len(failed) - len(retry)
+            self._metrics['last_error'] = failed[-1][2] if failed else None
+        return len(batch) - len(failed)
+
+    def _write(self, batch):
+        counts = {}
+        for row in batch:
+            counts[row['user_id']] = counts.get(row['user_id'], 0) + 1
+        bulk_insert(Notification, batch)
+        adjust_unread([{'uid': user_id, 'delta': count} for user_id, count in counts.items()])
+        db.session.commit()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._metrics, queued=len(self._queue))
+
+
+def adjust_unread(changes):
+    """Add each {'uid', 'delta'} to the user's counter in the database, in one executemany UPDATE."""
+    if not changes:
+        return
+    user_table = User.__table__
+    db.session.execute(
+        user_table.update()
+        .where(user_table.c.id == bindparam('uid'))
+        .values(unread_notifications=user_table.c.unread_notifications + bindparam('delta')),
+        changes
+    )
+
+def mark_all_read(user_id):
+    """Mark every unread notification of the user read; returns how many changed."""
+    changed = db.session.execute(
+        db.update(Notification).filter_by(user_id=user_id, is_read=False).values(is_read=True)
+    ).rowcount
+    adjust_unread([{'uid': user_id, 'delta': -changed}] if changed else [])
+    db.session.commit()
+    return changed
+
+def mark_read(user_id, notification_id):
+    """Mark one of the user's notifications read. The is_read check makes a repeat a no-op."""
+    changed = db.session.execute(
+        db.update(Notification).filter_by(id=notification_id, user_id=user_id, is_read=False).values(is_read=True)
+    ).rowcount
+    adjust_unread([{'uid': user_id, 'delta': -changed}] if changed else [])
+    db.session.commit()
+    return bool(changed)
+
+def notification_page(user_id, page, per_page):
+    """One page of the user's notifications, newest first, over the (user_id, id) index."""
+    query = db.select(Notification).where(Notification.user_id == user_id).order_by(Notification.id.desc())
+    return db.paginate(query, page=page, per_page=per_page, error_out=False)
+
+def recount_unread():
+    """Rebuild every counter from the Notification rows (repair after manual edits)."""
+    unread = (db.select(db.func.count(Notification.id))
+              .where(Notification.user_id == User.id, Notification.is_read == db.false())
+              .scalar_subquery())
+    updated = db.session.execute(db.update(User).values(unread_notifications=unread)).rowcount
+    db.session.commit()
+    return updated
+
+
+# Notifications added or removed one by one through the ORM (e.g. deleted along with
+# their video) move the counter too; the service's bulk path calls adjust_unread() itself
+@event.listens_for(Notification, 'after_insert')
+def _unread_added(mapper, connection, target):
+    if not target.is_read:
+        _bump(connection, target.user_id, 1)
+
+@event.listens_for(Notification, 'after_delete')
+def _unread_deleted(mapper, connection, target):
+    if target.is_read is False:
+        _bump(connection, target.user_id, -1)
+
+def _bump(connection, user_id, delta):
+    user_table = User.__table__
+    connection.execute(user_table.update().where(user_table.c.id == user_id)
+                       .values(unread_notifications=user_table.c.unread_notifications + delta))
+
+
+notifications = NotificationService()
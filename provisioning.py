@@ -0,0 +1,226 @@
+import atexit
+import csv
+import io
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from werkzeug.security import generate_password_hash
+
+from database import bulk_insert
+from extensions import db
+from models import Classroom, User, student_classes
+
+# Below this many passwords the pool's startup costs more than it saves
+MIN_POOL_PASSWORDS = 8
+# Usernames per IN (...) lookup; SQLite allows 32766 bound parameters per statement
+LOOKUP_CHUNK = 10000
+
+
+def parse_import(data, filename=''):
+    """Rows from an uploaded CSV or JSON file as (line, dict) pairs.
+
+    Columns: username, password, role, parent_name, parent_email, classes.
+    CSV needs a header row; JSON is a list of objects, or {"users": [...]}.
+    `classes` holds classroom names or ids, separated by ';' in CSV or as a
+    list in JSON. Raises ValueError when the file cannot be read at all.
+    """
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    if filename.lower().endswith('.json') or data.lstrip().startswith(('[', '{')):
+        try:
+            records = json.loads(data)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Invalid JSON: {e}')
+        if isinstance(records, dict):
+            records = records.get('users', records.get('students'))
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            raise ValueError('Expected a list of user objects')
+        return list(enumerate(records, start=1))
+
+    reader = csv.DictReader(io.StringIO(data))
+    if not reader.fieldnames or 'username' not in [f.strip().lower() for f in reader.fieldnames]:
+        raise ValueError('CSV needs a header row with a username column')
+    rows = []
+    for record in reader:
+        rows.append((reader.line_num, {(k or '').strip().lower(): v for k, v in record.items()}))
+    return rows
+
+def request_rows(request):
+    """parse_import() on a multipart 'file' upload, or on the raw request body."""
+    upload = request.files.get('file')
+    if upload:
+        return parse_import(upload.read(), upload.filename or '')
+    return parse_import(request.get_data())
+
+class HashPool:
+    """The process pool imported passwords are hashed on, created once per app.
+
+    Workers come from a forkserver rather than by forking the web process,
+    whose other threads may hold locks (the database pool, the event broker)
+    that a forked child would inherit held forever. Processes start on the
+    first import and are reused by later ones.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool = None
+        self.workers = None
+
+    def init_app(self, app):
+        self.shutdown()
+        self.workers = app.config['PROVISION_HASH_WORKERS'] or os.cpu_count() or 1
+        app.extensions['hash_pool'] = self
+        atexit.register(self.shutdown)
+
+    def map(self, passwords, workers):
+        """generate_password_hash over the pool, or over a pool of its own when `workers` differs."""
+        chunksize = max(1, len(passwords) // (workers * 4))
+        if workers != self.workers:
+            with _new_pool(min(workers, len(passwords))) as pool:
+                return list(pool.map(generate_password_hash, passwords, chunksize=chunksize))
+        with self._lock:
+            if self._pool is None:
+                self._pool = _new_pool(workers)
+            pool = self._pool
+        return list(pool.map(generate_password_hash, passwords, chunksize=chunksize))
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _new_pool(workers):
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver'))
+
+hash_pool = HashPool()
+
+def hash_passwords(passwords, workers=None):
+    """generate_password_hash over a process pool, in input order.
+
+    The KDF is deliberately slow (~0.1 s and 32 MB per password), so a few
+    thousand hashes only finish in a minute when every core works on them.
+    """
+    workers = workers or hash_pool.workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < MIN_POOL_PASSWORDS:
+        return [generate_password_hash(p) for p in passwords]
+    return hash_pool.map(passwords, workers)
+
+def _class_names(value):
+    if value is None or value == '':
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).split(';') if v.strip()]
+
+def _resolve_classes(names, classrooms):
+    """Map each class name or id to a classroom id; returns (ids, error)."""
+    ids = []
+    for name in names:
+        if name.isdigit() and int(name) in classrooms['ids']:
+            ids.append(int(name))
+            continue
+        matches = classrooms['names'].get(name.lower(), [])
+        if len(matches) != 1:
+            return None, f"{'Ambiguous' if matches else 'Unknown'} class '{name}'"
+        ids.append(matches[0])
+    return list(dict.fromkeys(ids)), None
+
+def provision_users(rows, default_role='student', allowed_roles=('student',), teacher_id=None,
+                    batch_size=1000, workers=None):
+    """Validate, hash and bulk-insert users from parse_import() rows, then enroll them.
+
+    Bad rows are skipped and reported; the rest are created in one transaction.
+    Classes are looked up among `teacher_id`'s classrooms, or all of them when
+    it is None. Existing usernames are found with one IN query per
+    LOOKUP_CHUNK names rather than one query per row.
+    Returns {'created': n, 'enrolled': n, 'errors': [{'line', 'username', 'error'}]}.
+    """
+    errors = []
+    valid = []
+    seen = set()
+    for line, record in rows:
+        username = str(record.get('username') or '').strip()
+        password = str(record.get('password') or '')
+        role = str(record.get('role') or default_role).strip().lower()
+        error = None
+        if not username:
+            error = 'Missing username'
+        elif len(username) > 150:
+            error = 'Username longer than 150 characters'
+        elif username in seen:
+            error = 'Duplicate username in file'
+        elif not password:
+            error = 'Missing password'
+        elif role not in allowed_roles:
+            error = f"Role '{role}' not allowed here"
+        elif record.get('parent_email') and '@' not in str(record['parent_email']):
+            error = 'Invalid parent_email'
+        if error:
+            errors.append({'line': line, 'username': username, 'error': error})
+            continue
+        seen.add(username)
+        valid.append((line, username, password, role, record))
+
+    names = [v[1] for v in valid]
+    existing = set()
+    for i in range(0, len(names), LOOKUP_CHUNK):
+        chunk = names[i:i + LOOKUP_CHUNK]
+        existing.update(db.session.scalars(db.select(User.username).where(User.username.in_(chunk))))
+
+    classes = Classroom.query.with_entities(Classroom.id, Classroom.name)
+    if teacher_id is not None:
+        classes = classes.filter_by(teacher_id=teacher_id)
+    classrooms = {'ids': set(), 'names': {}}
+    for class_id, name in classes:
+        classrooms['ids'].add(class_id)
+        classrooms['names'].setdefault(name.strip().lower(), []).append(class_id)
+
+    accepted = []
+    for line, username, password, role, record in valid:
+        if username in existing:
+            errors.append({'line': line, 'username': username, 'error': 'Username already exists'})
+            continue
+        class_ids, error = _resolve_classes(_class_names(record.get('classes')), classrooms)
+        if error:
+            errors.append({'line': line, 'username': username, 'error': error})
+            continue
+        if class_ids and role != 'student':
+            errors.append({'line': line, 'username': username, 'error': 'Only students can be enrolled in classes'})
+            continue
+        accepted.append((username, password, role, record, class_ids))
+
+    result = {'created': 0, 'enrolled': 0, 'errors': sorted(errors, key=lambda e: e['line'])}
+    if not accepted:
+        return result
+
+    hashes = hash_passwords([a[1] for a in accepted], workers)
+    now = datetime.utcnow()
+    users = [{
+        'username': username,
+        'password_hash': password_hash,
+        'role': role,
+        'xp': 0,
+        'parent_name': str(record.get('parent_name') or '').strip() or None,
+        'parent_email': str(record.get('parent_email') or '').strip() or None,
+        'created_at': now
+    } for (username, _, role, record, _), password_hash in zip(accepted, hashes)]
+    result['created'] = bulk_insert(User, users, batch_size=batch_size)
+
+    enrolling = [a for a in accepted if a[4]]
+    if enrolling:
+        created = [a[0] for a in enrolling]
+        ids = {}
+        for i in range(0, len(created), LOOKUP_CHUNK):
+            chunk = created[i:i + LOOKUP_CHUNK]
+            ids.update(db.session.execute(db.select(User.username, User.id).where(User.username.in_(chunk))).all())
+        enrollments = [{'student_id': ids[username], 'classroom_id': class_id}
+                       for username, _, _, _, class_ids in enrolling for class_id in class_ids]
+        result['enrolled'] = bulk_insert(student_classes, enrollments, batch_size=batch_size)
+    db.session.commit()
+    return result
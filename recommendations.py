@@ -0,0 +1,216 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from database import bulk_insert
+from extensions import db
+from models import Question, Quiz, Video, VideoRecommendation, ViewAnalytics, playlist_videos
+
+TOP_K = 10  # Neighbours stored per video
+WEIGHTS = {'text': 0.5, 'playlists': 0.3, 'viewers': 0.2}  # Share of each signal in a score
+MAX_TERMS = 4096  # Vocabulary cap: the terms shared by the most videos are kept
+BLOCK_ROWS = 256  # Similarity rows computed per matrix product
+MIN_SCORE = 1e-6
+STOPWORDS = frozenset('a an and are as at be by for from how in into is it its of on or the to what when which '
+                      'why with you your'.split())
+TOKEN = re.compile(r'[a-z0-9]{2,}')
+
+
+def related_videos(video, limit=5):
+    """Recommended completed videos for the watch page, best first.
+
+    One range read of the (video_id, rank) primary key. A video with no
+    recommendations yet gets its uploader's latest completed videos instead.
+    """
+    related = Video.query.join(VideoRecommendation, VideoRecommendation.related_id == Video.id).filter(
+        VideoRecommendation.video_id == video.id, Video.status == 'completed'
+    ).order_by(VideoRecommendation.rank).limit(limit).all()
+    if related:
+        return related
+    return Video.query.filter(Video.uploader_id == video.uploader_id, Video.id != video.id,
+                              Video.status == 'completed').order_by(Video.upload_date.desc()).limit(limit).all()
+
+def feature_matrix():
+    """(video_ids, X): one L2-normalised row per completed video, so X @ X.T is the weighted score.
+
+    X stacks three blocks, each of unit-length rows scaled by sqrt(weight):
+    TF-IDF of the title and linked quiz text, the playlists the video is in,
+    and the users who watched it. Playlists and viewers are weighted like terms,
+    so a playlist of everything or a user who watches everything counts for
+    little. Terms, playlists and users seen with a single video are dropped,
+    since they relate it to nothing.
+    """
+    rows = db.session.query(Video.id, Video.title).filter_by(status='completed').order_by(Video.id).all()
+    video_ids = [video_id for video_id, _ in rows]
+    index = {video_id: i for i, video_id in enumerate(video_ids)}
+    texts = [[title] for _, title in rows]
+    quiz_text = db.session.query(Quiz.video_id, Quiz.title, Quiz.description).filter(Quiz.video_id.isnot(None))
+    question_text = db.session.query(Quiz.video_id, Question.text).join(Question, Question.quiz_id == Quiz.id) \
+        .filter(Quiz.video_id.isnot(None))
+    for video_id, *parts in list(quiz_text) + list(question_text):
+        if video_id in index:
+            texts[index[video_id]].extend(part for part in parts if part)
+
+    tokens = [[t for t in TOKEN.findall(' '.join(parts).lower()) if t not in STOPWORDS] for parts in texts]
+    blocks = {
+        'text': _tfidf(tokens),
+        'playlists': _incidence(db.session.query(playlist_videos.c.video_id, playlist_videos.c.playlist_id), index),
+        'viewers': _incidence(db.session.query(ViewAnalytics.video_id, ViewAnalytics.user_id).distinct(), index),
+    }
+    X = np.hstack([block * math.sqrt(WEIGHTS[name]) for name, block in blocks.items()])
+    return video_ids, X.astype(np.float32)
+
+def _tfidf(tokens):
+    """Unit-length TF-IDF rows over the terms shared by 2+ videos.
+
+    Lengths include the dropped terms, so a title whose only shared word is
+    a common one is not mistaken for a close match.
+    """
+    df = Counter()
+    for terms in tokens:
+        df.update(set(terms))
+    vocab = [term for term, count in df.most_common(MAX_TERMS) if count > 1]
+    columns = {term: j for j, term in enumerate(vocab)}
+    matrix = np.zeros((len(tokens), len(vocab)), dtype=np.float32)
+    norms = np.ones(len(tokens), dtype=np.float32)
+    for i, terms in enumerate(tokens):
+        weights = {term: (1 + math.log(count)) * _idf(df[term], len(tokens)) for term, count in Counter(terms).items()}
+        if weights:
+            norms[i] = math.sqrt(sum(w * w for w in weights.values()))
+        for term, weight in weights.items():
+            if term in columns:
+                matrix[i, columns[term]] = weight
+    return matrix / norms[:, None]
+
+def _incidence(pairs, index):
+    """Unit-length video x group rows from (video_id, group) pairs, with groups weighted by rarity."""
+    members = defaultdict(list)
+    for video_id, group in pairs:
+        if video_id in index:
+            members[group].append(index[video_id])
+    shared = [rows for rows in members.values() if len(rows) > 1]
+    matrix = np.zeros((len(index), len(shared)), dtype=np.float32)
+    for j, rows in enumerate(shared):
+        matrix[rows, j] = _idf(len(rows), len(index))
+    squares = np.zeros(len(index), dtype=np.float32)
+    for rows in members.values():
+        squares[rows] += _idf(len(rows), len(index)) ** 2
+    return matrix / np.sqrt(np.where(squares == 0, 1, squares))[:, None]
+
+def _idf(frequency, n):
+    return math.log((1 + n) / (1 + frequency)) + 1
+
+def nearest(X, rows, video_ids, top_k=TOP_K):
+    """{video_id: [(related_id, score), ...]} for the given row indices, best first.
+
+    Scores are computed BLOCK_ROWS rows at a time, so memory stays at
+    BLOCK_ROWS x videos whatever the catalogue size.
+    """
+    neighbours = {}
+    k = min(top_k, len(video_ids))
+    for start in range(0, len(rows), BLOCK_ROWS):
+        block = rows[start:start + BLOCK_ROWS]
+        scores = X[block] @ X.T
+        scores[range(len(block)), block] = 0  # Never recommend the video itself
+        candidates = scores.argpartition(-k, axis=1)[:, -k:]
+        for r, i in enumerate(block):
+            row = sorted(candidates[r], key=lambda j: (-scores[r, j], j))
+            neighbours[video_ids[i]] = [(video_ids[j], float(scores[r, j])) for j in row if scores[r, j] > MIN_SCORE]
+    return neighbours
+
+def _store(neighbours):
+    rows = [{'video_id': video_id, 'rank': rank, 'related_id': related_id, 'score': score}
+            for video_id, related in neighbours.items() for rank, (related_id, score) in enumerate(related)]
+    bulk_insert(VideoRecommendation, rows)
+    return len(rows)
+
+def rebuild_recommendations(top_k=TOP_K):
+    """Recompute every video's neighbours. Returns (videos, rows written)."""
+    video_ids, X = feature_matrix()
+    neighbours = nearest(X, list(range(len(video_ids))), video_ids, top_k)
+    VideoRecommendation.query.delete()
+    written = _store(neighbours)
+    db.session.commit()
+    return len(video_ids), written
+
+def refresh_recommendations(*new_ids, top_k=TOP_K):
+    """Fold newly completed videos into the index. Returns the number of videos rewritten.
+
+    Rewrites the new videos' own neighbours and those of every video one of
+    them now outranks the stored k-th neighbour of; only those writes are
+    incremental. Building the feature matrix still reads every completed
+    video, all quiz text, playlists and distinct viewers, so a call costs
+    about as much as a rebuild's read side; pass a batch of ids (see
+    RefreshQueue) rather than calling it per video. Term weights drift
+    slightly as the catalogue grows, which an occasional
+    `flask rebuild-recommendations` resets.
+    """
+    video_ids, X = feature_matrix()
+    index = {vid: i for i, vid in enumerate(video_ids)}
+    positions = sorted({index[vid] for vid in new_ids if vid in index})
+    if not positions:
+        return 0
+    scores = (X @ X[positions].T).max(axis=1)  # Best score against any of the new videos
+    stored = {vid: (count, floor) for vid, count, floor in db.session.query(
+        VideoRecommendation.video_id, db.func.count(), db.func.min(VideoRecommendation.score)
+    ).group_by(VideoRecommendation.video_id)}
+    new_positions = set(positions)
+    rows = list(positions)
+    for i, vid in enumerate(video_ids):
+        if i not in new_positions and scores[i] > MIN_SCORE:
+            count, floor = stored.get(vid, (0, 0.0))
+            if count < top_k or scores[i] > floor:
+                rows.append(i)
+    neighbours = nearest(X, rows, video_ids, top_k)
+    VideoRecommendation.query.filter(VideoRecommendation.video_id.in_(list(neighbours))).delete(
+        synchronize_session=False)
+    _store(neighbours)
+    db.session.commit()
+    return len(rows)
+
+
+class RefreshQueue:
+    """Batches refresh_recommendations() calls off the transcode path.
+
+    add() records a completed video and returns at once; RECOMMEND_REFRESH_DELAY
+    seconds after the first pending id a timer thread refreshes everything
+    queued since with a single feature matrix. Ids still pending when the
+    process exits are lost until the next rebuild, and the watch page falls
+    back to the uploader's videos meanwhile. With RECOMMEND_REFRESH_ASYNC off
+    (the default under TESTING) add() refreshes immediately.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._timer = None
+
+    def add(self, app, video_id):
+        if not app.config.get('RECOMMEND_REFRESH_ASYNC', not app.testing):
+            self._refresh([video_id])
+            return
+        with self._lock:
+            self._pending.add(video_id)
+            if self._timer is None:
+                self._timer = threading.Timer(app.config.get('RECOMMEND_REFRESH_DELAY', 60), self._run, args=(app,))
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _run(self, app):
+        with self._lock:
+            video_ids, self._pending, self._timer = self._pending, set(), None
+        with app.app_context():
+            self._refresh(video_ids)
+
+    def _refresh(self, video_ids):
+        try:
+            refresh_recommendations(*video_ids)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error refreshing recommendations for video(s) {sorted(video_ids)}: {e}")
+
+
+refresh_queue = RefreshQueue()
@@ -0,0 +1,156 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from database import read_session
+from extensions import db
+from models import User, Video, VideoDailyStats, VideoStats, ViewAnalytics
+
+
+def parse_report_filters(args):
+    """Read ?start=YYYY-MM-DD&end=YYYY-MM-DD&video_id=&student_id= into a filter dict. Bad values are ignored."""
+    filters = {
+        'video_id': args.get('video_id', type=int),
+        'student_id': args.get('student_id', type=int),
+        'start': None,
+        'end': None
+    }
+    for key in ('start', 'end'):
+        value = args.get(key)
+        if value:
+            try:
+                filters[key] = datetime.strptime(value, '%Y-%m-%d').date()
+            except ValueError:
+                pass
+    return filters
+
+def month_bounds(day):
+    """[first day of day's month, first day of the next month) for index-friendly range filters."""
+    start = day.replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+def _apply_filters(query, teacher_id, filters):
+    query = query.filter(Video.uploader_id == teacher_id)
+    if filters.get('video_id'):
+        query = query.filter(ViewAnalytics.video_id == filters['video_id'])
+    if filters.get('student_id'):
+        query = query.filter(ViewAnalytics.user_id == filters['student_id'])
+    # Half-open datetime ranges rather than date() on the column, so an index can be used
+    if filters.get('start'):
+        query = query.filter(ViewAnalytics.start_time >= datetime.combine(filters['start'], datetime.min.time()))
+    if filters.get('end'):
+        query = query.filter(ViewAnalytics.start_time < datetime.combine(filters['end'] + timedelta(days=1), datetime.min.time()))
+    return query
+
+def view_rows_query(teacher_id, filters):
+    """Every view of the teacher's videos with title and student name, joined in one query."""
+    query = read_session().query(
+        ViewAnalytics.id.label('view_id'),
+        Video.id.label('video_id'),
+        Video.title.label('video_title'),
+        ViewAnalytics.user_id.label('student_id'),
+        db.func.coalesce(User.username, 'Unknown').label('student_name'),
+        ViewAnalytics.start_time,
+        ViewAnalytics.end_time,
+        ViewAnalytics.duration_seconds.label('duration'),
+        ViewAnalytics.percent_watched,
+        ViewAnalytics.completed
+    ).join(Video, Video.id == ViewAnalytics.video_id).outerjoin(User, User.id == ViewAnalytics.user_id)
+    return _apply_filters(query, teacher_id, filters).order_by(ViewAnalytics.start_time.desc(), ViewAnalytics.id.desc())
+
+def view_summary(teacher_id, filters):
+    """Per-video totals for the filtered views.
+
+    Read from the VideoStats / VideoDailyStats rollups, so the cost grows with
+    the number of videos (and days) rather than view events. A student filter
+    needs the raw rows and falls back to one GROUP BY over ViewAnalytics. Over a
+    date range, unique_viewers is the sum of each day's unique viewers.
+    """
+    if filters.get('student_id'):
+        return _raw_view_summary(teacher_id, filters)
+
+    dated = filters.get('start') or filters.get('end')
+    stats = VideoDailyStats if dated else VideoStats
+    total = db.func.sum if dated else (lambda column: column)
+    query = read_session().query(
+        Video.id.label('video_id'),
+        Video.title.label('video_title'),
+        total(stats.views).label('views'),
+        total(stats.unique_viewers).label('unique_viewers'),
+        total(stats.total_watch_seconds).label('total_seconds'),
+        total(stats.completions).label('completions'),
+        total(stats.percent_sum).label('percent_sum')
+    ).join(stats, stats.video_id == Video.id).filter(Video.uploader_id == teacher_id)
+    if filters.get('video_id'):
+        query = query.filter(Video.id == filters['video_id'])
+    if dated:
+        if filters.get('start'):
+            query = query.filter(VideoDailyStats.day >= filters['start'])
+        if filters.get('end'):
+            query = query.filter(VideoDailyStats.day <= filters['end'])
+        query = query.group_by(Video.id, Video.title)
+    summary = []
+    for row in query.order_by(db.desc('views')).all():
+        record = row._asdict()
+        percent_sum = record.pop('percent_sum') or 0
+        record['avg_percent'] = percent_sum / record['views'] if record['views'] else 0
+        summary.append(record)
+    return summary
+
+def _raw_view_summary(teacher_id, filters):
+    query = read_session().query(
+        Video.id.label('video_id'),
+        Video.title.label('video_title'),
+        db.func.count(ViewAnalytics.id).label('views'),
+        db.func.count(db.distinct(ViewAnalytics.user_id)).label('unique_viewers'),
+        db.func.coalesce(db.func.sum(ViewAnalytics.duration_seconds), 0).label('total_seconds'),
+        db.func.sum(db.case((ViewAnalytics.completed == True, 1), else_=0)).label('completions'),
+        db.func.coalesce(db.func.avg(ViewAnalytics.percent_watched), 0).label('avg_percent')
+    ).join(Video, Video.id == ViewAnalytics.video_id)
+    query = _apply_filters(query, teacher_id, filters).group_by(Video.id, Video.title).order_by(db.desc('views'))
+    return [row._asdict() for row in query.all()]
+
+def view_trend(teacher_id, filters):
+    """Daily views, watch time and completions across the teacher's videos, from VideoDailyStats."""
+    query = read_session().query(
+        VideoDailyStats.day,
+        db.func.sum(VideoDailyStats.views).label('views'),
+        db.func.sum(VideoDailyStats.total_watch_seconds).label('total_seconds'),
+        db.func.sum(VideoDailyStats.completions).label('completions')
+    ).join(Video, Video.id == VideoDailyStats.video_id).filter(Video.uploader_id == teacher_id)
+    if filters.get('video_id'):
+        query = query.filter(VideoDailyStats.video_id == filters['video_id'])
+    if filters.get('start'):
+        query = query.filter(VideoDailyStats.day >= filters['start'])
+    if filters.get('end'):
+        query = query.filter(VideoDailyStats.day <= filters['end'])
+    return [row._asdict() for row in query.group_by(VideoDailyStats.day).order_by(VideoDailyStats.day).all()]
+
+EXPORT_COLUMNS = ['view_id', 'video_id', 'video_title', 'student_id', 'student_name',
+                  'start_time', 'end_time', 'duration', 'percent_watched', 'completed']
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def iter_export(query, fmt, batch_size=1000):
+    """Yield a CSV or JSON export chunk by chunk; rows are fetched batch_size at a time, never all at once."""
+    rows = query.yield_per(batch_size)
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for i, row in enumerate(rows, 1):
+            writer.writerow([_export_value(getattr(row, col)) for col in EXPORT_COLUMNS])
+            if i % batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        yield '['
+        for i, row in enumerate(rows):
+            record = {col: _export_value(getattr(row, col)) for col in EXPORT_COLUMNS}
+            yield (',' if i else '') + json.dumps(record)
+        yield ']'
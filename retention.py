@@ -0,0 +1,114 @@
+from datetime import datetime
+
+import numpy as np
+from flask import current_app
+
+from extensions import db
+from models import VideoRetention, VideoStats
+
+BLOB_DTYPE = np.dtype('<f4')
+
+
+def coverage_histogram(intervals, bucket_seconds, n_buckets):
+    """Seconds of [start, end) intervals that fall in each fixed-size bucket.
+
+    Vectorized: coverage up to x is sum(clip(x - start)) - sum(clip(x - end)), which
+    a sort and prefix sums give for every bucket edge at once, so the cost is
+    O((intervals + buckets) log intervals) whatever the interval lengths.
+    """
+    if not len(intervals) or n_buckets <= 0:
+        return np.zeros(max(n_buckets, 0), dtype=np.float64)
+    intervals = np.asarray(intervals, dtype=np.float64)
+    edges = np.arange(n_buckets + 1, dtype=np.float64) * bucket_seconds
+
+    def covered_before(points):
+        points = np.sort(points)
+        prefix = np.concatenate(([0.0], np.cumsum(points)))
+        count = np.searchsorted(points, edges, side='right')
+        return count * edges - prefix[count]
+
+    covered = covered_before(intervals[:, 0]) - covered_before(intervals[:, 1])
+    return np.diff(covered)
+
+def clean_intervals(raw, limit=100):
+    """Validate [[start, end], ...] from a heartbeat. Returns a list of float pairs, or None if malformed."""
+    if raw is None:
+        return []
+    if not isinstance(raw, list) or len(raw) > limit:
+        return None
+    intervals = []
+    for pair in raw:
+        if not isinstance(pair, (list, tuple)) or len(pair) != 2:
+            return None
+        start, end = pair
+        if not isinstance(start, (int, float)) or not isinstance(end, (int, float)) or isinstance(start, bool):
+            return None
+        if 0 <= start < end:
+            intervals.append((float(start), float(end)))
+    return intervals
+
+def _load(row):
+    return np.frombuffer(row.watched, dtype=BLOB_DTYPE).astype(np.float64)
+
+def merge_intervals(video_intervals, durations=None):
+    """Add watched intervals to each video's histogram. Call inside the writer's transaction.
+
+    `video_intervals` maps video_id -> list of (start, end) seconds; `durations`
+    optionally maps video_id -> total duration reported by the player.
+    """
+    if not video_intervals:
+        return
+    durations = durations or {}
+    bucket_seconds = current_app.config['RETENTION_BUCKET_SECONDS']
+    max_seconds = current_app.config['RETENTION_MAX_SECONDS']
+    existing = {row.video_id: row for row in
+                VideoRetention.query.filter(VideoRetention.video_id.in_(list(video_intervals)))}
+    for video_id, intervals in video_intervals.items():
+        row = existing.get(video_id)
+        if row is None:
+            row = VideoRetention(video_id=video_id, bucket_seconds=bucket_seconds, duration=0, watched=b'')
+            db.session.add(row)
+        intervals = np.clip(np.asarray(intervals, dtype=np.float64), 0, max_seconds)
+        duration = min(max(row.duration or 0, durations.get(video_id) or 0, float(intervals[:, 1].max())), max_seconds)
+        n_buckets = int(np.ceil(duration / row.bucket_seconds))
+        current = _load(row)
+        merged = np.zeros(max(n_buckets, len(current)), dtype=np.float64)
+        merged[:len(current)] = current
+        merged += coverage_histogram(intervals, row.bucket_seconds, len(merged))
+        row.duration = duration
+        row.watched = merged.astype(BLOB_DTYPE).tobytes()
+        row.updated_at = datetime.utcnow()
+
+def retention_curves(video_ids):
+    """Retention per video as {video_id: {...}}: the average number of times each bucket was watched per view.
+
+    A value of 1.0 means every view covered that bucket once; higher means rewatching.
+    All histograms are stacked into one matrix so normalisation is a single array operation.
+    """
+    rows = VideoRetention.query.filter(VideoRetention.video_id.in_(video_ids)).all()
+    views = dict(db.session.query(VideoStats.video_id, VideoStats.views).filter(VideoStats.video_id.in_(video_ids)))
+    if not rows:
+        return {}
+    histograms = [_load(row) for row in rows]
+    width = max(len(h) for h in histograms)
+    matrix = np.zeros((len(rows), width), dtype=np.float64)
+    lengths = np.zeros((len(rows), width), dtype=np.float64)
+    for i, (row, histogram) in enumerate(zip(rows, histograms)):
+        matrix[i, :len(histogram)] = histogram
+        # Every bucket is bucket_seconds long except the last, which ends at the video's duration
+        starts = np.arange(len(histogram)) * row.bucket_seconds
+        lengths[i, :len(histogram)] = np.clip(row.duration - starts, 0, row.bucket_seconds)
+    view_counts = np.array([max(views.get(row.video_id) or 0, 1) for row in rows], dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        curves = np.where(lengths > 0, matrix / (lengths * view_counts[:, None]), 0.0)
+
+    return {
+        row.video_id: {
+            'video_id': row.video_id,
+            'bucket_seconds': row.bucket_seconds,
+            'duration': row.duration,
+            'views': views.get(row.video_id) or 0,
+            'retention': np.round(curves[i, :len(histogram)], 4).tolist()
+        }
+        for i, (row, histogram) in enumerate(zip(rows, histograms))
+    }
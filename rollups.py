@@ -0,0 +1,111 @@
+from datetime import date, datetime
+
+from database import bulk_insert, dialect_insert
+from extensions import db
+from models import VideoDailyStats, VideoStats, ViewAnalytics
+
+METRICS = ('views', 'unique_viewers', 'total_watch_seconds', 'completions', 'percent_sum')
+
+
+def apply_increments(model, key_columns, rows):
+    """Add each row's metric deltas to its rollup row, creating it when missing.
+
+    `rows` are dicts holding the key columns plus any METRICS deltas. Uses a
+    single INSERT ... ON CONFLICT DO UPDATE executemany where the dialect has it.
+    """
+    if not rows:
+        return
+    rows = [dict({metric: 0 for metric in METRICS}, **row) for row in rows]
+    insert = dialect_insert(model)
+    if insert is not None:
+        table = model.__table__
+        statement = insert.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={metric: table.c[metric] + insert.excluded[metric] for metric in METRICS}
+        )
+        db.session.execute(statement, rows)
+        return
+    for row in rows:
+        key = tuple(row[column] for column in key_columns)
+        stats = db.session.get(model, key if len(key) > 1 else key[0])
+        if stats is None:
+            db.session.add(model(**row))
+        else:
+            for metric in METRICS:
+                setattr(stats, metric, getattr(stats, metric) + row[metric])
+
+def record_view_started(view):
+    """Count a new ViewAnalytics row. Call before committing it; two indexed EXISTS checks decide uniqueness."""
+    started = view.start_time or datetime.utcnow()
+    day = started.date()
+    earlier = ViewAnalytics.query.filter(
+        ViewAnalytics.video_id == view.video_id,
+        ViewAnalytics.user_id == view.user_id
+    )
+    if view.id is not None:
+        earlier = earlier.filter(ViewAnalytics.id != view.id)
+    first_ever = not db.session.query(earlier.exists()).scalar()
+    day_start = datetime.combine(day, datetime.min.time())
+    first_today = first_ever or not db.session.query(earlier.filter(ViewAnalytics.start_time >= day_start).exists()).scalar()
+
+    apply_increments(VideoStats, ['video_id'], [{'video_id': view.video_id, 'views': 1, 'unique_viewers': int(first_ever)}])
+    apply_increments(VideoDailyStats, ['video_id', 'day'], [{'video_id': view.video_id, 'day': day, 'views': 1,
+                                                             'unique_viewers': int(first_today)}])
+
+def record_view_updates(changes):
+    """Fold heartbeat changes into the rollups.
+
+    `changes` is a list of (old, new) dicts with video_id, start_time, duration_seconds,
+    percent_watched and completed, as read before and written by a heartbeat flush.
+    """
+    totals = {}
+    daily = {}
+    for old, new in changes:
+        delta = {
+            'total_watch_seconds': (new['duration_seconds'] or 0) - (old['duration_seconds'] or 0),
+            'percent_sum': (new['percent_watched'] or 0) - (old['percent_watched'] or 0),
+            'completions': int(bool(new['completed']) and not old['completed'])
+        }
+        day = (old['start_time'] or datetime.utcnow()).date()
+        for bucket, key in ((totals, old['video_id']), (daily, (old['video_id'], day))):
+            acc = bucket.setdefault(key, dict.fromkeys(delta, 0))
+            for metric, value in delta.items():
+                acc[metric] += value
+
+    apply_increments(VideoStats, ['video_id'], [dict(d, video_id=k) for k, d in totals.items()])
+    apply_increments(VideoDailyStats, ['video_id', 'day'],
+                     [dict(d, video_id=k[0], day=k[1]) for k, d in daily.items()])
+
+def _day_expression(column):
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return db.func.date(column)
+    return db.cast(column, db.Date)
+
+def rebuild_rollups(batch_size=1000):
+    """Recompute both rollup tables from raw ViewAnalytics. Returns (video rows, day rows) written."""
+    aggregates = (
+        db.func.count(ViewAnalytics.id),
+        db.func.count(db.distinct(ViewAnalytics.user_id)),
+        db.func.coalesce(db.func.sum(ViewAnalytics.duration_seconds), 0),
+        db.func.sum(db.case((ViewAnalytics.completed == True, 1), else_=0)),
+        db.func.coalesce(db.func.sum(ViewAnalytics.percent_watched), 0)
+    )
+    VideoDailyStats.query.delete()
+    VideoStats.query.delete()
+
+    totals = [dict(zip(('video_id',) + METRICS, row))
+              for row in db.session.query(ViewAnalytics.video_id, *aggregates).group_by(ViewAnalytics.video_id)]
+    bulk_insert(VideoStats, totals, batch_size)
+
+    day = _day_expression(ViewAnalytics.start_time)
+    daily = []
+    for row in db.session.query(ViewAnalytics.video_id, day, *aggregates).group_by(ViewAnalytics.video_id, day):
+        record = dict(zip(('video_id', 'day') + METRICS, row))
+        if isinstance(record['day'], str):
+            record['day'] = date.fromisoformat(record['day'])
+        if record['day'] is not None:
+            daily.append(record)
+    bulk_insert(VideoDailyStats, daily, batch_size)
+
+    db.session.commit()
+    return len(totals), len(daily)
@@ -0,0 +1,27 @@
+from importlib import import_module
+
+from flask import current_app, url_for
+
+BLUEPRINTS = ('main', 'admin', 'teacher', 'videos', 'student', 'quiz', 'analytics', 'attendance', 'chatroom')
+
+
+def register_blueprints(app):
+    """Import and register every blueprint, then route pre-blueprint endpoint names to them."""
+    for name in BLUEPRINTS:
+        app.register_blueprint(import_module(f'routes.{name}').bp)
+
+    # Templates written before the split call url_for('login'), url_for('watch_video', ...) and so on
+    legacy = {}
+    for rule in app.url_map.iter_rules():
+        blueprint, _, endpoint = rule.endpoint.rpartition('.')
+        if blueprint:
+            assert legacy.get(endpoint, rule.endpoint) == rule.endpoint, f'Endpoint {endpoint} is ambiguous'
+            legacy[endpoint] = rule.endpoint
+    app.extensions['legacy_endpoints'] = legacy
+    app.url_build_error_handlers.append(_legacy_url)
+
+def _legacy_url(error, endpoint, values):
+    target = current_app.extensions['legacy_endpoints'].get(endpoint)
+    if target is None:
+        return None  # Let Flask raise the original BuildError
+    return url_for(target, **values)
@@ -0,0 +1,176 @@
+import os
+from datetime import datetime
+
+from flask import Blueprint, current_app, render_template, redirect, url_for, request, flash, jsonify
+from flask_login import login_required, current_user
+from werkzeug.utils import secure_filename
+
+from cache import cache, invalidate_catalog, invalidate_settings, invalidate_students
+from database import sqlite_settings
+from extensions import db
+from models import User, SiteSettings
+from provisioning import provision_users, request_rows
+from uploads import allowed_image_file
+
+bp = Blueprint('admin', __name__)
+
+
+@bp.route('/admin')
+@login_required
+def admin_dashboard():
+    if current_user.role != 'admin':
+        return redirect(url_for('main.index'))
+    teachers = User.query.filter_by(role='teacher').all()
+    teacher_count = User.query.filter_by(role='teacher').count()
+    student_count = User.query.filter_by(role='student').count()
+    settings = SiteSettings.query.first()
+    return render_template('admin_dashboard.html', teachers=teachers, teacher_count=teacher_count, student_count=student_count, settings=settings)
+
+@bp.route('/admin/add_teacher', methods=['POST'])
+@login_required
+def add_teacher():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    username = request.form.get('username')
+    password = request.form.get('password')
+    
+    if User.query.filter_by(username=username).first():
+        flash('Username already exists.', 'error')
+    else:
+        new_teacher = User(username=username, role='teacher')
+        new_teacher.set_password(password)
+        db.session.add(new_teacher)
+        db.session.commit()
+        flash('Teacher added successfully.', 'success')
+    return redirect(url_for('admin.admin_dashboard'))
+
+@bp.route('/api/admin/import_users', methods=['POST'])
+@login_required
+def import_users():
+    """Bulk-create teachers and students from a CSV/JSON upload; role defaults to teacher."""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    try:
+        rows = request_rows(request)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if len(rows) > current_app.config['IMPORT_MAX_ROWS']:
+        return jsonify({'error': f"At most {current_app.config['IMPORT_MAX_ROWS']} rows per import"}), 413
+    
+    result = provision_users(rows, default_role='teacher', allowed_roles=('teacher', 'student'),
+                             workers=current_app.config['PROVISION_HASH_WORKERS'])
+    if result['created']:
+        invalidate_students()
+    return jsonify(result)
+
+@bp.route('/admin/change_teacher_password', methods=['POST'])
+@login_required
+def change_teacher_password():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    user_id = request.form.get('user_id')
+    new_password = request.form.get('new_password')
+    
+    teacher = User.query.get(user_id)
+    if teacher and teacher.role == 'teacher':
+        teacher.set_password(new_password)
+        db.session.commit()
+        flash('Password updated successfully.', 'success')
+    else:
+        flash('Error updating password.', 'error')
+    return redirect(url_for('admin.admin_dashboard'))
+
+@bp.route('/admin/delete_teacher/<int:user_id>', methods=['POST'])
+@login_required
+def delete_teacher(user_id):
+    if current_user.role != 'admin': return 'Unauthorized', 403
+    teacher = User.query.get_or_404(user_id)
+    if teacher.role == 'teacher':
+        db.session.delete(teacher)
+        db.session.commit()
+        invalidate_catalog()  # Their videos and playlists went with them
+        flash('Teacher deleted.', 'success')
+    return redirect(url_for('admin.admin_dashboard'))
+
+# ---- Site Settings & Features ----
+@bp.route('/admin/settings', methods=['POST'])
+@login_required
+def admin_settings():
+    if current_user.role != 'admin': return 'Unauthorized', 403
+    
+    lock_speed = request.form.get('lock_speed') == 'on'
+    lock_skipping = request.form.get('lock_skipping') == 'on'
+    
+    settings = SiteSettings.query.first()
+    if not settings:
+        settings = SiteSettings()
+        db.session.add(settings)
+    
+    settings.lock_video_speed = lock_speed
+    settings.lock_video_skipping = lock_skipping
+    
+    # Global Playlist Thumbnail
+    thumb = request.files.get('global_thumbnail')
+    if thumb and allowed_image_file(thumb.filename):
+        filename = secure_filename(thumb.filename)
+        save_name = f"global_thumb_{filename}"
+        path = os.path.join(current_app.config['UPLOAD_FOLDER'], save_name)
+        thumb.save(path)
+        settings.global_playlist_thumbnail = f'uploads/{save_name}'
+        
+    db.session.commit()
+    invalidate_settings()
+    flash('Settings updated.', 'success')
+    return redirect(url_for('admin.admin_dashboard'))
+
+@bp.route('/admin/levels_pdf')
+@login_required
+def levels_pdf():
+    if current_user.role != 'admin': return 'Unauthorized', 403
+    teachers = User.query.filter_by(role='teacher').order_by(User.xp.desc()).all()
+    students = User.query.filter_by(role='student').order_by(User.xp.desc()).all()
+    settings = SiteSettings.query.first()
+    return render_template('levels_pdf.html', teachers=teachers, students=students, datetime=datetime, settings=settings)
+
+# ---- Admin Password Change ----
+@bp.route('/admin/change_admin_password', methods=['POST'])
+@login_required
+def change_admin_password():
+    if current_user.role != 'admin': return 'Unauthorized', 403
+    current_password = request.form.get('current_password')
+    new_password = request.form.get('new_password')
+    confirm_password = request.form.get('confirm_password')
+    
+    if not current_user.check_password(current_password):
+        flash('Current password is incorrect.', 'error')
+    elif new_password != confirm_password:
+        flash('New passwords do not match.', 'error')
+    elif len(new_password) < 4:
+        flash('Password must be at least 4 characters.', 'error')
+    else:
+        current_user.set_password(new_password)
+        db.session.commit()
+        flash('Admin password updated successfully.', 'success')
+    return redirect(url_for('admin.admin_dashboard'))
+
+@bp.route('/api/db/stats')
+@login_required
+def db_stats():
+    """Connection pool status and the SQLite pragmas in effect."""
+    if current_user.role != 'admin': return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify({
+        'backend': db.engine.dialect.name,
+        'profile': current_app.config['SQLITE_PROFILE'],
+        'pool': db.engine.pool.status(),
+        'readonly_engine': 'readonly' in db.engines,
+        'sqlite': sqlite_settings()
+    })
+
+@bp.route('/api/cache/stats')
+@login_required
+def cache_stats():
+    """Dashboard cache hit/miss counters and size."""
+    if current_user.role != 'admin': return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(cache.stats())
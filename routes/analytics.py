@@ -0,0 +1,133 @@
+from datetime import datetime
+
+from flask import Blueprint, current_app, render_template, redirect, url_for, request, jsonify, Response, stream_with_context
+from flask_login import login_required, current_user
+
+from analytics_buffer import heartbeat_buffer
+from database import read_session
+from extensions import db
+from models import Video, Playlist, ViewAnalytics, VideoStats
+from reports import parse_report_filters, view_rows_query, view_summary, view_trend, iter_export
+from rollups import record_view_started
+
+bp = Blueprint('analytics', __name__)
+
+
+@bp.route('/teacher/analytics')
+@login_required
+def analytics():
+    if current_user.role != 'teacher': return redirect(url_for('main.index'))
+    # One joined query per page instead of a query per video and per view
+    filters = parse_report_filters(request.args)
+    page = request.args.get('page', 1, type=int)
+    per_page = max(1, min(request.args.get('per_page', 50, type=int), 500))
+    pagination = view_rows_query(current_user.id, filters).paginate(page=page, per_page=per_page, error_out=False)
+    data = [row._asdict() for row in pagination.items]
+    
+    summary = view_summary(current_user.id, filters)
+    trend = view_trend(current_user.id, filters)
+    videos = Video.query.with_entities(Video.id, Video.title).filter_by(uploader_id=current_user.id).all()
+    return render_template('analytics.html', analytics_data=data, pagination=pagination,
+        summary=summary, trend=trend, filters=filters, videos=videos)
+
+@bp.route('/teacher/analytics/export.<fmt>')
+@login_required
+def export_analytics(fmt):
+    """Stream the filtered view report as CSV or JSON without building it in memory."""
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    if fmt not in ('csv', 'json'): return 'Unsupported format', 404
+    query = view_rows_query(current_user.id, parse_report_filters(request.args))
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/json'
+    filename = f"analytics_{datetime.utcnow().strftime('%Y%m%d')}.{fmt}"
+    return Response(stream_with_context(iter_export(query, fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@bp.route('/api/analytics/start', methods=['POST'])
+@login_required
+def track_start():
+    data = request.json
+    video_id = data.get('video_id')
+    
+    new_view = ViewAnalytics(user_id=current_user.id, video_id=video_id)
+    # Counted in the rollups within the same transaction as the view itself
+    record_view_started(new_view)
+    db.session.add(new_view)
+    db.session.commit()
+    return jsonify({'view_id': new_view.id})
+
+@bp.route('/api/analytics/update', methods=['POST'])
+@login_required
+def track_update():
+    from retention import clean_intervals  # Pulls in numpy, so only once heartbeats arrive
+
+    data = request.json
+    view_id = data.get('view_id')
+    curr_time = data.get('duration') # current time in seconds
+    total_duration = data.get('total_duration') # video total length
+    intervals = clean_intervals(data.get('intervals')) # [[start, end], ...] watched since the last heartbeat
+    
+    if not isinstance(view_id, int) or not isinstance(curr_time, (int, float)) or intervals is None:
+        return jsonify({'error': 'Invalid heartbeat'}), 400
+    if not isinstance(total_duration, (int, float)):
+        total_duration = None
+    
+    # Buffered and coalesced per view; written in batches by the flush thread.
+    # Gamification: students earn 1 XP per heartbeat, aggregated per flush.
+    heartbeat_buffer.record(view_id, current_user.id, curr_time, total_duration,
+                            award_xp=current_user.role == 'student', intervals=intervals)
+    return jsonify({'success': True})
+
+@bp.route('/api/analytics/metrics')
+@login_required
+def analytics_metrics():
+    """Heartbeat buffer health: flush lag, batch sizes and what is still waiting to be written."""
+    if current_user.role != 'admin': return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(heartbeat_buffer.stats())
+
+@bp.route('/api/analytics/retention/video/<int:video_id>')
+@login_required
+def video_retention(video_id):
+    """Audience-retention curve for one video: average times each bucket was watched per view."""
+    from retention import retention_curves
+
+    video = Video.query.get_or_404(video_id)
+    if current_user.role != 'admin' and video.uploader_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    curve = retention_curves([video.id]).get(video.id)
+    if not curve:
+        curve = {'video_id': video.id, 'bucket_seconds': current_app.config['RETENTION_BUCKET_SECONDS'],
+                 'duration': 0, 'views': 0, 'retention': []}
+    return jsonify(dict(curve, title=video.title))
+
+@bp.route('/api/analytics/retention/playlist/<int:playlist_id>')
+@login_required
+def playlist_retention(playlist_id):
+    """Retention curves for every video in a playlist, in playlist order, computed in one pass."""
+    from retention import retention_curves
+
+    playlist = Playlist.query.get_or_404(playlist_id)
+    if current_user.role != 'admin' and playlist.creator_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    curves = retention_curves([video.id for video in playlist.videos])
+    videos = []
+    for video in playlist.videos:
+        curve = curves.get(video.id)
+        if curve:
+            videos.append(dict(curve, title=video.title))
+    return jsonify({'playlist_id': playlist.id, 'title': playlist.title, 'videos': videos})
+
+@bp.route('/teacher/report/struggling_topics')
+@login_required
+def struggling_topics_report():
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    # Read from the per-video rollup: one row per video, no scan of ViewAnalytics
+    stats = read_session().query(
+        Video.title,
+        VideoStats.views.label('view_count'),
+        VideoStats.unique_viewers,
+        VideoStats.completions,
+        (VideoStats.percent_sum / db.func.nullif(VideoStats.views, 0)).label('avg_percent')
+    ).join(VideoStats, VideoStats.video_id == Video.id).filter(
+        Video.uploader_id == current_user.id, VideoStats.views > 0
+    ).order_by(db.desc('view_count')).all()
+    return render_template('struggling_topics.html', stats=stats)
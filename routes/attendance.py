@@ -0,0 +1,167 @@
+from collections import Counter
+from datetime import datetime
+
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify
+from flask_login import login_required, current_user
+
+from attendance import (STATUSES, default_status, upsert_attendance, enrolled_students, late_warnings,
+                        absence_streaks)
+from cache import invalidate_user, invalidate_users
+from extensions import db
+from models import User, Classroom, Attendance
+from reports import month_bounds
+
+bp = Blueprint('attendance', __name__)
+
+
+# ---- Attendance Routes ----
+
+@bp.route('/teacher/mark_attendance/<int:class_id>/<int:student_id>', methods=['POST'])
+@login_required
+def mark_attendance(class_id, student_id):
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    classroom = Classroom.query.get_or_404(class_id)
+    if classroom.teacher_id != current_user.id: return 'Unauthorized', 403
+    
+    student = User.query.get_or_404(student_id)
+    now = datetime.utcnow()
+
+    # Logic: Present if marking early or if "force" param is used
+    # In a real app, this would be strict. For simulation, we'll check if it's before 10 AM 
+    # OR if the teacher clicked a specific button. 
+    # But for now let's just make it easier: if it's a weekday and they mark it, it's Present 
+    # unless it's genuinely late (e.g. after 9:20 AM)
+    
+    # FOR USER: Since you're testing now (afternoon), let's allow "Present" if marked manually.
+    status = request.args.get('status') or default_status(now)
+        
+    # Check if record for today already exists
+    today_date = now.date()
+    record = Attendance.query.filter_by(student_id=student_id, classroom_id=class_id, date=today_date).first()
+    
+    if not record:
+        record = Attendance(student_id=student_id, classroom_id=class_id, date=today_date, status=status, arrival_time=now)
+        db.session.add(record)
+    else:
+        record.status = status
+        record.arrival_time = now
+        
+    db.session.commit()
+    invalidate_user(student_id)
+    
+    # Check for warnings: 3 lates in a month
+    month_start, month_end = month_bounds(today_date)
+    lates = Attendance.query.filter(
+        Attendance.student_id == student_id,
+        Attendance.status == 'Late',
+        Attendance.date >= month_start,
+        Attendance.date < month_end
+    ).count()
+    
+    if lates >= 3:
+        flash(f"WARNING: Student {student.username} late {lates} times! Parent notified.", 'warning')
+        
+    flash(f'Attendance marked for {student.username}: {status}', 'success')
+    
+    # Check for continuous 3 days absence
+    # We'll check the last 3 days excluding weekends? Or just last 3 records.
+    last_records = Attendance.query.filter_by(student_id=student_id).order_by(Attendance.date.desc()).limit(3).all()
+    absent_streak = all(r.status == 'Absent' for r in last_records) if len(last_records) >= 3 else False
+    
+    if absent_streak:
+        flash(f"CRITICAL: Student {student.username} absent for 3 consecutive days! Parent notified for compensation warning.", 'error')
+        
+    return redirect(url_for('teacher.teacher_dashboard'))
+
+@bp.route('/api/teacher/attendance/<int:class_id>', methods=['POST'])
+@login_required
+def mark_class_attendance(class_id):
+    """Take the register for a whole class in one request.
+
+    Body: {"date": "YYYY-MM-DD" (default today), "marks": [{"student_id": 1, "status": "Late"}, ...]}.
+    A mark without a status gets Present or Late by the time it is sent. All rows are
+    upserted in one statement, then the warnings are computed for the class in two queries.
+    """
+    if current_user.role != 'teacher': return jsonify({'error': 'Unauthorized'}), 403
+    classroom = Classroom.query.get_or_404(class_id)
+    if classroom.teacher_id != current_user.id: return jsonify({'error': 'Unauthorized'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    now = datetime.utcnow()
+    day = now.date()
+    if data.get('date'):
+        try:
+            day = datetime.strptime(str(data['date']), '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
+        if day > now.date():
+            return jsonify({'error': 'Cannot mark attendance for a future date'}), 400
+    marks = data.get('marks')
+    if not isinstance(marks, list) or not marks:
+        return jsonify({'error': 'marks must be a non-empty list'}), 400
+    
+    statuses = {}
+    errors = []
+    for index, mark in enumerate(marks):
+        mark = mark if isinstance(mark, dict) else {}
+        student_id = mark.get('student_id')
+        status = str(mark.get('status') or default_status(now)).capitalize()
+        if not isinstance(student_id, int):
+            errors.append({'index': index, 'student_id': student_id, 'error': 'student_id must be an integer'})
+        elif status not in STATUSES:
+            errors.append({'index': index, 'student_id': student_id, 'error': f"Unknown status '{status}'"})
+        elif student_id in statuses:
+            errors.append({'index': index, 'student_id': student_id, 'error': 'Duplicate student'})
+        else:
+            statuses[student_id] = status
+    
+    enrolled = enrolled_students(class_id, statuses) if statuses else set()
+    for student_id in [s for s in statuses if s not in enrolled]:
+        errors.append({'index': None, 'student_id': student_id, 'error': 'Not enrolled in this class'})
+        del statuses[student_id]
+    
+    upsert_attendance(class_id, statuses, day, now)
+    db.session.commit()
+    invalidate_users(statuses)
+    
+    return jsonify({
+        'date': day.isoformat(),
+        'marked': len(statuses),
+        'counts': dict(Counter(statuses.values())),
+        'late_warnings': [{'student_id': sid, 'username': name, 'lates': lates}
+                          for sid, name, lates in late_warnings(statuses, day)] if statuses else [],
+        'absence_streaks': [{'student_id': sid, 'username': name}
+                            for sid, name in absence_streaks(statuses)] if statuses else [],
+        'errors': errors
+    })
+
+@bp.route('/teacher/report/monthly/<int:student_id>')
+@login_required
+def monthly_report(student_id):
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    student = User.query.get_or_404(student_id)
+    
+    # Calculate stats for current month: a date range the index can seek, counted per status
+    month_start, month_end = month_bounds(datetime.utcnow().date())
+    counts = dict(db.session.query(Attendance.status, db.func.count(Attendance.id)).filter(
+        Attendance.student_id == student_id,
+        Attendance.date >= month_start,
+        Attendance.date < month_end
+    ).group_by(Attendance.status).all())
+    
+    total = sum(counts.values())
+    present = counts.get('Present', 0)
+    late = counts.get('Late', 0)
+    absent = counts.get('Absent', 0)
+    
+    attendance_pct = (present / total * 100) if total > 0 else 0
+    
+    # Working hours simulation (assume 6 hours per present day)
+    working_hours = present * 6
+    
+    return render_template('monthly_report.html', 
+        student=student, 
+        attendance_pct=attendance_pct,
+        total=total, present=present, late=late, absent=absent,
+        working_hours=working_hours,
+        now_date=datetime.utcnow().date())
@@ -0,0 +1,133 @@
+from flask import Blueprint, current_app, render_template, redirect, url_for, request, flash, jsonify, Response
+from flask_login import login_required, current_user
+
+from chat import chat_hub, chat_payload, fetch_chat_page
+from extensions import db
+from models import Classroom, ChatMessage
+
+bp = Blueprint('chat', __name__)
+
+
+# ---- Chatroom Routes ----
+@bp.route('/chatroom/<int:class_id>')
+@login_required
+def chatroom(class_id):
+    classroom = Classroom.query.get_or_404(class_id)
+    # Teacher who owns the class OR student enrolled in the class
+    if current_user.role == 'teacher' and classroom.teacher_id != current_user.id:
+        flash('You do not own this class.', 'error')
+        return redirect(url_for('teacher.teacher_dashboard'))
+    if current_user.role == 'student':
+        enrolled_ids = [c.id for c in current_user.enrolled_classes]
+        if class_id not in enrolled_ids:
+            flash('You are not enrolled in this class.', 'error')
+            return redirect(url_for('student.student_dashboard'))
+    
+    # Only the latest page is rendered; older messages are fetched with ?before=<oldest_id> on scroll
+    messages, has_more = fetch_chat_page(class_id, limit=current_app.config['CHAT_PAGE_SIZE'])
+    oldest_id = messages[0].id if messages else None
+    return render_template('chatroom.html', classroom=classroom, messages=messages,
+        has_more=has_more, oldest_id=oldest_id)
+
+@bp.route('/api/chatroom/<int:class_id>/send', methods=['POST'])
+@login_required
+def send_chat_message(class_id):
+    classroom = Classroom.query.get_or_404(class_id)
+    # Verify access
+    if current_user.role == 'teacher' and classroom.teacher_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    if current_user.role == 'student':
+        enrolled_ids = [c.id for c in current_user.enrolled_classes]
+        if class_id not in enrolled_ids:
+            return jsonify({'error': 'Not enrolled'}), 403
+    
+    data = request.json
+    content = data.get('content', '').strip()
+    if not content:
+        return jsonify({'error': 'Empty message'}), 400
+    
+    msg = ChatMessage(classroom_id=class_id, user_id=current_user.id, content=content)
+    db.session.add(msg)
+    if current_user.role == 'teacher':
+        current_user.xp += 5
+    db.session.commit()
+    
+    # Published once; every open stream in the classroom receives it without a query
+    payload = chat_payload(msg, current_user)
+    chat_hub.publish(class_id, payload)
+    return jsonify(dict(payload, success=True))
+
+@bp.route('/api/chatroom/<int:class_id>/stream')
+@login_required
+def chat_stream(class_id):
+    """Server-Sent Events feed of a classroom's chat: recent backlog on join, then live messages."""
+    classroom = Classroom.query.get_or_404(class_id)
+    if current_user.role == 'teacher' and classroom.teacher_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    if current_user.role == 'student':
+        enrolled_ids = [c.id for c in current_user.enrolled_classes]
+        if class_id not in enrolled_ids:
+            return jsonify({'error': 'Not enrolled'}), 403
+    if chat_hub.is_full():
+        # Clients fall back to polling /messages when this worker is at capacity
+        return jsonify({'error': 'Chat is at capacity, please retry shortly'}), 503, {'Retry-After': '10'}
+    
+    after_id = request.headers.get('Last-Event-ID', request.args.get('after', 0), type=int)
+    stream, release = chat_hub.stream(class_id, lambda limit: load_chat_backlog(class_id, limit), after_id=after_id)
+    response = Response(stream, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(release)
+    return response
+
+def load_chat_backlog(class_id, limit):
+    messages, _ = fetch_chat_page(class_id, limit=limit)
+    return [chat_payload(m, m.user) for m in messages]
+
+@bp.route('/api/chat/stats')
+@login_required
+def chat_stats():
+    """Open chat streams on this worker process versus CHAT_MAX_CONNECTIONS."""
+    if current_user.role != 'admin': return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(chat_hub.stats())
+
+@bp.route('/api/chatroom/<int:class_id>/messages')
+@login_required
+def get_chat_messages(class_id):
+    """Keyset-paginated history: ?before=<id> for older pages, ?after=<id> for newer messages."""
+    classroom = Classroom.query.get_or_404(class_id)
+    if current_user.role == 'teacher' and classroom.teacher_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    if current_user.role == 'student':
+        enrolled_ids = [c.id for c in current_user.enrolled_classes]
+        if class_id not in enrolled_ids:
+            return jsonify({'error': 'Not enrolled'}), 403
+    
+    before_id = request.args.get('before', type=int)
+    after_id = request.args.get('after', type=int)
+    limit = max(1, min(request.args.get('limit', current_app.config['CHAT_PAGE_SIZE'], type=int), 200))
+    messages, has_more = fetch_chat_page(class_id, before=before_id, after=after_id, limit=limit)
+    
+    response = {
+        'messages': [chat_payload(m, m.user) for m in messages],
+        'has_more': has_more
+    }
+    if messages:
+        # Cursor for the next request in the same direction
+        if after_id is not None:
+            response['next_after'] = messages[-1].id
+        elif has_more:
+            response['next_before'] = messages[0].id
+    return jsonify(response)
+
+@bp.route('/api/chatroom/delete_message/<int:message_id>', methods=['POST'])
+@login_required
+def delete_chat_message(message_id):
+    if current_user.role != 'teacher': return jsonify({'error': 'Unauthorized'}), 403
+    msg = ChatMessage.query.get_or_404(message_id)
+    classroom = Classroom.query.get(msg.classroom_id)
+    if not classroom or classroom.teacher_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    db.session.delete(msg)
+    db.session.commit()
+    chat_hub.remove(classroom.id, message_id)
+    return jsonify({'success': True})
@@ -0,0 +1,121 @@
+import os
+
+from flask import Blueprint, current_app, render_template, redirect, url_for, request, flash, jsonify
+from flask_login import login_user, logout_user, login_required, current_user
+
+from cache import unread_count
+from extensions import db
+from models import User
+from notifications import mark_all_read, mark_read, notification_page
+
+bp = Blueprint('main', __name__)
+
+
+@bp.route('/')
+def index():
+    if current_user.is_authenticated:
+        if current_user.role == 'admin':
+            return redirect(url_for('admin.admin_dashboard'))
+        elif current_user.role == 'teacher':
+            return redirect(url_for('teacher.teacher_dashboard'))
+        elif current_user.role == 'student':
+            return redirect(url_for('student.student_dashboard'))
+    return render_template('ads.html')
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for('main.index'))
+    
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        role = request.form.get('role') # User selects role or system infers? Prompt says "Login will have three types" impling selection or separate tabs? Or just username based? Let's assume username uniqueness handles it, but maybe UI has tabs. Let's rely on username lookup.
+        
+        user = User.query.filter_by(username=username).first()
+        if user and user.check_password(password):
+            # Optional: Enforce role check if UI had a dropdown
+            if role and user.role != role.lower():
+                 flash('Invalid role selected for this user.', 'error')
+                 return render_template('login.html')
+
+            login_user(user)
+            if user.role == 'admin':
+                return redirect(url_for('admin.admin_dashboard'))
+            elif user.role == 'teacher':
+                return redirect(url_for('teacher.teacher_dashboard'))
+            elif user.role == 'student':
+                return redirect(url_for('student.student_dashboard'))
+        else:
+            flash('Invalid username or password.', 'error')
+    
+    return render_template('login.html')
+
+@bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    return redirect(url_for('main.index'))
+
+@bp.route('/notifications')
+@login_required
+def view_notifications():
+    # ?page=N, newest first; `pagination` has has_next, next_num, pages, ... for the template
+    page = notification_page(current_user.id, request.args.get('page', 1, type=int),
+                             current_app.config['NOTIFY_PAGE_SIZE'])
+    return render_template('notifications.html', notifications=page.items, pagination=page,
+                           unread_count=unread_count(current_user.id))
+
+@bp.route('/api/notifications/mark_read', methods=['POST'])
+@login_required
+def mark_notifications_read():
+    marked = mark_all_read(current_user.id)
+    return jsonify({'success': True, 'marked': marked, 'unread_count': unread_count(current_user.id)})
+
+@bp.route('/api/notifications/mark_one_read/<int:notification_id>', methods=['POST'])
+@login_required
+def mark_one_notification_read(notification_id):
+    mark_read(current_user.id, notification_id)
+    return jsonify({'success': True, 'unread_count': unread_count(current_user.id)})
+
+# ---- AI Assistant ----
+@bp.route('/ai_assistant')
+@login_required
+def ai_assistant():
+    return render_template('ai_assistant.html')
+
+@bp.route('/api/ai_chat', methods=['POST'])
+@login_required
+def ai_chat():
+    data = request.json
+    message = data.get('message', '').lower()
+    
+    # Simple rule-based response for demo
+    # In production, this would call an LLM API
+    response = "I am an AI assistant. I can help with your studies."
+    
+    if 'hello' in message or 'hi' in message:
+        response = "Hello! How can I help you with your coursework today?"
+    elif 'doubts' in message or 'problem' in message:
+        response = "I can help solve your doubts. Please describe the specific problem you are facing in the video."
+    elif 'quiz' in message:
+        response = "Quizzes are mandatory for students. Check the 'Quizzes' tab to see pending assessments."
+    elif 'video' in message:
+        response = "Videos are uploaded by your teachers. You earn XP by watching them!"
+        
+    return jsonify({'response': response})
+
+@bp.route('/healthz')
+def healthz():
+    """Liveness probe: this worker process is up and serving requests."""
+    return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+@bp.route('/readyz')
+def readyz():
+    """Readiness probe: the database answers, so this worker can take traffic."""
+    try:
+        db.session.execute(db.text('SELECT 1'))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'unavailable', 'database': str(e), 'pid': os.getpid()}), 503
+    return jsonify({'status': 'ok', 'database': 'ok', 'pid': os.getpid()})
@@ -0,0 +1,125 @@
+from datetime import datetime
+
+from flask import Blueprint, render_template, redirect, url_for, request, flash
+from flask_login import login_required, current_user
+
+from extensions import db
+from models import User, Video, Quiz, Question, QuizResult, Classroom
+
+bp = Blueprint('quiz', __name__)
+
+
+# ---- Quiz Routes ----
+@bp.route('/teacher/create_quiz', methods=['GET', 'POST'])
+@login_required
+def create_quiz():
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    
+    if request.method == 'POST':
+        title = request.form.get('title')
+        video_id = request.form.get('video_id') or None
+        classroom_id = request.form.get('classroom_id') or None
+        
+        quiz = Quiz(title=title, teacher_id=current_user.id)
+        if video_id: quiz.video_id = int(video_id)
+        if classroom_id: quiz.classroom_id = int(classroom_id)
+        
+        db.session.add(quiz)
+        current_user.xp += 25
+        db.session.commit()
+        flash('Quiz created. +25 XP!', 'success')
+        
+        return redirect(url_for('quiz.edit_quiz', quiz_id=quiz.id))
+        
+    videos = Video.query.filter_by(uploader_id=current_user.id).all()
+    classes = Classroom.query.filter_by(teacher_id=current_user.id).all()
+    return render_template('create_quiz.html', videos=videos, classes=classes)
+
+@bp.route('/teacher/edit_quiz/<int:quiz_id>', methods=['GET', 'POST'])
+@login_required
+def edit_quiz(quiz_id):
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    quiz = Quiz.query.get_or_404(quiz_id)
+    if quiz.teacher_id != current_user.id: return 'Unauthorized', 403
+    
+    if request.method == 'POST':
+        # Add a question
+        text = request.form.get('text')
+        op_a = request.form.get('option_a')
+        op_b = request.form.get('option_b')
+        op_c = request.form.get('option_c')
+        op_d = request.form.get('option_d')
+        correct = request.form.get('correct_option')
+        
+        q = Question(quiz_id=quiz.id, text=text, option_a=op_a, option_b=op_b, option_c=op_c, option_d=op_d, correct_option=correct)
+        db.session.add(q)
+        db.session.commit()
+        flash('Question added.', 'success')
+        
+    return render_template('edit_quiz.html', quiz=quiz)
+
+@bp.route('/student/quizzes')
+@login_required
+def student_quizzes():
+    if current_user.role != 'student': return redirect(url_for('main.index'))
+    # Only show quizzes assigned to the student's enrolled classes
+    enrolled_class_ids = [c.id for c in current_user.enrolled_classes]
+    quizzes = Quiz.query.filter(
+        (Quiz.classroom_id.in_(enrolled_class_ids)) | (Quiz.classroom_id == None)
+    ).all()
+    taken_ids = [r.quiz_id for r in QuizResult.query.filter_by(student_id=current_user.id).all()]
+    return render_template('student_quizzes.html', quizzes=quizzes, taken_ids=taken_ids)
+
+@bp.route('/student/quiz/<int:quiz_id>', methods=['GET', 'POST'])
+@login_required
+def take_quiz(quiz_id):
+    if current_user.role != 'student': return 'Unauthorized', 403
+    quiz = Quiz.query.get_or_404(quiz_id)
+    
+    # Enforce: student must be in the assigned class (if quiz has a class)
+    if quiz.classroom_id:
+        enrolled_class_ids = [c.id for c in current_user.enrolled_classes]
+        if quiz.classroom_id not in enrolled_class_ids:
+            flash('You are not enrolled in the class for this quiz.', 'error')
+            return redirect(url_for('quiz.student_quizzes'))
+    
+    if request.method == 'POST':
+        score = 0
+        total = len(quiz.questions)
+        for q in quiz.questions:
+            selected = request.form.get(f'q_{q.id}')
+            if selected == q.correct_option:
+                score += 1
+        
+        result = QuizResult(quiz_id=quiz.id, student_id=current_user.id, score=score, total_questions=total)
+        db.session.add(result)
+        
+        if total > 0 and (score / total) >= 0.5:
+            current_user.xp += 100
+            flash(f'Quiz submitted. Score: {score}/{total}. +100 XP!', 'success')
+        else:
+            flash(f'Quiz submitted. Score: {score}/{total}.', 'info')
+            
+        db.session.commit()
+        return redirect(url_for('quiz.student_quizzes'))
+        
+    return render_template('take_quiz.html', quiz=quiz)
+
+@bp.route('/teacher/quiz_report/<int:quiz_id>')
+@login_required
+def quiz_report(quiz_id):
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    quiz = Quiz.query.get_or_404(quiz_id)
+    if quiz.teacher_id != current_user.id: return 'Unauthorized', 403
+    results = QuizResult.query.filter_by(quiz_id=quiz.id).all()
+    detailed_results = []
+    for r in results:
+        student = User.query.get(r.student_id)
+        if student:
+            detailed_results.append({
+                'student': student,
+                'score': r.score,
+                'total': r.total_questions,
+                'date': r.timestamp
+            })
+    return render_template('quiz_report.html', quiz=quiz, results=detailed_results, datetime=datetime)
@@ -0,0 +1,162 @@
+from datetime import datetime
+
+from flask import Blueprint, current_app, render_template, redirect, url_for, request, jsonify
+from flask_login import login_required, current_user
+
+from cache import (playlist_catalog, latest_videos, playlist_summary, video_summary, site_settings, unread_count,
+                   attendance_pct)
+from comments import comment_payload, fetch_comment_threads
+from extensions import db
+from models import Video, Playlist, Comment
+from notifications import notifications
+from search import search, load_hits
+
+bp = Blueprint('student', __name__)
+
+
+# ---- Student and Watch Routes ----
+@bp.route('/student')
+@login_required
+def student_dashboard():
+    if current_user.role != 'student':
+        return redirect(url_for('main.index'))
+    
+    # Students search teacher playlists
+    query = request.args.get('q')
+    if query:
+        # Ranked full-text search; prefix matches, so partial words work as you type
+        hits, _ = search(query, kinds=['playlist', 'video'], per_page=50)
+        found = load_hits(hits, current_user)
+        # Same dict shapes as the cached catalogue, so the template sees one kind of object
+        playlists = [playlist_summary(found[(h['kind'], h['id'])]) for h in hits
+                     if h['kind'] == 'playlist' and (h['kind'], h['id']) in found]
+        videos = [video_summary(found[(h['kind'], h['id'])]) for h in hits
+                  if h['kind'] == 'video' and (h['kind'], h['id']) in found]
+    else:
+        # Shared catalogue and per-student figures come from the cache
+        playlists = playlist_catalog()
+        videos = latest_videos(20)
+        
+    enrolled_classes = current_user.enrolled_classes
+    
+    return render_template('student_dashboard.html', playlists=playlists, videos=videos, 
+        search_query=query, unread_count=unread_count(current_user.id), settings=site_settings(), 
+        enrolled_classes=enrolled_classes, now_date=datetime.utcnow().date(),
+        attendance_pct=attendance_pct(current_user.id))
+
+@bp.route('/api/search')
+@login_required
+def api_search():
+    """Full-text search over videos, playlists, quizzes, questions and comments.
+
+    ?q=terms&kind=video,playlist&page=1&per_page=20. Results are BM25-ranked.
+    """
+    q = request.args.get('q', '').strip()
+    kinds = [k for k in request.args.get('kind', '').split(',') if k] or None
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = max(1, min(request.args.get('per_page', 20, type=int), 100))
+    hits, has_more = search(q, kinds=kinds, page=page, per_page=per_page)
+    found = load_hits(hits, current_user)
+    results = []
+    for hit in hits:
+        obj = found.get((hit['kind'], hit['id']))
+        if obj is None:
+            continue
+        if hit['kind'] == 'video':
+            extra = {'title': obj.title, 'thumbnail': obj.thumbnail_path, 'url': url_for('student.watch_video', video_id=obj.id)}
+        elif hit['kind'] == 'playlist':
+            extra = {'title': obj.title, 'url': url_for('student.view_playlist', playlist_id=obj.id)}
+        elif hit['kind'] == 'quiz':
+            extra = {'title': obj.title, 'url': url_for('quiz.take_quiz', quiz_id=obj.id)}
+        elif hit['kind'] == 'question':
+            extra = {'title': obj.quiz.title, 'quiz_id': obj.quiz_id, 'url': url_for('quiz.take_quiz', quiz_id=obj.quiz_id)}
+        else:
+            extra = {'title': obj.video.title, 'video_id': obj.video_id, 'url': url_for('student.watch_video', video_id=obj.video_id)}
+        results.append(dict(hit, **extra))
+    return jsonify({'query': q, 'page': page, 'per_page': per_page, 'has_more': has_more, 'results': results})
+
+@bp.route('/playlist/<int:playlist_id>')
+@login_required
+def view_playlist(playlist_id):
+    playlist = Playlist.query.get_or_404(playlist_id)
+    return render_template('playlist_view.html', playlist=playlist)
+
+@bp.route('/watch/<int:video_id>')
+@login_required
+def watch_video(video_id):
+    from recommendations import related_videos  # Pulls in numpy, so only once a video is watched
+    video = Video.query.get_or_404(video_id)
+    
+    # Precomputed from shared wording, playlists and viewers; one primary-key range read
+    related = related_videos(video, limit=5)
+    
+    # First page of threads with their authors and replies, in one query
+    comments, more_comments = fetch_comment_threads(video_id=video_id, **thread_limits())
+    
+    settings = site_settings()
+    return render_template('video_player.html', video=video, related_videos=related, comments=comments,
+        more_comments=more_comments, settings=settings)
+
+def thread_limits(limit=None):
+    config = current_app.config
+    return {'limit': limit or config['COMMENT_PAGE_SIZE'], 'depth': config['COMMENT_REPLY_DEPTH'],
+            'replies': config['COMMENT_REPLY_LIMIT']}
+
+def threads_response(threads, has_more):
+    response = {'comments': [comment_payload(c) for c in threads], 'has_more': has_more}
+    if has_more:
+        response['next_cursor'] = threads[-1].id
+    return jsonify(response)
+
+@bp.route('/api/comments/<int:video_id>')
+@login_required
+def video_comments(video_id):
+    """Next page of top-level threads: ?before=<next_cursor of the previous page>."""
+    Video.query.get_or_404(video_id)
+    limit = max(1, min(request.args.get('limit', current_app.config['COMMENT_PAGE_SIZE'], type=int), 100))
+    threads, has_more = fetch_comment_threads(video_id=video_id, cursor=request.args.get('before', type=int),
+                                              **thread_limits(limit))
+    return threads_response(threads, has_more)
+
+@bp.route('/api/comment/<int:comment_id>/replies')
+@login_required
+def comment_replies(comment_id):
+    """Load more replies of a comment: ?after=<id of the last reply shown>."""
+    Comment.query.get_or_404(comment_id)
+    limit = max(1, min(request.args.get('limit', current_app.config['COMMENT_REPLY_LIMIT'], type=int), 100))
+    threads, has_more = fetch_comment_threads(parent_id=comment_id, cursor=request.args.get('after', type=int),
+                                              **thread_limits(limit))
+    return threads_response(threads, has_more)
+
+@bp.route('/api/comment', methods=['POST'])
+@login_required
+def post_comment():
+    data = request.json
+    video_id = data.get('video_id')
+    content = data.get('content')
+    parent_id = data.get('parent_id') # Optional
+    
+    # Work out who to notify while building the comment, so there is a single commit
+    recipient_id = None
+    if parent_id:
+        # It's a reply: Notify the author of the parent comment
+        parent_author = db.session.query(Comment.user_id).filter_by(id=parent_id).scalar()
+        if parent_author and parent_author != current_user.id:
+            role_label = "Teacher" if current_user.role == 'teacher' else current_user.username
+            notification_msg = f'{role_label} replied to your comment: "{content[:100]}"'
+            recipient_id = parent_author
+    else:
+        # It's a top-level comment: Notify the teacher who uploaded this video
+        video = db.session.query(Video.uploader_id, Video.title).filter_by(id=video_id).first()
+        if video and video.uploader_id != current_user.id:
+            notification_msg = f'{current_user.username} commented on your video "{video.title}": "{content[:100]}"'
+            recipient_id = video.uploader_id
+    
+    new_comment = Comment(content=content, user_id=current_user.id, video_id=video_id, parent_id=parent_id)
+    db.session.add(new_comment)
+    db.session.commit()
+    
+    if recipient_id:
+        # Queued; written with other notifications in the next batch
+        notifications.notify(recipient_id, notification_msg, video_id=video_id, comment_id=new_comment.id)
+    return jsonify({'success': True, 'username': current_user.username, 'content': content})
@@ -0,0 +1,246 @@
+import os
+import shutil
+from datetime import datetime
+
+from flask import Blueprint, current_app, render_template, redirect, url_for, request, flash, jsonify
+from flask_login import login_required, current_user
+
+from assets import release_asset, remove_outputs
+from cache import student_directory, unread_count, invalidate_catalog, invalidate_students, invalidate_user
+from extensions import db
+from models import User, Video, Playlist, Quiz, Classroom, ChatMessage
+from provisioning import provision_users, request_rows
+
+bp = Blueprint('teacher', __name__)
+
+
+@bp.route('/teacher')
+@login_required
+def teacher_dashboard():
+    if current_user.role != 'teacher':
+        return redirect(url_for('main.index'))
+    videos = Video.query.filter_by(uploader_id=current_user.id).all()
+    playlists = Playlist.query.filter_by(creator_id=current_user.id).all()
+    students = student_directory()
+    unread = unread_count(current_user.id)
+    classes = Classroom.query.filter_by(teacher_id=current_user.id).all()
+    quizzes = Quiz.query.filter_by(teacher_id=current_user.id).all()
+    chat_count = ChatMessage.query.filter_by(user_id=current_user.id).count()
+    
+    # Teacher action stats for points display
+    teacher_stats = {
+        'videos': len(videos),
+        'playlists': len(playlists),
+        'quizzes': len(quizzes),
+        'classes': len(classes),
+        'students_added': len(students),
+        'chat_messages': chat_count,
+        'total_xp': current_user.xp
+    }
+    
+    return render_template('teacher_dashboard.html', videos=videos, playlists=playlists,
+        students=students, unread_count=unread, classes=classes, quizzes=quizzes,
+        teacher_stats=teacher_stats, now_date=datetime.utcnow().date())
+
+@bp.route('/teacher/add_student', methods=['POST'])
+@login_required
+def add_student():
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    username = request.form.get('username')
+    password = request.form.get('password')
+    
+    if User.query.filter_by(username=username).first():
+        flash('Username already exists.', 'error')
+    else:
+        new_student = User(username=username, role='student')
+        new_student.set_password(password)
+        db.session.add(new_student)
+        current_user.xp += 20
+        db.session.commit()
+        invalidate_students()
+        flash('Student added successfully. +20 XP!', 'success')
+    return redirect(url_for('teacher.teacher_dashboard'))
+
+@bp.route('/api/teacher/import_students', methods=['POST'])
+@login_required
+def import_students():
+    """Bulk-create students from a CSV/JSON upload and enroll them in this teacher's classes."""
+    if current_user.role != 'teacher': return jsonify({'error': 'Unauthorized'}), 403
+    try:
+        rows = request_rows(request)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if len(rows) > current_app.config['IMPORT_MAX_ROWS']:
+        return jsonify({'error': f"At most {current_app.config['IMPORT_MAX_ROWS']} rows per import"}), 413
+    
+    result = provision_users(rows, teacher_id=current_user.id,
+                             workers=current_app.config['PROVISION_HASH_WORKERS'])
+    if result['created']:
+        # Same XP as adding and enrolling them one by one
+        current_user.xp += 20 * result['created'] + 15 * result['enrolled']
+        db.session.commit()
+        invalidate_students()
+    return jsonify(result)
+
+@bp.route('/teacher/change_student_password', methods=['POST'])
+@login_required
+def change_student_password():
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    
+    student_id = request.form.get('student_id')
+    new_password = request.form.get('new_password')
+    
+    student = User.query.get(student_id)
+    if student and student.role == 'student':
+        student.set_password(new_password)
+        db.session.commit()
+        flash('Student password updated successfully.', 'success')
+    else:
+        flash('Error updating student password.', 'error')
+    return redirect(url_for('teacher.teacher_dashboard'))
+
+@bp.route('/teacher/create_playlist', methods=['POST'])
+@login_required
+def create_playlist():
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    title = request.form.get('title')
+    new_playlist = Playlist(title=title, creator_id=current_user.id)
+    db.session.add(new_playlist)
+    current_user.xp += 30
+    db.session.commit()
+    invalidate_catalog()
+    flash('Playlist created. +30 XP!', 'success')
+    return redirect(url_for('teacher.teacher_dashboard'))
+
+@bp.route('/teacher/add_to_playlist', methods=['POST'])
+@login_required
+def add_to_playlist():
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    playlist_id = request.form.get('playlist_id')
+    video_id = request.form.get('video_id')
+    
+    playlist = Playlist.query.get(playlist_id)
+    video = Video.query.get(video_id)
+    
+    if playlist and video and playlist.creator_id == current_user.id:
+        if video not in playlist.videos:
+            playlist.videos.append(video)
+            db.session.commit()
+            invalidate_catalog()
+            flash('Video added to playlist.', 'success')
+    return redirect(url_for('teacher.teacher_dashboard'))
+
+@bp.route('/teacher/delete_video/<int:video_id>', methods=['POST'])
+@login_required
+def delete_video(video_id):
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    video = Video.query.get_or_404(video_id)
+    if video.uploader_id == current_user.id:
+        # Delete files as well
+        try:
+            input_path = os.path.join(current_app.config['UPLOAD_FOLDER'], video.filename)
+            if os.path.exists(input_path): os.remove(input_path)
+            # HLS segments of videos uploaded before content deduplication
+            if not video.asset_id:
+                hls_dir = os.path.join(current_app.config['HLS_FOLDER'], str(video.id))
+                if os.path.exists(hls_dir): shutil.rmtree(hls_dir)
+        except Exception as e:
+            print(f"File deletion error: {e}")
+            
+        # Shared outputs are removed only once no video references them
+        shared_dir = release_asset(video.asset_id, current_app.config['HLS_FOLDER']) if video.asset_id else None
+        db.session.delete(video)
+        db.session.commit()
+        remove_outputs(shared_dir)
+        invalidate_catalog()
+        flash('Video deleted successfully.', 'success')
+    return redirect(url_for('teacher.teacher_dashboard'))
+
+@bp.route('/teacher/delete_playlist/<int:playlist_id>', methods=['POST'])
+@login_required
+def delete_playlist(playlist_id):
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    playlist = Playlist.query.get_or_404(playlist_id)
+    if playlist.creator_id == current_user.id:
+        db.session.delete(playlist)
+        db.session.commit()
+        invalidate_catalog()
+        flash('Playlist deleted successfully.', 'success')
+    return redirect(url_for('teacher.teacher_dashboard'))
+
+# ---- Class Management Routes ----
+@bp.route('/teacher/create_class', methods=['POST'])
+@login_required
+def create_class():
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    name = request.form.get('name')
+    if name:
+        new_class = Classroom(name=name, teacher_id=current_user.id)
+        db.session.add(new_class)
+        current_user.xp += 40
+        db.session.commit()
+        flash(f'Class "{name}" created. +40 XP!', 'success')
+    return redirect(url_for('teacher.teacher_dashboard'))
+
+@bp.route('/teacher/add_student_to_class', methods=['POST'])
+@login_required
+def add_student_to_class():
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    student_id = request.form.get('student_id')
+    class_id = request.form.get('class_id')
+    student = User.query.get(student_id)
+    classroom = Classroom.query.get(class_id)
+    if student and classroom and classroom.teacher_id == current_user.id:
+        if student not in classroom.students:
+            classroom.students.append(student)
+            current_user.xp += 15
+            db.session.commit()
+            flash(f'Added {student.username} to {classroom.name}. +15 XP!', 'success')
+        else:
+            flash(f'{student.username} is already in {classroom.name}.', 'info')
+    else:
+        flash('Invalid student or class.', 'error')
+    return redirect(url_for('teacher.teacher_dashboard'))
+
+@bp.route('/teacher/remove_student_from_class', methods=['POST'])
+@login_required
+def remove_student_from_class():
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    student_id = request.form.get('student_id')
+    class_id = request.form.get('class_id')
+    student = User.query.get(student_id)
+    classroom = Classroom.query.get(class_id)
+    if student and classroom and classroom.teacher_id == current_user.id:
+        if student in classroom.students:
+            classroom.students.remove(student)
+            db.session.commit()
+            flash(f'Removed {student.username} from class {classroom.name}.', 'success')
+    return redirect(url_for('teacher.teacher_dashboard'))
+
+@bp.route('/teacher/delete_student/<int:student_id>', methods=['POST'])
+@login_required
+def delete_student(student_id):
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    student = User.query.get_or_404(student_id)
+    if student.role == 'student':
+        db.session.delete(student)
+        db.session.commit()
+        invalidate_students()
+        invalidate_user(student_id)
+        flash('Student account deleted.', 'success')
+    else:
+        flash('Cannot delete non-students.', 'error')
+    return redirect(url_for('teacher.teacher_dashboard'))
+
+# ---- Delete Class ----
+@bp.route('/teacher/delete_class/<int:class_id>', methods=['POST'])
+@login_required
+def delete_class(class_id):
+    if current_user.role != 'teacher': return 'Unauthorized', 403
+    classroom = Classroom.query.get_or_404(class_id)
+    if classroom.teacher_id != current_user.id: return 'Unauthorized', 403
+    class_name = classroom.name
+    db.session.delete(classroom)
+    db.session.commit()
+    flash(f'Class deleted successfully.', 'success')
+    return redirect(url_for('teacher.teacher_dashboard'))
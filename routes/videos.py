@@ -0,0 +1,294 @@
+import os
+import shutil
+import uuid
+from datetime import datetime
+
+from flask import Blueprint, current_app, url_for, request, jsonify, Response
+from flask_login import login_required, current_user
+from werkzeug.utils import secure_filename
+
+from assets import acquire_asset, link_video
+from cache import invalidate_catalog
+from events import broker, live_progress, publish_progress
+from extensions import db
+from jobs import transcode_queue
+from models import Video, TranscodeJob, UploadSession, UploadChunk
+from transcode import get_video_duration
+from uploads import (allowed_file, timestamped_name, save_stream, part_path, create_part_file, write_chunk,
+                     merge_ranges, contiguous_offset, missing_ranges, parse_checksum, file_digests, CONTENT_HASH)
+
+bp = Blueprint('videos', __name__)
+
+
+def queue_uploaded_video(title, save_name, input_path, digest, size):
+    """Create the Video row for a file already in UPLOAD_FOLDER and hand it to the transcode queue.
+
+    A file whose content digest was transcoded before is linked to the existing
+    outputs and completed straight away, with no job.
+    """
+    asset = acquire_asset(digest, size)
+    new_video = Video(
+        title=title, 
+        filename=save_name, 
+        uploader_id=current_user.id,
+        status='pending',
+        processing_progress=0,
+        asset_id=asset.id
+    )
+    db.session.add(new_video)
+    
+    if asset.status == 'completed':
+        link_video(new_video, asset)
+        db.session.commit()
+        publish_progress(new_video)
+        invalidate_catalog()
+        try:
+            os.remove(input_path)
+        except OSError as e:
+            print(f"File deletion error: {e}")
+        return new_video
+    
+    # Queue for the transcode worker pool; shorter clips are picked up first
+    transcode_queue.enqueue(new_video, input_path, priority=int(get_video_duration(input_path)))
+    return new_video
+
+def upload_response(video):
+    message = ('Upload successful. This file was processed before, so the video is ready.'
+               if video.status == 'completed' else 'Upload successful. Video queued for processing.')
+    return jsonify({'success': True, 'video_id': video.id, 'status': video.status, 'message': message})
+
+@bp.route('/teacher/upload', methods=['POST'])
+@login_required
+def upload_video():
+    if current_user.role != 'teacher': return jsonify({'error': 'Unauthorized'}), 403
+    
+    file = request.files.get('video_file')
+    title = request.form.get('title')
+    
+    if transcode_queue.is_full():
+        return jsonify({'error': 'Too many videos are waiting to be processed. Please try again later.'}), 503
+    
+    if file and allowed_file(file.filename):
+        save_name = timestamped_name(file.filename)
+        input_path = os.path.join(current_app.config['UPLOAD_FOLDER'], save_name)
+        # Hashed while it is written, so deduplication costs no extra read
+        digest, size = save_stream(file.stream, input_path)
+        
+        new_video = queue_uploaded_video(title, save_name, input_path, digest, size)
+        return upload_response(new_video)
+            
+    return jsonify({'error': 'Invalid file type'}), 400
+
+# ---- Resumable Chunked Uploads ----
+# tus-style protocol: POST creates a session, PATCH writes a byte range at Upload-Offset,
+# HEAD/GET reports progress for resuming, and finalize verifies and queues the video.
+# Chunks may be sent in parallel since each one is written at its own offset.
+
+def get_upload_or_404(upload_id):
+    upload = UploadSession.query.get_or_404(upload_id)
+    if upload.user_id != current_user.id:
+        return None
+    return upload
+
+def upload_ranges(upload):
+    return [(c.offset, c.offset + c.length) for c in UploadChunk.query.filter_by(upload_id=upload.id).all()]
+
+@bp.route('/api/uploads', methods=['POST'])
+@login_required
+def create_upload():
+    if current_user.role != 'teacher': return jsonify({'error': 'Unauthorized'}), 403
+    
+    data = request.json or {}
+    filename = secure_filename(data.get('filename') or '')
+    title = data.get('title') or filename
+    size = data.get('size')
+    
+    if not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type'}), 400
+    if not isinstance(size, int) or size <= 0 or size > current_app.config['UPLOAD_MAX_SIZE']:
+        return jsonify({'error': 'Invalid upload size'}), 400
+    checksum = data.get('checksum')
+    if checksum:
+        try:
+            algorithm, digest = parse_checksum(checksum)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        checksum = f'{algorithm}:{digest}'
+    if transcode_queue.is_full():
+        return jsonify({'error': 'Too many videos are waiting to be processed. Please try again later.'}), 503
+    
+    upload = UploadSession(id=uuid.uuid4().hex, user_id=current_user.id, title=title,
+                           filename=filename, total_size=size, checksum=checksum)
+    create_part_file(part_path(current_app.config['UPLOAD_TMP_FOLDER'], upload.id), size)
+    db.session.add(upload)
+    db.session.commit()
+    
+    location = url_for('videos.upload_status', upload_id=upload.id)
+    return jsonify({
+        'upload_id': upload.id,
+        'offset': 0,
+        'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE'],
+        'location': location
+    }), 201, {'Location': location}
+
+@bp.route('/api/uploads/<upload_id>', methods=['GET', 'HEAD'])
+@login_required
+def upload_status(upload_id):
+    upload = get_upload_or_404(upload_id)
+    if not upload: return jsonify({'error': 'Unauthorized'}), 403
+    
+    ranges = upload_ranges(upload)
+    offset = contiguous_offset(ranges)
+    response = jsonify({
+        'upload_id': upload.id,
+        'status': upload.status,
+        'size': upload.total_size,
+        'offset': offset,
+        'received': sum(end - start for start, end in merge_ranges(ranges)),
+        'missing': missing_ranges(ranges, upload.total_size)
+    })
+    response.headers['Upload-Offset'] = str(offset)
+    response.headers['Upload-Length'] = str(upload.total_size)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@bp.route('/api/uploads/<upload_id>', methods=['PATCH'])
+@login_required
+def upload_chunk(upload_id):
+    upload = get_upload_or_404(upload_id)
+    if not upload: return jsonify({'error': 'Unauthorized'}), 403
+    if upload.status != 'uploading':
+        return jsonify({'error': f'Upload is {upload.status}'}), 409
+    
+    offset = request.headers.get('Upload-Offset', type=int)
+    length = request.content_length
+    if offset is None or offset < 0 or not length:
+        return jsonify({'error': 'Upload-Offset and Content-Length headers are required'}), 400
+    if offset + length > upload.total_size:
+        return jsonify({'error': 'Chunk extends past the declared upload size'}), 400
+    
+    # Streamed from the socket straight into the part file, one buffer at a time
+    written = write_chunk(part_path(current_app.config['UPLOAD_TMP_FOLDER'], upload.id), offset, request.stream, length)
+    if written != length:
+        return jsonify({'error': 'Incomplete chunk, please resend it', 'offset': offset}), 400
+    
+    db.session.add(UploadChunk(upload_id=upload.id, offset=offset, length=length))
+    upload.updated_at = datetime.utcnow()
+    db.session.commit()
+    
+    return '', 204, {'Upload-Offset': str(contiguous_offset(upload_ranges(upload)))}
+
+@bp.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+@login_required
+def finalize_upload(upload_id):
+    upload = get_upload_or_404(upload_id)
+    if not upload: return jsonify({'error': 'Unauthorized'}), 403
+    if upload.status != 'uploading':
+        return jsonify({'error': f'Upload is {upload.status}'}), 409
+    
+    missing = missing_ranges(upload_ranges(upload), upload.total_size)
+    if missing:
+        return jsonify({'error': 'Upload is incomplete', 'missing': missing}), 409
+    
+    # Only one of several concurrent finalize calls gets past this conditional update
+    claimed = UploadSession.query.filter_by(id=upload.id, status='uploading').update(
+        {'status': 'finalizing', 'updated_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        return jsonify({'error': 'Upload is already being finalized'}), 409
+    
+    path = part_path(current_app.config['UPLOAD_TMP_FOLDER'], upload.id)
+    # Chunks arrive out of order, so the content digest is taken here, in the same read as the checksum
+    algorithm, expected = parse_checksum(upload.checksum) if upload.checksum else (CONTENT_HASH, None)
+    digests = file_digests(path, CONTENT_HASH, algorithm)
+    if upload.checksum:
+        if digests[algorithm] != expected:
+            # The client must re-send everything, so drop the received ranges
+            UploadChunk.query.filter_by(upload_id=upload.id).delete()
+            upload.status = 'uploading'
+            db.session.commit()
+            return jsonify({'error': 'Checksum mismatch, please upload the file again'}), 422
+    
+    save_name = timestamped_name(upload.filename)
+    input_path = os.path.join(current_app.config['UPLOAD_FOLDER'], save_name)
+    shutil.move(path, input_path)
+    
+    UploadChunk.query.filter_by(upload_id=upload.id).delete()
+    upload.status = 'completed'
+    new_video = queue_uploaded_video(upload.title, save_name, input_path, digests[CONTENT_HASH], upload.total_size)
+    return upload_response(new_video)
+
+@bp.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def abort_upload(upload_id):
+    upload = get_upload_or_404(upload_id)
+    if not upload: return jsonify({'error': 'Unauthorized'}), 403
+    if upload.status == 'finalizing':
+        return jsonify({'error': 'Upload is being finalized'}), 409
+    
+    path = part_path(current_app.config['UPLOAD_TMP_FOLDER'], upload.id)
+    if os.path.exists(path): os.remove(path)
+    db.session.delete(upload)
+    db.session.commit()
+    return jsonify({'success': True})
+
+@bp.route('/api/video_status/<int:video_id>')
+@login_required
+def get_video_status(video_id):
+    video = Video.query.get_or_404(video_id)
+    if video.uploader_id != current_user.id and current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    live = live_progress.get(video.id)
+    if live:
+        return jsonify(dict(live, title=video.title))
+    
+    # Not encoding in this process; fall back to the last checkpoint of the running job
+    job = TranscodeJob.query.filter_by(video_id=video.id, status='processing').first()
+    return jsonify({
+        'status': video.status,
+        'progress': video.processing_progress,
+        'title': video.title,
+        'speed': job.speed if job else None,
+        'eta_seconds': job.eta_seconds if job else None
+    })
+
+@bp.route('/api/teacher/processing_videos')
+@login_required
+def get_processing_videos():
+    """Get all videos currently being processed for the teacher."""
+    return jsonify(_processing_snapshot(current_user.id))
+
+@bp.route('/api/teacher/processing_stream')
+@login_required
+def processing_stream():
+    """Server-Sent Events stream of processing progress for all of the teacher's uploads.
+
+    One query builds the initial snapshot; after that every update is pushed by the
+    transcode workers through the broker (relayed from the transcode process under
+    server.py), so an open dashboard costs no further database reads.
+    """
+    channel = f'uploads:{current_user.id}'
+    # Subscribe before the snapshot so progress published while it is read is queued, not lost
+    subscription = broker.subscribe(channel)
+    initial = [('progress', item) for item in _processing_snapshot(current_user.id)]
+    stream = broker.stream(channel, initial=initial, subscription=subscription,
+                           heartbeat=current_app.config.get('SSE_HEARTBEAT_INTERVAL', 15))
+    response = Response(stream, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # The generator's own cleanup never runs if the body is not read (e.g. a HEAD request)
+    response.call_on_close(lambda: broker.unsubscribe(channel, subscription))
+    return response
+
+def _processing_snapshot(user_id):
+    videos = Video.query.filter(
+        Video.uploader_id == user_id,
+        Video.status.in_(['pending', 'processing'])
+    ).all()
+    
+    return [live_progress.get(v.id) or {
+        'id': v.id,
+        'title': v.title,
+        'status': v.status,
+        'progress': v.processing_progress
+    } for v in videos]
@@ -0,0 +1,145 @@
+import re
+
+from sqlalchemy import text, true
+
+from extensions import db
+from models import Comment, Playlist, Question, Quiz, Video
+
+# One FTS5 table holds every searchable document. The kind is packed into the
+# rowid (id * 8 + code) so triggers can replace a document by rowid, which is a
+# direct b-tree lookup instead of a scan of the index.
+KINDS = {'video': 1, 'playlist': 2, 'quiz': 3, 'question': 4, 'comment': 5}
+KIND_NAMES = {code: kind for kind, code in KINDS.items()}
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+# (kind, table, title expression, body expression, condition for being searchable, watched columns)
+_SOURCES = [
+    ('video', 'video', "{r}.title", "''", "{r}.status = 'completed'", 'title, status'),
+    ('playlist', 'playlist', "{r}.title", "''", "1", 'title'),
+    ('quiz', 'quiz', "{r}.title", "coalesce({r}.description, '')", "1", 'title, description'),
+    ('question', 'question', "''", "{r}.text", "1", 'text'),
+    ('comment', 'comment', "''", "{r}.content", "1", 'content'),
+]
+
+
+def is_available():
+    return db.engine.dialect.name == 'sqlite'
+
+def _document_insert(kind, ref, source=''):
+    """INSERT ... SELECT of the documents for `kind`, reading columns from `ref` (a table or new)."""
+    _, table, title, body, condition, _ = next(s for s in _SOURCES if s[0] == kind)
+    return (f"INSERT INTO search_index(rowid, title, body) "
+            f"SELECT {ref}.id * 8 + {KINDS[kind]}, {title.format(r=ref)}, {body.format(r=ref)}{source} "
+            f"WHERE {condition.format(r=ref)};")
+
+def _statements():
+    yield ("CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+           "title, body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')")
+    for kind, table, *_, columns in _SOURCES:
+        code = KINDS[kind]
+        delete = f"DELETE FROM search_index WHERE rowid = old.id * 8 + {code};"
+        yield (f"CREATE TRIGGER IF NOT EXISTS search_{table}_ai AFTER INSERT ON {table} BEGIN "
+               f"{_document_insert(kind, 'new')} END")
+        yield (f"CREATE TRIGGER IF NOT EXISTS search_{table}_au AFTER UPDATE OF {columns} ON {table} BEGIN "
+               f"{delete} {_document_insert(kind, 'new')} END")
+        yield (f"CREATE TRIGGER IF NOT EXISTS search_{table}_ad AFTER DELETE ON {table} BEGIN "
+               f"{delete} END")
+
+def install_search_index():
+    """Create the FTS5 table and its sync triggers (idempotent), backfilling an empty index."""
+    if not is_available():
+        return False
+    with db.engine.begin() as conn:
+        for statement in _statements():
+            conn.execute(text(statement))
+        if conn.execute(text("SELECT count(*) FROM search_index")).scalar() == 0:
+            _backfill(conn)
+    return True
+
+def rebuild_search_index():
+    with db.engine.begin() as conn:
+        conn.execute(text("DELETE FROM search_index"))
+        _backfill(conn)
+        conn.execute(text("INSERT INTO search_index(search_index) VALUES ('optimize')"))
+        return conn.execute(text("SELECT count(*) FROM search_index")).scalar()
+
+def _backfill(conn):
+    for kind, table, *_ in _SOURCES:
+        conn.execute(text(_document_insert(kind, table, f' FROM {table}')))
+
+def build_match_query(q):
+    """Turn free text into an FTS5 query: every word must match as a prefix. None if nothing searchable."""
+    words = re.findall(r'\w+', q or '', flags=re.UNICODE)[:16]
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+def search(q, kinds=None, page=1, per_page=20):
+    """Ranked search. Returns (hits, has_more); each hit is {'kind', 'id', 'score', 'snippet'}.
+
+    Lower BM25 scores are better; titles weigh TITLE_WEIGHT times the body text.
+    """
+    match = build_match_query(q)
+    if match is None:
+        return [], False
+    if not is_available():
+        return _like_search(q, kinds, page, per_page)
+    codes = [KINDS[k] for k in (kinds or KINDS) if k in KINDS]
+    rows = db.session.execute(text(
+        "SELECT rowid, bm25(search_index, :title_weight, :body_weight) AS score, "
+        "snippet(search_index, -1, '[', ']', '...', 12) AS snippet "
+        "FROM search_index WHERE search_index MATCH :match "
+        f"AND (rowid % 8) IN ({', '.join(str(c) for c in codes)}) "
+        "ORDER BY score LIMIT :limit OFFSET :offset"
+    ), {'title_weight': TITLE_WEIGHT, 'body_weight': BODY_WEIGHT, 'match': match,
+        'limit': per_page + 1, 'offset': (max(page, 1) - 1) * per_page}).all()
+    hits = [{'kind': KIND_NAMES[row.rowid % 8], 'id': row.rowid // 8,
+             'score': round(row.score, 4), 'snippet': row.snippet} for row in rows[:per_page]]
+    return hits, len(rows) > per_page
+
+def _like_search(q, kinds, page, per_page):
+    """Unranked fallback for databases without FTS5; only titles are matched."""
+    hits = []
+    if not kinds or 'video' in kinds:
+        hits += [{'kind': 'video', 'id': v.id, 'score': 0, 'snippet': v.title}
+                 for v in Video.query.filter(Video.title.contains(q), Video.status == 'completed')]
+    if not kinds or 'playlist' in kinds:
+        hits += [{'kind': 'playlist', 'id': p.id, 'score': 0, 'snippet': p.title}
+                 for p in Playlist.query.filter(Playlist.title.contains(q))]
+    start = (max(page, 1) - 1) * per_page
+    return hits[start:start + per_page], len(hits) > start + per_page
+
+def load_hits(hits, user):
+    """Fetch the objects behind search hits that `user` may open, one query per kind, keyed by (kind, id).
+
+    The index holds every document, so hits are filtered here with the rules of
+    the pages they link to: quizzes and their questions as on the quiz pages,
+    comments only on videos that can be watched. Filtered hits are simply absent.
+    """
+    models = {'video': Video, 'playlist': Playlist, 'quiz': Quiz, 'question': Question, 'comment': Comment}
+    ids = {}
+    for hit in hits:
+        ids.setdefault(hit['kind'], []).append(hit['id'])
+    objects = {}
+    for kind, kind_ids in ids.items():
+        model = models[kind]
+        query = model.query.filter(model.id.in_(kind_ids))
+        if kind == 'quiz':
+            query = query.filter(visible_quizzes(user))
+        elif kind == 'question':
+            query = query.join(Quiz, Quiz.id == Question.quiz_id).filter(visible_quizzes(user))
+        elif kind == 'comment':
+            query = query.join(Video, Video.id == Comment.video_id).filter(Video.status == 'completed')
+        for obj in query:
+            objects[(kind, obj.id)] = obj
+    return objects
+
+def visible_quizzes(user):
+    """Filter for the quizzes a user can open: students those of their classes or of no class, teachers their own."""
+    if user.role == 'student':
+        enrolled_class_ids = [c.id for c in user.enrolled_classes]
+        return Quiz.classroom_id.in_(enrolled_class_ids) | Quiz.classroom_id.is_(None)
+    if user.role == 'teacher':
+        return Quiz.teacher_id == user.id
+    return true()
@@ -0,0 +1,405 @@
+"""Prefork production server.
+
+    flask --app app serve --workers 4 --bind 0.0.0.0:8000
+    python server.py --workers 4 --bind 0.0.0.0:8000
+
+The master process binds the listening socket, prepares the database once and
+forks the workers. It never imports the application itself, so every worker
+it starts loads the code currently on disk. Each web worker serves the shared
+socket with a threaded WSGI server and runs its own heartbeat flusher.
+Transcoding runs in one more process, in its own process group and at a lower
+CPU priority, so encoding never competes with request handlers for the GIL.
+Events (chat, upload progress, cache invalidations) published in any worker
+are copied by the master to all the others; see events.EventRelay.
+
+Signals to the master:
+    TERM, INT   graceful stop; a second one kills the workers
+    HUP         graceful reload: migrate, then replace workers one at a time
+    TTIN, TTOU  add or remove a web worker
+
+Workers that die are restarted. A draining web worker stops accepting, ends
+its SSE streams (browsers reconnect to another worker), waits up to
+--graceful-timeout for in-flight requests and flushes its heartbeats.
+Windows has no fork(), so there a single threaded process serves instead.
+"""
+import argparse
+import importlib
+import os
+import selectors
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from werkzeug.serving import ThreadedWSGIServer, make_server
+from werkzeug.wsgi import ClosingIterator
+
+RESPAWN_INTERVAL = 1  # seconds between restarts of the same worker slot
+KILL_GRACE = 5  # seconds past the graceful timeout before a stopping worker is killed
+
+
+def load_app(spec):
+    """Import 'module:name', calling it when written as 'module:factory()'."""
+    module_name, _, name = spec.partition(':')
+    module = importlib.import_module(module_name)
+    name = name or 'app'
+    if name.endswith('()'):
+        return getattr(module, name[:-2])()
+    return getattr(module, name)
+
+def prepare(spec):
+    """Run the app module's prepare_database(app) (migrations, first-run data), if it has one."""
+    app = load_app(spec)
+    prepare_database = getattr(importlib.import_module(spec.partition(':')[0]), 'prepare_database', None)
+    if prepare_database:
+        prepare_database(app)
+    return app
+
+
+class InFlight:
+    """WSGI middleware counting requests whose response has not been closed yet."""
+
+    def __init__(self, app):
+        self.app = app
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.count += 1
+        try:
+            response = self.app(environ, start_response)
+        except BaseException:
+            self._done()
+            raise
+        return ClosingIterator(response, self._done)
+
+    def _done(self):
+        with self._lock:
+            self.count -= 1
+
+
+class WorkerServer(ThreadedWSGIServer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Every worker waits on the same socket; the ones that lose the race to accept must not block
+        self.socket.setblocking(False)
+
+    def get_request(self):
+        conn, addr = super().get_request()
+        conn.setblocking(True)  # BSD and macOS pass O_NONBLOCK on to accepted sockets
+        return conn, addr
+
+
+class Worker:
+    def __init__(self, kind, slot, generation):
+        self.kind = kind  # 'web' or 'transcode'
+        self.slot = slot
+        self.generation = generation
+        self.pid = None
+        self.relay = None  # Master's end of the worker's event socket
+        self.buffer = b''
+        self.stopping_since = None
+
+
+class PreforkServer:
+    def __init__(self, app_spec, host, port, workers, graceful_timeout=30, transcode_nice=10):
+        self.app_spec = app_spec
+        self.host = host
+        self.port = port
+        self.num_workers = max(1, workers)
+        self.graceful_timeout = graceful_timeout
+        self.transcode_nice = transcode_nice
+        self.generation = 0
+        self.workers = {}
+        self.last_spawn = {}
+        self.signals = []
+        self.stopping = False
+
+    # ---- Master ----
+    def run(self):
+        if not self.run_prepare():
+            sys.exit(1)
+        self.sock = socket.create_server((self.host, self.port), backlog=2048)
+        self.sock.set_inheritable(True)
+        self.selector = selectors.DefaultSelector()
+        self.wakeup_r, self.wakeup_w = socket.socketpair()
+        self.wakeup_r.setblocking(False)
+        self.wakeup_w.setblocking(False)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ)
+        signal.set_wakeup_fd(self.wakeup_w.fileno(), warn_on_full_buffer=False)
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(sig, lambda signum, frame: self.signals.append(signum))
+        print(f"Master {os.getpid()} serving http://{self.host}:{self.port} with "
+              f"{self.num_workers} web worker(s) and a transcode process", flush=True)
+
+        while self.workers or not self.stopping:
+            for key, _ in self.selector.select(timeout=1.0):
+                if key.fileobj is self.wakeup_r:
+                    try:
+                        self.wakeup_r.recv(4096)
+                    except BlockingIOError:
+                        pass
+                else:
+                    self.forward(key.data)
+            self.handle_signals()
+            self.reap()
+            self.maintain()
+        self.sock.close()
+        print(f"Master {os.getpid()} stopped", flush=True)
+
+    def run_prepare(self):
+        """Migrate and seed the database in a short-lived child, keeping the app out of the master."""
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                prepare(self.app_spec)
+                status = 0
+            except Exception:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                os._exit(status)
+        _, status = os.waitpid(pid, 0)
+        if os.waitstatus_to_exitcode(status) != 0:
+            print("Database preparation failed; see the error above.", flush=True)
+            return False
+        return True
+
+    def handle_signals(self):
+        while self.signals:
+            signum = self.signals.pop(0)
+            if signum in (signal.SIGTERM, signal.SIGINT):
+                if self.stopping:
+                    for worker in list(self.workers.values()):
+                        self.kill(worker)
+                else:
+                    print("Graceful stop requested", flush=True)
+                    self.stopping = True
+                    for worker in self.workers.values():
+                        self.retire(worker)
+            elif signum == signal.SIGHUP and not self.stopping:
+                print("Reload requested: preparing the database, then replacing workers", flush=True)
+                if self.run_prepare():
+                    self.generation += 1
+            elif signum == signal.SIGTTIN:
+                self.num_workers += 1
+            elif signum == signal.SIGTTOU:
+                self.num_workers = max(1, self.num_workers - 1)
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            self.selector.unregister(worker.relay)
+            worker.relay.close()
+            if worker.stopping_since is None:
+                print(f"{worker.kind.capitalize()} worker {pid} died with code "
+                      f"{os.waitstatus_to_exitcode(status)}; restarting", flush=True)
+
+    def maintain(self):
+        now = time.monotonic()
+        for worker in list(self.workers.values()):
+            if worker.stopping_since and now - worker.stopping_since > self.graceful_timeout + KILL_GRACE:
+                print(f"{worker.kind.capitalize()} worker {worker.pid} did not stop in time; killing it", flush=True)
+                self.kill(worker)
+        if self.stopping:
+            return
+
+        # A slot is refilled only once its previous worker has exited, so two processes
+        # never share a heartbeat journal and the transcode queue is never recovered twice
+        occupied = {(w.kind, w.slot) for w in self.workers.values()}
+        wanted = [('web', slot) for slot in range(self.num_workers)] + [('transcode', 0)]
+        for kind, slot in wanted:
+            if (kind, slot) not in occupied and now - self.last_spawn.get((kind, slot), 0) >= RESPAWN_INTERVAL:
+                self.spawn(kind, slot)
+
+        if any(w.stopping_since for w in self.workers.values()):
+            return
+        for worker in sorted(self.workers.values(), key=lambda w: (w.kind != 'web', w.slot)):
+            if worker.generation < self.generation or (worker.kind == 'web' and worker.slot >= self.num_workers):
+                self.retire(worker)  # One at a time, so the other workers keep serving
+                return
+
+    def spawn(self, kind, slot):
+        worker = Worker(kind, slot, self.generation)
+        parent_end, child_end = socket.socketpair()
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                parent_end.close()
+                for other in self.workers.values():
+                    other.relay.close()
+                self.selector.close()
+                signal.set_wakeup_fd(-1)
+                for sig in (signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+                    signal.signal(sig, signal.SIG_DFL)
+                # Ctrl+C reaches the whole foreground process group; the master decides how to stop
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                if kind == 'web':
+                    status = self.run_web_worker(slot, child_end)
+                else:
+                    status = self.run_transcode_worker(child_end)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                os._exit(status)
+
+        child_end.close()
+        if kind == 'transcode':
+            try:
+                os.setpgid(pid, pid)  # Also done in the child; whichever runs first wins
+            except OSError:
+                pass
+        parent_end.settimeout(1.0)  # A stuck worker costs a dropped event, never a stalled master
+        worker.pid = pid
+        worker.relay = parent_end
+        self.selector.register(parent_end, selectors.EVENT_READ, worker)
+        self.workers[pid] = worker
+        self.last_spawn[(kind, slot)] = time.monotonic()
+
+    def retire(self, worker):
+        if worker.stopping_since is not None:
+            return
+        worker.stopping_since = time.monotonic()
+        try:
+            os.kill(worker.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def kill(self, worker):
+        try:
+            if worker.kind == 'transcode':
+                os.killpg(worker.pid, signal.SIGKILL)  # ffmpeg children too
+            else:
+                os.kill(worker.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def forward(self, worker):
+        """Copy complete event frames from one worker to every other worker."""
+        try:
+            chunk = worker.relay.recv(65536)
+        except (BlockingIOError, socket.timeout):
+            return
+        except OSError:
+            chunk = b''
+        if not chunk:
+            return  # Worker exited; reap() cleans up
+        *frames, worker.buffer = (worker.buffer + chunk).split(b'\n')
+        if not frames:
+            return
+        data = b''.join(frame + b'\n' for frame in frames)
+        for other in self.workers.values():
+            if other is not worker and other.stopping_since is None:
+                try:
+                    other.relay.sendall(data)
+                except OSError as e:
+                    print(f"Event relay to worker {other.pid} failed: {e}", flush=True)
+
+    # ---- Workers ----
+    def run_web_worker(self, slot, relay_sock):
+        from analytics_buffer import heartbeat_buffer
+        from events import broker, relay
+        from notifications import notifications
+
+        app = load_app(self.app_spec)
+        app.config['TRANSCODE_IN_PROCESS'] = False
+        if slot:
+            root, ext = os.path.splitext(app.config['ANALYTICS_JOURNAL'])
+            app.config['ANALYTICS_JOURNAL'] = f'{root}.{slot}{ext}'
+        relay.attach(relay_sock)
+        heartbeat_buffer.start()
+
+        in_flight = InFlight(app)
+        server = WorkerServer(self.host, self.port, in_flight, fd=self.sock.fileno())
+        draining = threading.Event()
+
+        def drain(signum, frame):
+            if not draining.is_set():
+                draining.set()
+                threading.Thread(target=server.shutdown, daemon=True).start()
+        signal.signal(signal.SIGTERM, drain)
+
+        print(f"Web worker {os.getpid()} (slot {slot}) booted", flush=True)
+        server.serve_forever()
+
+        broker.close_all()
+        deadline = time.monotonic() + self.graceful_timeout
+        while in_flight.count and time.monotonic() < deadline:
+            time.sleep(0.1)
+        heartbeat_buffer.shutdown()
+        notifications.shutdown()
+        print(f"Web worker {os.getpid()} stopped", flush=True)
+        return 0
+
+    def run_transcode_worker(self, relay_sock):
+        from jobs import transcode_queue
+        from events import relay
+
+        os.setpgid(0, 0)
+        os.nice(self.transcode_nice)
+        self.sock.close()  # This process serves no HTTP
+        load_app(self.app_spec)
+        relay.attach(relay_sock)
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        transcode_queue.start()
+        print(f"Transcode worker {os.getpid()} booted", flush=True)
+        while not stop.wait(1):
+            pass
+        # Jobs cut short when the master kills this process are requeued by the next one's recover()
+        transcode_queue.stop(timeout=self.graceful_timeout)
+        print(f"Transcode worker {os.getpid()} stopped", flush=True)
+        return 0
+
+
+def serve_single(app_spec, host, port):
+    """Fallback without fork(): one threaded process running the transcode pool in-process."""
+    from analytics_buffer import heartbeat_buffer
+
+    app = prepare(app_spec)
+    heartbeat_buffer.start()
+    app.extensions['transcode_queue'].start()
+    print(f"Serving http://{host}:{port} from a single process (no fork() on this platform)")
+    make_server(host, port, app, threaded=True).serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prefork production server.')
+    parser.add_argument('--app', default='app:create_app()', help="'module:app' or 'module:factory()'")
+    parser.add_argument('--bind', default='0.0.0.0:8000', help='host:port to listen on')
+    parser.add_argument('--workers', '-w', type=int,
+                        default=int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 2)),
+                        help='web worker processes (default: $WEB_CONCURRENCY or the CPU count)')
+    parser.add_argument('--graceful-timeout', type=int, default=30,
+                        help='seconds a stopping worker may spend on in-flight work')
+    parser.add_argument('--transcode-nice', type=int, default=10,
+                        help='niceness added to the transcode process')
+    args = parser.parse_args(argv)
+    host, _, port = args.bind.rpartition(':')
+    host = host.strip('[]') or '0.0.0.0'
+
+    if not hasattr(os, 'fork'):
+        serve_single(args.app, host, int(port))
+        return
+    PreforkServer(args.app, host, int(port), args.workers, args.graceful_timeout, args.transcode_nice).run()
+
+
+if __name__ == '__main__':
+    main()
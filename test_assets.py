@@ -0,0 +1,186 @@
+"""
+Content-addressed uploads: duplicates share one transcode, outputs are reference counted.
+Run with: python -m pytest test_assets.py
+"""
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+from datetime import datetime
+
+import pytest
+from flask import Flask
+from flask_migrate import upgrade
+from sqlalchemy import inspect
+
+import transcode
+from assets import claim_asset, complete_asset
+from database import init_database
+from events import broker, live_progress
+from extensions import db, migrate
+from jobs import transcode_queue
+from models import MediaAsset, TranscodeJob, Video
+from uploads import save_stream
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA = b'\x00\x00\x00\x18ftypmp42' * 4096
+
+
+@pytest.fixture
+def app_config(app_config):
+    return dict(app_config, TRANSCODE_IN_PROCESS=False)  # Jobs are written but no ffmpeg worker starts
+
+
+def upload(client, title, data=DATA):
+    response = client.post('/teacher/upload', data={'title': title, 'video_file': (io.BytesIO(data), 'lesson.mp4')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    return db.session.get(Video, response.json['video_id']), response.json
+
+
+def finish_transcode(app, video):
+    """What process_video records after a successful encode into the asset's folder."""
+    folder = f'hls/media/{video.asset.digest}'
+    os.makedirs(os.path.join(app.config['HLS_FOLDER'], 'media', video.asset.digest))
+    video.hls_playlist_path = f'{folder}/master.m3u8'
+    video.thumbnail_path = f'{folder}/thumbnail.jpg'
+    video.status = 'completed'
+    complete_asset(video.asset, video)
+    db.session.commit()
+
+
+def test_save_stream_hashes_while_writing(tmp_path):
+    path = tmp_path / 'copy.mp4'
+    assert save_stream(io.BytesIO(DATA), path) == (hashlib.blake2b(DATA).hexdigest(), len(DATA))
+    assert path.read_bytes() == DATA
+
+
+def test_duplicate_reuses_outputs_until_last_delete(app, client, login):
+    login('teacher')
+    first, body = upload(client, 'Original')
+    assert body['status'] == 'pending' and TranscodeJob.query.count() == 1
+    asset = first.asset
+    assert (asset.digest, asset.size, asset.ref_count) == (hashlib.blake2b(DATA).hexdigest(), len(DATA), 1)
+    finish_transcode(app, first)
+
+    second, body = upload(client, 'Copy')
+    assert body['status'] == 'completed' and TranscodeJob.query.count() == 1  # No second encode
+    assert second.hls_playlist_path == first.hls_playlist_path and second.asset_id == asset.id
+    assert not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], second.filename))
+    assert db.session.get(MediaAsset, asset.id).ref_count == 2
+
+    other, body = upload(client, 'Different', data=DATA + b'!')
+    assert body['status'] == 'pending' and other.asset_id != asset.id
+
+    shared_dir = os.path.join(app.config['HLS_FOLDER'], 'media', asset.digest)
+    asset_id, second_id = asset.id, second.id
+    client.post(f'/teacher/delete_video/{first.id}')
+    assert os.path.isdir(shared_dir) and db.session.get(MediaAsset, asset_id).ref_count == 1
+    client.post(f'/teacher/delete_video/{second_id}')
+    assert not os.path.exists(shared_dir) and db.session.get(MediaAsset, asset_id) is None
+
+
+def test_identical_upload_waits_for_running_transcode(app, client, login):
+    login('teacher')
+    first, _ = upload(client, 'Original')
+    second, _ = upload(client, 'Copy')
+    assert first.asset_id == second.asset_id and second.asset.ref_count == 2
+    transcode_queue._claim()  # The original's job starts encoding
+    assert claim_asset(first.asset)
+    waiting = transcode_queue._claim()
+    assert waiting.video_id == second.id
+
+    transcode_queue._execute(waiting)  # The asset is taken by the other job
+    waiting = db.session.get(TranscodeJob, waiting.id)
+    assert (waiting.status, waiting.attempts) == ('pending', 0) and waiting.run_after > datetime.utcnow()
+
+    finish_transcode(app, first)
+    assert db.session.get(Video, second.id).status == 'completed'
+    transcode_queue._execute(waiting)
+    assert db.session.get(TranscodeJob, waiting.id).status == 'completed'
+    assert not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], second.filename))
+
+
+def test_finished_encode_reports_the_waiting_uploads(client, login, monkeypatch):
+    teacher = login('teacher')
+    first, _ = upload(client, 'Original')
+    second, _ = upload(client, 'Copy')
+    second_id = second.id
+    live_progress[second_id] = {'id': second_id, 'title': 'Copy', 'status': 'pending', 'progress': 0}
+
+    class Encode:  # ffmpeg exiting cleanly without reporting progress
+        stdout, returncode = io.StringIO(), 0
+        def __init__(self, *args, **kwargs): pass
+        def wait(self): pass
+    monkeypatch.setattr(subprocess, 'Popen', Encode)
+    monkeypatch.setattr(transcode, 'probe_video', lambda path: {'duration': 0, 'width': 0, 'height': 0,
+                                                                'has_audio': False})
+    channel = f'uploads:{teacher.id}'
+    events = broker.subscribe(channel)
+    transcode_queue._execute(transcode_queue._claim())
+    broker.unsubscribe(channel, events)
+
+    assert db.session.get(Video, second_id).status == 'completed' and second_id not in live_progress
+    published = {}
+    while not events.empty():
+        _, data, _ = events.get()
+        published[data['id']] = data['status']
+    assert published == {first.id: 'completed', second_id: 'completed'}
+
+
+def test_retried_job_defers_to_the_current_owner(app, client, login):
+    login('teacher')
+    first, _ = upload(client, 'Original')
+    second, _ = upload(client, 'Copy')
+    asset_id = first.asset_id
+    failed = transcode_queue._claim()
+    transcode_queue._execute(failed)  # No ffmpeg here, so the encode fails and frees the asset
+    failed = db.session.get(TranscodeJob, failed.id)
+    assert (failed.status, failed.attempts) == ('pending', 1)
+    assert db.session.get(MediaAsset, asset_id).status == 'pending'
+
+    # The younger job is claimed during the backoff and takes the asset
+    owner = transcode_queue._claim()
+    assert owner.video_id == second.id and claim_asset(db.session.get(MediaAsset, asset_id))
+    failed.run_after = datetime.utcnow()
+    db.session.commit()
+    retry = transcode_queue._claim()
+    assert retry.id == failed.id
+    transcode_queue._execute(retry)
+    retry = db.session.get(TranscodeJob, failed.id)
+    assert (retry.status, retry.attempts) == ('pending', 1)  # Deferred, not encoding alongside
+    assert db.session.get(MediaAsset, asset_id).status == 'encoding'
+
+
+def test_chunked_upload_is_deduplicated(app, client, login):
+    login('teacher')
+    first, _ = upload(client, 'Original')
+    finish_transcode(app, first)
+
+    checksum = 'sha256:' + hashlib.sha256(DATA).hexdigest()
+    created = client.post('/api/uploads', json={'filename': 'lesson.mp4', 'size': len(DATA), 'checksum': checksum}).json
+    half = len(DATA) // 2
+    for offset, chunk in ((half, DATA[half:]), (0, DATA[:half])):  # Out of order
+        response = client.patch(created['location'], data=chunk, headers={'Upload-Offset': str(offset)})
+        assert response.status_code == 204
+    body = client.post(f"{created['location']}/finalize").json
+    assert body['status'] == 'completed'
+    assert db.session.get(Video, body['video_id']).asset_id == first.asset_id
+
+
+def test_migration_upgrades_the_shipped_database(tmp_path):
+    path = tmp_path / 'app.db'
+    shutil.copy(os.path.join(HERE, 'app.db'), path)  # Created by db.create_all before migrations existed
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    init_database(app)
+    migrate.init_app(app, db, directory=os.path.join(HERE, 'migrations'), render_as_batch=True)
+    with app.app_context():
+        videos = db.session.execute(db.text('SELECT id, status FROM video ORDER BY id')).all()
+        upgrade(directory=os.path.join(HERE, 'migrations'))
+        assert db.session.execute(db.text('SELECT id, status FROM video ORDER BY id')).all() == videos
+        foreign_keys = inspect(db.engine).get_foreign_keys('video')
+        assert {'asset_id'} in [set(fk['constrained_columns']) for fk in foreign_keys]
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,101 @@
+"""
+Whole-class attendance: one upsert per register and set-based warnings.
+Run with: python -m pytest test_attendance.py
+"""
+from datetime import date, datetime
+
+from sqlalchemy import event
+
+from attendance import default_status
+from extensions import db
+from models import Attendance, Classroom, User
+
+
+def make_class(teacher, size, prefix='student'):
+    classroom = Classroom(name='Register', teacher_id=teacher.id)
+    students = [User(username=f'{prefix}{i}', password_hash='x', role='student') for i in range(size)]
+    db.session.add(classroom)
+    db.session.add_all(students)
+    db.session.flush()
+    for student in students:
+        classroom.students.append(student)
+    db.session.commit()
+    return classroom, students
+
+
+def count_statements(fn):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return response, len(statements)
+
+
+def test_default_status():
+    assert default_status(datetime(2026, 3, 2, 9, 14)) == 'Present'
+    assert default_status(datetime(2026, 3, 2, 9, 20)) == 'Late'
+
+
+def test_register_upserts_and_warns(client, login):
+    teacher = login('teacher')
+    classroom, (late, absent, remarked, present) = make_class(teacher, 4)
+    today = date(2025, 3, 18)
+    outsider = User(username='outsider', password_hash='x', role='student')
+    db.session.add(outsider)
+    for day in (date(2025, 2, 28), date(2025, 3, 3), date(2025, 3, 17)):
+        # Two lates this month plus one in February, and three absences in a row
+        db.session.add(Attendance(student_id=late.id, classroom_id=classroom.id, date=day, status='Late'))
+        db.session.add(Attendance(student_id=absent.id, classroom_id=classroom.id, date=day, status='Absent'))
+    db.session.add(Attendance(student_id=remarked.id, classroom_id=classroom.id, date=today, status='Present'))
+    db.session.commit()
+
+    response = client.post(f'/api/teacher/attendance/{classroom.id}', json={'date': '2025-03-18', 'marks': [
+        {'student_id': late.id, 'status': 'late'},
+        {'student_id': absent.id, 'status': 'Absent'},
+        {'student_id': remarked.id, 'status': 'Late'},
+        {'student_id': present.id, 'status': 'Present'},
+        {'student_id': outsider.id, 'status': 'Present'},
+        {'student_id': present.id, 'status': 'Absent'},
+        {'student_id': 'x'},
+    ]})
+    report = response.json
+    assert response.status_code == 200
+    assert report['marked'] == 4 and report['counts'] == {'Late': 2, 'Absent': 1, 'Present': 1}
+    assert [e['error'] for e in report['errors']] == ['Duplicate student', 'student_id must be an integer',
+                                                      'Not enrolled in this class']
+    assert report['absence_streaks'] == [{'student_id': absent.id, 'username': absent.username}]
+    assert report['late_warnings'] == [{'student_id': late.id, 'username': late.username, 'lates': 3}]
+
+    rows = Attendance.query.filter_by(student_id=remarked.id, date=today).all()
+    assert [r.status for r in rows] == ['Late']  # Updated in place, not duplicated
+
+
+def test_statement_count_does_not_grow_with_class_size(client, login):
+    teacher = login('teacher')
+    counts = []
+    for size in (5, 60):
+        classroom, students = make_class(teacher, size, prefix=f'class{size}-')
+        marks = [{'student_id': s.id, 'status': 'Present'} for s in students]
+        for _ in range(2):  # Insert, then update the same register
+            response, statements = count_statements(
+                lambda: client.post(f'/api/teacher/attendance/{classroom.id}', json={'marks': marks}))
+            assert response.json['marked'] == size
+            counts.append(statements)
+    assert counts[0] == counts[1] == counts[2] == counts[3]
+    # User, classroom, enrollment check, upsert, late counts, absence streaks
+    assert counts[0] <= 6
+
+
+def test_register_validation(client, login):
+    teacher = login('teacher')
+    classroom, _ = make_class(teacher, 1)
+    url = f'/api/teacher/attendance/{classroom.id}'
+    assert client.post(url, json={'marks': []}).status_code == 400
+    assert client.post(url, json={'date': '2999-01-01', 'marks': [{'student_id': 1}]}).status_code == 400
+    assert client.post(url, json={'date': '01/02/2026', 'marks': [{'student_id': 1}]}).status_code == 400
+    client.get('/logout')
+    login('teacher', username='someone-else')
+    assert client.post(url, json={'marks': [{'student_id': 1}]}).status_code == 403
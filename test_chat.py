@@ -0,0 +1,71 @@
+"""
+Classroom chat streams: connection accounting and backlogs on the in-memory hub.
+Run with: python -m pytest test_chat.py
+"""
+from chat import chat_hub
+from events import relay
+from extensions import db
+from models import Classroom
+
+
+def make_classroom(teacher):
+    classroom = Classroom(name='Physics', teacher_id=teacher.id)
+    db.session.add(classroom)
+    db.session.commit()
+    return classroom
+
+
+def test_unread_stream_releases_its_slot(client, login):
+    classroom = make_classroom(login('teacher'))
+    url = f'/api/chatroom/{classroom.id}/stream'
+    for _ in range(3):
+        response = client.head(url)  # Werkzeug sends no body, so the generator never starts
+        assert response.status_code == 200
+        response.close()  # What the WSGI server does once the response is written
+    assert chat_hub.stats()['connections'] == 0 and chat_hub.stats()['subscribers'] == 0
+
+    response = client.get(url, buffered=False)
+    assert next(response.response).startswith(b'retry:')
+    assert chat_hub.stats()['connections'] == 1
+    response.close()
+    stats = chat_hub.stats()
+    assert (stats['connections'], stats['subscribers'], stats['warm_rooms']) == (0, 0, 0)
+
+
+def test_cold_backlog_loads_outside_the_lock(app, monkeypatch):
+    def payload(message_id):
+        return {'id': message_id, 'username': 'teacher', 'role': 'teacher', 'content': f'm{message_id}',
+                'timestamp': '09:00 AM', 'user_id': 1}
+
+    def load_backlog(limit):
+        assert not chat_hub._lock.locked()  # Other rooms keep streaming and posting meanwhile
+        chat_hub.publish(1, payload(2))  # Posted after subscribing, and also read by the query
+        return [payload(1), payload(2)]
+    monkeypatch.setattr(chat_hub, 'heartbeat', 0.01)
+    stream, release = chat_hub.stream(1, load_backlog)
+    frames = [next(stream).split('\n', 1)[0] for _ in range(4)]
+    assert frames[:3] == ['retry: 3000', 'id: 1', 'id: 2'] and frames[3].startswith(': keepalive')  # 2 sent once
+    assert [m['id'] for m in chat_hub._backlogs[1]] == [1, 2]
+    stream.close()
+    assert chat_hub.stats()['connections'] == 0
+
+
+def test_relayed_events_update_the_backlog(client, login):
+    classroom = make_classroom(login('teacher'))
+    url = f'/api/chatroom/{classroom.id}/stream'
+    watcher = client.get(url, buffered=False)  # Warms the room on this worker
+    next(watcher.response)
+
+    # Posted and deleted through another worker of the prefork server
+    channel = chat_hub.channel(classroom.id)
+    for message_id in (7, 8):
+        payload = {'id': message_id, 'username': 'teacher', 'role': 'teacher', 'content': f'm{message_id}',
+                   'timestamp': '09:00 AM', 'user_id': 1}
+        relay.dispatch(channel, 'message', payload, message_id)
+    relay.dispatch(channel, 'delete', {'id': 7})
+
+    joined = client.get(url, buffered=False)
+    assert next(joined.response).startswith(b'retry:')
+    assert next(joined.response).startswith(b'id: 8\nevent: message\n')  # 7 is gone from the backlog
+    joined.close()
+    watcher.close()
@@ -0,0 +1,117 @@
+"""
+Threaded comments: one query per page of threads, bounded depth and "load more" cursors.
+Run with: python -m pytest test_comments.py
+"""
+from sqlalchemy import event
+
+import routes.student
+from comments import fetch_comment_threads
+from extensions import db
+from models import Comment, User, Video
+
+
+def make_video():
+    teacher = User(username='teacher', password_hash='x', role='teacher')
+    db.session.add(teacher)
+    db.session.flush()
+    video = Video(title='Optics', filename='optics.mp4', uploader_id=teacher.id, status='completed')
+    db.session.add(video)
+    db.session.commit()
+    return video, teacher
+
+
+def add_thread(video, author, fanout, depth, parent=None, label='t'):
+    """A comment with `fanout` replies per comment, `depth` levels deep."""
+    comment = Comment(content=label, user_id=author.id, video_id=video.id, parent_id=parent)
+    db.session.add(comment)
+    db.session.flush()
+    if depth:
+        for i in range(fanout):
+            add_thread(video, author, fanout, depth - 1, comment.id, f'{label}.{i}')
+    return comment
+
+
+def walk(comments):
+    """What the watch page template reads: content, author and nested replies."""
+    out = []
+    for c in comments:
+        out.append((c.content, c.author.username, c.reply_count, walk(c.replies)))
+    return out
+
+
+def count_statements(fn):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        result = fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return result, len(statements)
+
+
+def test_threads_are_bounded(app):
+    video, teacher = make_video()
+    for i in range(3):
+        add_thread(video, teacher, fanout=3, depth=4, label=f't{i}')
+    db.session.commit()
+    video_id = video.id
+    db.session.expunge_all()
+
+    (threads, has_more), statements = count_statements(
+        lambda: fetch_comment_threads(video_id=video_id, limit=2, depth=2, replies=2))
+    tree, walked = count_statements(lambda: walk(threads))
+    assert (statements, walked) == (1, 0)
+    assert has_more and [t.content for t in threads] == ['t2', 't1']  # Newest first
+    content, author, reply_count, replies = tree[0]
+    assert (content, author, reply_count) == ('t2', 'teacher', 3)
+    assert [r[0] for r in replies] == ['t2.0', 't2.1']  # Oldest first, capped at 2 of 3
+    assert [r[:3] for r in replies[0][3]] == [('t2.0.0', 'teacher', 3), ('t2.0.1', 'teacher', 3)]
+    assert replies[0][3][0][3] == []  # Depth cap: reply_count says there is more to load
+
+    older, has_more = fetch_comment_threads(video_id=video_id, cursor=threads[-1].id, limit=2, depth=2, replies=2)
+    assert [t.content for t in older] == ['t0'] and not has_more
+
+
+def test_watch_page_query_count_is_flat(client, login, monkeypatch):
+    video, teacher = make_video()
+    video_id, teacher_id = video.id, teacher.id
+    login('student')
+    rendered = []
+    monkeypatch.setattr(routes.student, 'render_template',
+                        lambda template, comments, **context: rendered.append(walk(comments)) or '')
+
+    client.get(f'/watch/{video_id}')  # Warm the site settings cache
+    counts = []
+    for label in ('small', 'big'):
+        add_thread(db.session.get(Video, video_id), db.session.get(User, teacher_id),
+                   fanout=2 if label == 'small' else 6, depth=3, label=label)
+        db.session.commit()
+        db.session.expunge_all()
+        response, statements = count_statements(lambda: client.get(f'/watch/{video_id}'))
+        assert response.status_code == 200
+        counts.append(statements)
+    assert counts[0] == counts[1]
+    # User, video, related videos, comment threads
+    assert counts[0] <= 4
+    assert [c[0] for c in rendered[-1]] == ['big', 'small']
+
+
+def test_comment_api_cursors(client, login):
+    video, teacher = make_video()
+    for i in range(3):
+        add_thread(video, teacher, fanout=0, depth=0, label=f'top{i}')
+    root = add_thread(video, teacher, fanout=7, depth=1, label='root')
+    db.session.commit()
+    login('student')
+
+    page = client.get(f'/api/comments/{video.id}?limit=2').json
+    assert [c['content'] for c in page['comments']] == ['root', 'top2'] and page['has_more']
+    assert page['comments'][0]['reply_count'] == 7 and len(page['comments'][0]['replies']) == 5
+    page = client.get(f"/api/comments/{video.id}?limit=2&before={page['next_cursor']}").json
+    assert [c['content'] for c in page['comments']] == ['top1', 'top0'] and not page['has_more']
+
+    shown = client.get(f'/api/comments/{video.id}').json['comments'][0]['replies']
+    more = client.get(f"/api/comment/{root.id}/replies?after={shown[-1]['id']}").json
+    assert [c['content'] for c in more['comments']] == ['root.5', 'root.6'] and not more['has_more']
+    assert client.get('/api/comment/9999/replies').status_code == 404
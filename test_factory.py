@@ -0,0 +1,90 @@
+"""
+In-process checks of the application factory, using the fixtures in conftest.py.
+Run with: python -m pytest test_factory.py
+"""
+import os
+import subprocess
+import sys
+import threading
+
+from flask import url_for
+
+import app as app_module
+from app import create_app
+from extensions import db
+from models import Classroom, User
+
+
+def test_blueprints_registered(app):
+    assert set(app.blueprints) == {'main', 'admin', 'teacher', 'videos', 'student', 'quiz', 'analytics',
+                                   'attendance', 'chat'}
+
+
+def test_heavy_modules_not_imported_at_startup():
+    code = ("import sys, app; app.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'}); "
+            "print(sorted(m for m in ('numpy', 'retention') if m in sys.modules))")
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    assert out.strip() == '[]'
+
+
+def test_apps_are_isolated(app_config, tmp_path):
+    first = create_app(dict(app_config, UPLOAD_FOLDER=str(tmp_path / 'a')))
+    second = create_app(dict(app_config, UPLOAD_FOLDER=str(tmp_path / 'b')))
+    with first.app_context():
+        db.create_all()
+        db.session.add(User(username='only-in-first', password_hash='x', role='student'))
+        db.session.commit()
+    with second.app_context():
+        db.create_all()
+        assert User.query.count() == 0
+    assert first.config['UPLOAD_FOLDER'] != second.config['UPLOAD_FOLDER']
+
+
+def test_health_probes(client):
+    assert client.get('/healthz').json['status'] == 'ok'
+    assert client.get('/readyz').json == {'status': 'ok', 'database': 'ok', 'pid': client.get('/healthz').json['pid']}
+
+
+def test_legacy_endpoint_names(app):
+    with app.test_request_context():
+        assert url_for('login') == url_for('main.login') == '/login'
+        assert url_for('watch_video', video_id=3) == '/watch/3'
+        assert url_for('chatroom', class_id=2) == '/chatroom/2'
+
+
+def test_login_and_role_checks(client, login):
+    assert client.get('/api/db/stats').status_code == 302  # to the login page
+    login('teacher')
+    assert client.get('/api/db/stats').status_code == 403
+    client.get('/logout')
+    login('admin')
+    stats = client.get('/api/db/stats')
+    assert stats.status_code == 200 and stats.json['backend'] == 'sqlite'
+
+
+def test_chat_round_trip(client, login):
+    teacher = login('teacher')
+    classroom = Classroom(name='Physics', teacher_id=teacher.id)
+    db.session.add(classroom)
+    db.session.commit()
+    sent = client.post(f'/api/chatroom/{classroom.id}/send', json={'content': 'Hello class'})
+    assert sent.json['success'] and sent.json['username'] == 'teacher'
+    page = client.get(f'/api/chatroom/{classroom.id}/messages').json
+    assert [m['content'] for m in page['messages']] == ['Hello class']
+
+
+def test_setup_is_cheap(app_config, monkeypatch):
+    # What every test pays before its first request: no migrations and no background threads
+    # (heavy imports are covered above); benchmarks/startup_benchmark.py has the timings
+    def upgrade(*args, **kwargs):
+        raise AssertionError('create_app() must not run migrations')
+    monkeypatch.setattr(app_module, 'upgrade', upgrade)
+    started = []
+    monkeypatch.setattr(threading.Thread, 'start', lambda thread: started.append(thread.name))
+
+    app = create_app(app_config)
+    with app.app_context():
+        db.create_all()
+        assert app.test_client().get('/healthz').status_code == 200
+    assert started == []
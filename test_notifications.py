@@ -0,0 +1,174 @@
+"""
+Notification delivery and the denormalised unread counter.
+Run with: python -m pytest test_notifications.py
+"""
+import os
+
+from flask import Flask
+from flask_migrate import upgrade
+from sqlalchemy import event
+
+from cache import unread_count
+from database import init_database
+from extensions import db, migrate
+from models import Comment, Notification, User, Video
+from notifications import mark_all_read, mark_read, notification_page, notifications, recount_unread
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+
+def make_video(teacher):
+    video = Video(title='Optics', filename='optics.mp4', uploader_id=teacher.id, status='completed')
+    db.session.add(video)
+    db.session.commit()
+    return video
+
+
+def counter(user):
+    db.session.expire_all()
+    return db.session.get(User, user.id).unread_notifications
+
+
+def test_comment_notifies_uploader(client, login):
+    teacher = User(username='teacher', password_hash='x', role='teacher')
+    db.session.add(teacher)
+    db.session.commit()
+    video = make_video(teacher)
+    student = login('student')
+
+    response = client.post('/api/comment', json={'video_id': video.id, 'content': 'Great lesson'})
+    assert response.json['success']
+    assert counter(teacher) == 1
+    note = Notification.query.filter_by(user_id=teacher.id).one()
+    assert note.comment_id == Comment.query.filter_by(user_id=student.id).one().id
+
+    # Replying to your own comment notifies nobody
+    client.post('/api/comment', json={'video_id': video.id, 'content': 'me again', 'parent_id': note.comment_id})
+    assert Notification.query.count() == 1
+
+
+def test_mark_read_moves_counter_once(client, login):
+    user = login('student')
+    other = User(username='other', password_hash='x', role='student')
+    db.session.add(other)
+    db.session.commit()
+    for i in range(3):
+        notifications.notify(user.id, f'note {i}')
+    notifications.notify(other.id, 'not yours')
+    assert counter(user) == 3 and unread_count(user.id) == 3
+
+    first = Notification.query.filter_by(user_id=user.id).first()
+    for _ in range(2):
+        assert client.post(f'/api/notifications/mark_one_read/{first.id}').json['unread_count'] == 2
+    theirs = Notification.query.filter_by(user_id=other.id).one()
+    client.post(f'/api/notifications/mark_one_read/{theirs.id}')
+    assert counter(other) == 1
+
+    response = client.post('/api/notifications/mark_read').json
+    assert (response['marked'], response['unread_count']) == (2, 0)
+    assert mark_all_read(user.id) == 0 and not mark_read(user.id, first.id)
+
+
+def test_async_batch_and_shutdown(app):
+    users = [User(username=f'u{i}', password_hash='x', role='student') for i in range(3)]
+    db.session.add_all(users)
+    db.session.commit()
+    app.config['NOTIFY_ASYNC'] = True
+    app.config['NOTIFY_FLUSH_INTERVAL'] = 60  # Only shutdown() will flush
+    try:
+        for user in users:
+            for _ in range(2):
+                notifications.notify(user.id, 'queued')
+        assert Notification.query.count() == 0 and notifications.stats()['queued'] == 6
+        notifications.shutdown()
+    finally:
+        app.config['NOTIFY_ASYNC'] = False
+    assert Notification.query.count() == 6
+    assert [counter(u) for u in users] == [2, 2, 2]
+
+
+def test_bad_row_does_not_block_the_batch(app):
+    users = [User(username=f'u{i}', password_hash='x', role='student') for i in range(2)]
+    db.session.add_all(users)
+    db.session.commit()
+    app.config['NOTIFY_ASYNC'] = True
+    app.config['NOTIFY_FLUSH_INTERVAL'] = 60
+    app.config['NOTIFY_MAX_ATTEMPTS'] = 2
+    dropped = notifications.stats()['dropped']
+    try:
+        notifications.notify(users[0].id, 'first')
+        notifications.notify(users[1].id, None)  # Violates NOT NULL, like a since-deleted video on PostgreSQL
+        notifications.notify(users[1].id, 'second')
+        assert notifications.flush() == 2
+        assert notifications.stats()['queued'] == 1
+        assert notifications.flush() == 0
+        stats = notifications.stats()
+        assert (stats['queued'], stats['dropped'] - dropped) == (0, 1) and stats['last_error']
+        notifications.shutdown()
+    finally:
+        app.config['NOTIFY_ASYNC'] = False
+    assert sorted(n.message for n in Notification.query) == ['first', 'second']
+    assert [counter(u) for u in users] == [1, 1]
+
+
+def test_unread_badge_is_a_primary_key_read(app):
+    user = User(username='reader', password_hash='x', role='student')
+    db.session.add(user)
+    db.session.commit()
+    for i in range(50):
+        notifications.notify(user.id, f'note {i}')
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    db.session.expire_all()
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        assert unread_count(user.id) == 50
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert len(statements) == 1 and 'count(' not in statements[0].lower()
+
+
+def test_orm_deletes_and_recount(app):
+    teacher = User(username='teacher', password_hash='x', role='teacher')
+    db.session.add(teacher)
+    db.session.commit()
+    video = make_video(teacher)
+    notifications.notify(teacher.id, 'about the video', video_id=video.id)
+    notifications.notify(teacher.id, 'something else')
+    db.session.delete(db.session.get(Video, video.id))  # Cascades to its notification
+    db.session.commit()
+    assert counter(teacher) == 1
+
+    db.session.execute(db.update(User).values(unread_notifications=99))
+    db.session.commit()
+    recount_unread()
+    assert counter(teacher) == 1
+
+
+def test_pagination_newest_first(app):
+    user = User(username='reader', password_hash='x', role='student')
+    db.session.add(user)
+    db.session.commit()
+    for i in range(25):
+        notifications.notify(user.id, f'note {i}')
+    first, second = notification_page(user.id, 1, 20), notification_page(user.id, 2, 20)
+    assert first.items[0].message == 'note 24' and first.has_next
+    assert [n.message for n in second.items] == [f'note {i}' for i in range(4, -1, -1)]
+    assert notification_page(user.id, 9, 20).items == []
+
+
+def test_migration_backfills_counter(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'counters.db'}"
+    init_database(app)
+    migrate.init_app(app, db, directory=MIGRATIONS, render_as_batch=True)
+    with app.app_context():
+        upgrade(directory=MIGRATIONS, revision='0002_hot_path_indexes')
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO user (id, username, password_hash, role) VALUES (1, 'a', 'x', 'teacher')")
+            conn.exec_driver_sql("INSERT INTO notification (user_id, message, is_read) VALUES (1, 'x', 0), (1, 'y', 0), "
+                                 "(1, 'z', 1)")
+        upgrade(directory=MIGRATIONS)
+        assert db.session.get(User, 1).unread_notifications == 2
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,106 @@
+"""
+Bulk user import: parsing, validation report, enrollments and the hashing pool.
+Run with: python -m pytest test_provisioning.py
+"""
+import io
+
+import pytest
+from werkzeug.security import check_password_hash
+
+from extensions import db
+from models import Classroom, User
+from provisioning import hash_passwords, hash_pool, parse_import, provision_users
+
+CSV = """username,password,parent_email,classes
+alice,pw-alice,mum@example.com,Physics
+bob,pw-bob,,Physics;Maths
+alice,again,,
+carol,,,
+dave,pw-dave,,Chemistry
+taken,pw,,
+erin,pw-erin,not-an-email,
+"""
+
+
+def make_classes(teacher):
+    other = User(username='other', password_hash='x', role='teacher')
+    db.session.add(other)
+    db.session.flush()
+    db.session.add_all([Classroom(name='Physics', teacher_id=teacher.id), Classroom(name='Maths', teacher_id=teacher.id),
+                        Classroom(name='Chemistry', teacher_id=other.id)])
+    db.session.add(User(username='taken', password_hash='x', role='student'))
+    db.session.commit()
+
+
+def test_parse_import_csv_and_json():
+    rows = parse_import(CSV.encode('utf-8-sig'), 'students.csv')
+    assert rows[0] == (2, {'username': 'alice', 'password': 'pw-alice', 'parent_email': 'mum@example.com',
+                           'classes': 'Physics'})
+    assert parse_import('{"users": [{"username": "a", "password": "b", "classes": [1, 2]}]}') == \
+        [(1, {'username': 'a', 'password': 'b', 'classes': [1, 2]})]
+    with pytest.raises(ValueError):
+        parse_import('name,password\nx,y\n')
+
+
+def test_teacher_import_reports_bad_rows(client, login):
+    teacher = login('teacher')
+    make_classes(teacher)
+    response = client.post('/api/teacher/import_students',
+                           data={'file': (io.BytesIO(CSV.encode()), 'students.csv')})
+    assert response.status_code == 200
+    report = response.json
+    assert (report['created'], report['enrolled']) == (2, 3)
+    assert [(e['line'], e['error']) for e in report['errors']] == [
+        (4, 'Duplicate username in file'),
+        (5, 'Missing password'),
+        (6, "Unknown class 'Chemistry'"),  # Another teacher's class
+        (7, 'Username already exists'),
+        (8, 'Invalid parent_email'),
+    ]
+
+    bob = User.query.filter_by(username='bob').one()
+    assert bob.role == 'student' and bob.check_password('pw-bob')
+    assert sorted(c.name for c in bob.enrolled_classes) == ['Maths', 'Physics']
+    assert db.session.get(User, teacher.id).xp == 20 * 2 + 15 * 3
+
+
+def test_import_roles(client, login):
+    login('teacher')
+    response = client.post('/api/teacher/import_students', json=[{'username': 't2', 'password': 'x', 'role': 'teacher'}])
+    assert response.json['errors'][0]['error'] == "Role 'teacher' not allowed here"
+    client.get('/logout')
+
+    login('admin')
+    response = client.post('/api/admin/import_users', json=[{'username': 't2', 'password': 'x'},
+                                                            {'username': 's2', 'password': 'x', 'role': 'student'}])
+    assert response.json['created'] == 2
+    assert {u.username: u.role for u in User.query.filter(User.username.in_(['t2', 's2']))} == \
+        {'t2': 'teacher', 's2': 'student'}
+    assert client.post('/api/admin/import_users', data='not,a\nheader,row').status_code == 400
+
+
+def test_hash_pool_keeps_order():
+    passwords = [f'password-{i}' for i in range(8)]
+    hashes = hash_passwords(passwords, workers=2)
+    assert all(check_password_hash(h, p) for h, p in zip(hashes, passwords))
+
+
+def test_hash_pool_is_shared_and_not_forked(app):
+    passwords = [f'password-{i}' for i in range(8)]
+    hash_pool.workers = 2
+    assert hash_pool._pool is None  # Nothing starts with the app
+    hash_passwords(passwords)
+    pool = hash_pool._pool
+    assert pool._mp_context.get_start_method() == 'forkserver'
+    hashes = hash_passwords(passwords)
+    assert hash_pool._pool is pool and all(check_password_hash(h, p) for h, p in zip(hashes, passwords))
+    hash_pool.shutdown()
+
+
+def test_cli_import(app, tmp_path):
+    path = tmp_path / 'teachers.json'
+    path.write_text('[{"username": "t1", "password": "x"}, {"username": "", "password": "x"}]')
+    result = app.test_cli_runner().invoke(args=['import-users', str(path), '--role', 'teacher', '--workers', '1'])
+    assert 'Created 1 user(s), 0 enrollment(s), 1 row(s) skipped' in result.output
+    assert User.query.filter_by(username='t1').one().role == 'teacher'
+    assert provision_users([(1, {'username': 't1', 'password': 'x'})], workers=1)['created'] == 0
@@ -0,0 +1,95 @@
+"""
+EXPLAIN QUERY PLAN checks for the route queries.
+
+Builds a database from the migrations and asserts that SQLite answers every
+hot-path query through an index rather than a full table scan.
+Run with: python -m pytest test_query_plans.py
+"""
+import os
+from datetime import date, datetime
+
+import pytest
+from flask import Flask
+from flask_migrate import upgrade
+
+from extensions import db, migrate
+from models import (Attendance, ChatMessage, Classroom, Comment, Notification, Playlist, Question, Quiz,
+                    QuizResult, TranscodeJob, UploadSession, User, Video, VideoRecommendation, ViewAnalytics,
+                    playlist_videos, student_classes)
+from reports import view_rows_query
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}"
+    db.init_app(app)
+    migrate.init_app(app, db, directory=MIGRATIONS, render_as_batch=True)
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+        yield app
+        db.session.remove()
+
+
+def query_plan(query):
+    statement = getattr(query, 'statement', query)
+    sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    rows = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')).all()
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan):
+    # "SCAN t" is a table scan; "SCAN t USING INDEX ..." walks an index in order
+    return [step for step in plan if step.startswith('SCAN') and 'USING' not in step
+            and 'CONSTANT ROW' not in step and 'SUBQUERY' not in step]
+
+
+NOW = datetime(2026, 1, 1)
+
+# Each entry mirrors a query issued by a route, worker or report
+ROUTE_QUERIES = {
+    'teacher videos': lambda: Video.query.filter_by(uploader_id=1),
+    'latest completed videos': lambda: Video.query.filter_by(status='completed').order_by(Video.upload_date.desc()).limit(20),
+    'teacher playlists': lambda: Playlist.query.filter_by(creator_id=1),
+    'student directory': lambda: User.query.filter_by(role='student'),
+    'unread notifications': lambda: Notification.query.filter_by(user_id=1, is_read=False).with_entities(db.func.count()),
+    'notification list': lambda: Notification.query.filter_by(user_id=1).order_by(Notification.id.desc()).limit(20),
+    'teacher classes': lambda: Classroom.query.filter_by(teacher_id=1),
+    'teacher quizzes': lambda: Quiz.query.filter_by(teacher_id=1),
+    'quiz questions': lambda: Question.query.filter_by(quiz_id=1),
+    'teacher chat count': lambda: ChatMessage.query.filter_by(user_id=1).with_entities(db.func.count()),
+    'top-level comments': lambda: Comment.query.filter_by(video_id=1, parent_id=None).filter(Comment.id < 100).order_by(Comment.id.desc()).limit(21),
+    'related videos': lambda: Video.query.join(VideoRecommendation, VideoRecommendation.related_id == Video.id).filter(
+        VideoRecommendation.video_id == 1, Video.status == 'completed').order_by(VideoRecommendation.rank).limit(5),
+    'comment replies': lambda: Comment.query.filter_by(parent_id=1).filter(Comment.id > 5).order_by(Comment.id),
+    'attendance today': lambda: Attendance.query.filter_by(student_id=1, classroom_id=1, date=date(2026, 1, 1)),
+    'recent attendance': lambda: Attendance.query.filter_by(student_id=1).order_by(Attendance.date.desc()).limit(3),
+    'quizzes taken': lambda: QuizResult.query.filter_by(student_id=1),
+    'quiz report': lambda: QuizResult.query.filter_by(quiz_id=1),
+    'earlier view by user': lambda: db.session.query(ViewAnalytics.query.filter(
+        ViewAnalytics.video_id == 1, ViewAnalytics.user_id == 1, ViewAnalytics.start_time >= NOW).exists()),
+    'views by student': lambda: ViewAnalytics.query.filter_by(user_id=1),
+    'chat history page': lambda: ChatMessage.query.filter(ChatMessage.classroom_id == 1, ChatMessage.id < 500)
+        .order_by(ChatMessage.id.desc()).limit(50),
+    'transcode claim': lambda: TranscodeJob.query.filter(TranscodeJob.status == 'pending', TranscodeJob.run_after <= NOW)
+        .order_by(TranscodeJob.priority.asc(), TranscodeJob.created_at.asc()).limit(5),
+    'jobs of a video': lambda: TranscodeJob.query.filter_by(video_id=1),
+    'playlists of a video': lambda: db.select(playlist_videos).where(playlist_videos.c.video_id == 1),
+    'class roster': lambda: db.select(student_classes).where(student_classes.c.classroom_id == 1),
+    'class videos': lambda: Video.query.filter_by(classroom_id=1),
+    'upload sessions': lambda: UploadSession.query.filter_by(user_id=1),
+    'analytics report': lambda: view_rows_query(1, {'video_id': None, 'student_id': None, 'start': None, 'end': None}),
+}
+
+
+@pytest.mark.parametrize('name', sorted(ROUTE_QUERIES))
+def test_route_query_uses_index(app, name):
+    plan = query_plan(ROUTE_QUERIES[name]())
+    assert not full_scans(plan), f'{name} scans a table: {plan}'
+
+
+def test_attendance_is_unique_per_student_class_day(app):
+    indexes = {ix['name']: ix for ix in db.inspect(db.engine).get_indexes('attendance')}
+    assert indexes['uq_attendance_student_class_date']['unique']
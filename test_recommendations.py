@@ -0,0 +1,131 @@
+"""
+Related-video index: TF-IDF, playlist and co-viewing signals, incremental refresh.
+Run with: python -m pytest test_recommendations.py
+"""
+from sqlalchemy import event
+
+import recommendations
+
+from extensions import db
+from models import Playlist, Question, Quiz, User, Video, VideoRecommendation, ViewAnalytics
+from recommendations import feature_matrix, nearest, rebuild_recommendations, refresh_queue, refresh_recommendations, \
+    related_videos
+
+
+def make_videos(teacher, *titles, status='completed'):
+    videos = [Video(title=title, filename=f'{i}.mp4', uploader_id=teacher.id, status=status)
+              for i, title in enumerate(titles)]
+    db.session.add_all(videos)
+    db.session.commit()
+    return videos
+
+
+def make_teacher():
+    teacher = User(username='teacher', password_hash='x', role='teacher')
+    db.session.add(teacher)
+    db.session.commit()
+    return teacher
+
+
+def titles(videos):
+    return [v.title for v in videos]
+
+
+def test_signals_rank_neighbours(app):
+    teacher = make_teacher()
+    newton, forces, chemistry, poetry, acids = make_videos(
+        teacher, 'Newton laws of motion', 'Forces and Newton laws', 'Organic chemistry', 'Romantic poetry',
+        'Lab safety')
+    make_videos(teacher, 'Newton laws revision', status='failed')
+
+    # Quiz text links acids to chemistry; a playlist links poetry and acids
+    quiz = Quiz(title='Acids', teacher_id=teacher.id, video_id=acids.id)
+    db.session.add(quiz)
+    db.session.flush()
+    db.session.add(Question(quiz_id=quiz.id, text='Which organic chemistry reaction?', option_a='a', option_b='b',
+                            option_c='c', option_d='d', correct_option='A'))
+    playlist = Playlist(title='Mixed', creator_id=teacher.id)
+    playlist.videos.extend([poetry, acids])
+    db.session.add(playlist)
+    db.session.commit()
+
+    assert rebuild_recommendations() == (5, 6)  # Three related pairs, both ways
+    assert titles(related_videos(newton)) == ['Forces and Newton laws']
+    assert titles(related_videos(chemistry)) == ['Lab safety']
+    # A shared playlist outweighs a partial text match
+    assert titles(related_videos(acids)) == ['Romantic poetry', 'Organic chemistry']
+    scores = {r.related_id: r.score for r in VideoRecommendation.query.filter_by(video_id=acids.id)}
+    assert scores[poetry.id] > scores[chemistry.id] > 0
+
+
+def test_coviewing_and_refresh(app):
+    teacher = make_teacher()
+    algebra, geometry, history = make_videos(teacher, 'Algebra one', 'Geometry one', 'History of Rome')
+    students = [User(username=f's{i}', password_hash='x', role='student') for i in range(3)]
+    db.session.add_all(students)
+    db.session.flush()
+    for student in students[:2]:
+        for video in (algebra, history):
+            db.session.add(ViewAnalytics(user_id=student.id, video_id=video.id))
+    db.session.add(ViewAnalytics(user_id=students[2].id, video_id=geometry.id))
+    db.session.commit()
+    rebuild_recommendations()
+    assert titles(related_videos(algebra)) == ['History of Rome', 'Geometry one']  # Shared viewers beat "one"
+
+    late, = make_videos(teacher, 'History of Rome part two')
+    assert refresh_recommendations(late.id) == 2  # Itself and "History of Rome"; algebra is untouched
+    assert titles(related_videos(late)) == ['History of Rome']
+    assert titles(related_videos(history))[0] == 'History of Rome part two'
+    assert refresh_recommendations(9999) == 0
+
+
+def test_refresh_queue_batches(app, monkeypatch):
+    teacher = make_teacher()
+    make_videos(teacher, 'Cells', 'Plant cells', 'Animal cells')
+    rebuild_recommendations()
+    plant, animal = make_videos(teacher, 'Plant cells two', 'Animal cells two')
+    builds = []
+    monkeypatch.setattr(recommendations, 'feature_matrix', lambda: builds.append(1) or feature_matrix())
+    app.config.update(RECOMMEND_REFRESH_ASYNC=True, RECOMMEND_REFRESH_DELAY=3600)
+
+    refresh_queue.add(app, plant.id)  # Returns at once; nothing is read yet
+    refresh_queue.add(app, animal.id)
+    assert builds == [] and VideoRecommendation.query.filter_by(video_id=plant.id).count() == 0
+    refresh_queue._timer.cancel()
+    refresh_queue._run(app)  # What the timer does when it fires
+    assert builds == [1]  # One feature matrix for the whole batch
+    assert titles(related_videos(plant))[0] == 'Plant cells'
+    assert titles(related_videos(animal))[0] == 'Animal cells'
+
+
+def test_nearest_matches_brute_force(app):
+    teacher = make_teacher()
+    make_videos(teacher, *[f'topic {i % 7} unit {i % 5} part {i % 3}' for i in range(40)])
+    video_ids, X = feature_matrix()
+    neighbours = nearest(X, list(range(len(video_ids))), video_ids, top_k=4)
+    scores = X @ X.T
+    for i, video_id in enumerate(video_ids):
+        expected = sorted((s for j, s in enumerate(scores[i]) if j != i and s > 1e-6), reverse=True)[:4]
+        assert [round(s, 5) for _, s in neighbours[video_id]] == [round(float(s), 5) for s in expected]
+
+
+def test_watch_lookup_and_fallback(app):
+    teacher = make_teacher()
+    first, second, _ = make_videos(teacher, 'Waves', 'Waves and sound', 'Unrelated')
+    make_videos(teacher, 'Draft', status='processing')
+    assert titles(related_videos(first)) == ['Unrelated', 'Waves and sound']  # Not indexed yet: same uploader
+
+    rebuild_recommendations()
+    db.session.refresh(first)
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        assert titles(related_videos(first)) == ['Waves and sound']
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert len(statements) == 1
+
+    db.session.delete(second)
+    db.session.commit()
+    assert VideoRecommendation.query.count() == 0
@@ -0,0 +1,64 @@
+"""
+Full-text search: results follow the access rules of the pages they link to.
+Run with: python -m pytest test_search.py
+"""
+import routes.student
+from extensions import db
+from models import Classroom, Comment, Playlist, Question, Quiz, User, Video
+from search import install_search_index
+
+
+def test_hits_respect_class_enrollment(client, login):
+    assert install_search_index()
+    teacher = User(username='teacher', password_hash='x', role='teacher')
+    db.session.add(teacher)
+    db.session.flush()
+    enrolled, other = Classroom(name='A', teacher_id=teacher.id), Classroom(name='B', teacher_id=teacher.id)
+    db.session.add_all([enrolled, other])
+    db.session.flush()
+    quizzes = [Quiz(title=f'Optics {name}', teacher_id=teacher.id, classroom_id=classroom_id)
+               for name, classroom_id in (('mine', enrolled.id), ('hidden', other.id), ('open', None))]
+    db.session.add_all(quizzes)
+    db.session.flush()
+    db.session.add(Question(quiz_id=quizzes[1].id, text='Which optics lens answer?', option_a='a', option_b='b',
+                            option_c='c', option_d='d', correct_option='A'))
+    ready = Video(title='Lenses', filename='a.mp4', uploader_id=teacher.id, status='completed')
+    draft = Video(title='Draft', filename='b.mp4', uploader_id=teacher.id, status='processing')
+    db.session.add_all([ready, draft])
+    db.session.flush()
+    db.session.add_all([Comment(content='optics rocks', user_id=teacher.id, video_id=video.id)
+                        for video in (ready, draft)])
+    db.session.commit()
+    student = login('student')
+    student.enrolled_classes.append(enrolled)
+    db.session.commit()
+
+    results = client.get('/api/search?q=optics').json['results']
+    seen = {(r['kind'], r['title']) for r in results}
+    assert seen == {('quiz', 'Optics mine'), ('quiz', 'Optics open'), ('comment', 'Lenses')}
+
+    client.get('/logout')
+    login('admin')
+    kinds = sorted(r['kind'] for r in client.get('/api/search?q=optics').json['results'])
+    assert kinds == ['comment', 'question', 'quiz', 'quiz', 'quiz']
+
+
+def test_dashboard_search_renders_cached_shapes(client, login, monkeypatch):
+    assert install_search_index()
+    teacher = User(username='teacher', password_hash='x', role='teacher')
+    db.session.add(teacher)
+    db.session.flush()
+    video = Video(title='Optics basics', filename='a.mp4', uploader_id=teacher.id, status='completed')
+    playlist = Playlist(title='Optics', creator_id=teacher.id)
+    playlist.videos.append(video)
+    db.session.add_all([video, playlist])
+    db.session.commit()
+    login('student')
+    rendered = []
+    monkeypatch.setattr(routes.student, 'render_template', lambda template, **context: rendered.append(context) or '')
+
+    client.get('/student')
+    client.get('/student?q=optics')
+    browse, searched = rendered
+    assert searched['videos'] == browse['videos'] and searched['playlists'] == browse['playlists']
+    assert isinstance(searched['playlists'][0]['videos'][0], dict)
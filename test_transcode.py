@@ -0,0 +1,44 @@
+"""
+Transcode command building: one decode for every rung, sprite sheets and the poster.
+Run with: python -m pytest test_transcode.py
+"""
+from transcode import DEFAULT_HLS_LADDER, DEFAULT_THUMBNAILS, build_hls_command, select_ladder, thumbnail_size, \
+    write_preview_track
+
+
+def test_thumbnails_share_the_decode(tmp_path):
+    rungs = select_ladder(DEFAULT_HLS_LADDER, 720)
+    thumbnails = dict(DEFAULT_THUMBNAILS, size=(160, 90), dir=str(tmp_path / 'thumbs'))
+    cmd, variants = build_hls_command('in.mp4', str(tmp_path), rungs, True, '64k', thumbnails=thumbnails)
+
+    assert cmd.count('-i') == 1 and variants == ['240p', '480p', '720p', 'audio']
+    graph = cmd[cmd.index('-filter_complex') + 1]
+    assert graph.startswith('[0:v]split=5[v0][v1][v2][v3][v4];')
+    assert '[v3]fps=1/5,scale=160:90,tile=5x5[sprites]' in graph
+    assert '[v4]fps=1,thumbnail=60,scale=-2:720[poster]' in graph
+    # The image outputs come after the HLS output, so libx264 options do not apply to them
+    hls_output = cmd.index(str(tmp_path / '%v' / 'index.m3u8'))
+    assert cmd.index('[sprites]') > hls_output and cmd[-1] == str(tmp_path / 'thumbnail.jpg')
+    assert cmd[cmd.index('[poster]'):].count('-frames:v') == 1
+
+    plain, _ = build_hls_command('in.mp4', str(tmp_path), rungs, True)
+    assert plain[plain.index('-filter_complex') + 1].startswith('[0:v]split=3[v0][v1][v2];')
+
+
+def test_thumbnail_size():
+    assert thumbnail_size(1920, 1080, 160) == (160, 90)
+    assert thumbnail_size(720, 1280, 160) == (160, 284)  # Portrait
+    assert thumbnail_size(0, 0, 161) == (160, 90)
+
+
+def test_preview_track(tmp_path):
+    path = tmp_path / 'thumbnails.vtt'
+    assert write_preview_track(path, 3.2, 1, 5, (160, 90), 5, 5) == 1  # Shorter than one interval
+    assert path.read_text() == 'WEBVTT\n\n00:00:00.000 --> 00:00:03.200\nsprite_000.jpg#xywh=0,0,160,90\n'
+
+    assert write_preview_track(path, 3725, 2, 5, (160, 90), 5, 5) == 50  # Capped by the sheets written
+    cues = path.read_text().split('\n\n')[1:]
+    assert cues[6] == '00:00:30.000 --> 00:00:35.000\nsprite_000.jpg#xywh=160,90,160,90'
+    assert cues[25].endswith('sprite_001.jpg#xywh=0,0,160,90')
+    assert write_preview_track(path, 3725, 30, 5, (160, 90), 5, 5) == 745
+    assert path.read_text().rstrip().endswith('01:02:00.000 --> 01:02:05.000\nsprite_029.jpg#xywh=640,270,160,90')
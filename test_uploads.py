@@ -0,0 +1,84 @@
+"""
+Uploads: finalize claims the session once, abandoned sessions expire, progress streams miss nothing.
+Run with: python -m pytest test_uploads.py
+"""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm.attributes import set_committed_value
+
+import routes.videos
+from events import broker
+from extensions import db
+from models import TranscodeJob, UploadChunk, UploadSession
+from uploads import expire_uploads, part_path
+
+DATA = b'lesson' * 1000
+
+
+@pytest.fixture
+def app_config(app_config):
+    return dict(app_config, TRANSCODE_IN_PROCESS=False)  # Jobs are written but no ffmpeg worker starts
+
+
+def start_upload(client, data=DATA):
+    created = client.post('/api/uploads', json={'filename': 'lesson.mp4', 'size': len(data)}).json
+    assert client.patch(created['location'], data=data, headers={'Upload-Offset': '0'}).status_code == 204
+    return created
+
+
+def test_finalize_is_claimed_once(client, login, monkeypatch):
+    login('teacher')
+    created = start_upload(client)
+    lookup = routes.videos.get_upload_or_404
+
+    def raced(upload_id):
+        # Read before the other finalize call claimed the session, as a concurrent request would
+        upload = lookup(upload_id)
+        UploadSession.query.filter_by(id=upload_id).update({'status': 'finalizing'}, synchronize_session=False)
+        set_committed_value(upload, 'status', 'uploading')
+        return upload
+    monkeypatch.setattr(routes.videos, 'get_upload_or_404', raced)
+    response = client.post(f"{created['location']}/finalize")
+    assert response.status_code == 409 and TranscodeJob.query.count() == 0
+    monkeypatch.undo()
+
+    UploadSession.query.filter_by(id=created['upload_id']).update({'status': 'uploading'})
+    db.session.commit()
+    assert client.post(f"{created['location']}/finalize").json['success']
+    assert client.post(f"{created['location']}/finalize").status_code == 409
+
+
+def test_abandoned_uploads_expire(app, client, login):
+    login('teacher')
+    old, fresh = start_upload(client), start_upload(client)
+    UploadSession.query.filter_by(id=old['upload_id']).update({'updated_at': datetime.utcnow() - timedelta(hours=30)})
+    db.session.commit()
+    tmp = app.config['UPLOAD_TMP_FOLDER']
+
+    assert expire_uploads(tmp, 24) == 1
+    assert not os.path.exists(part_path(tmp, old['upload_id'])) and os.path.exists(part_path(tmp, fresh['upload_id']))
+    assert [u.id for u in UploadSession.query] == [fresh['upload_id']]
+    assert UploadChunk.query.filter_by(upload_id=old['upload_id']).count() == 0
+    assert client.get(old['location']).status_code == 404
+
+
+def test_processing_stream_keeps_progress_sent_during_the_snapshot(client, login, monkeypatch):
+    user = login('teacher')
+    channel = f'uploads:{user.id}'
+    snapshot = routes.videos._processing_snapshot
+
+    def racing(user_id):
+        rows = snapshot(user_id)
+        broker.publish(channel, 'progress', {'id': 1, 'status': 'processing', 'progress': 40})
+        return rows
+    monkeypatch.setattr(routes.videos, '_processing_snapshot', racing)
+    response = client.get('/api/teacher/processing_stream', buffered=False)
+    assert next(response.response).startswith(b'retry:')
+    assert next(response.response).startswith(b'event: progress\n')
+    response.close()
+    assert broker.subscriber_count(channel) == 0
+
+    client.head('/api/teacher/processing_stream').close()  # The body, and so the generator, never runs
+    assert broker.subscriber_count(channel) == 0
@@ -0,0 +1,342 @@
+import glob
+import json
+import math
+import os
+import subprocess
+import tempfile
+import time
+
+from assets import asset_folder, claim_asset, complete_asset, link_video, unclaim_asset
+from cache import invalidate_catalog
+from events import publish_progress
+from extensions import db
+from jobs import TranscodeDeferred
+from models import TranscodeJob, User, Video
+
+
+# Adaptive bitrate ladder, lowest rung first. Override per deployment with HLS_LADDER.
+# Rungs taller than the source are skipped so nothing is ever upscaled.
+DEFAULT_HLS_LADDER = [
+    {'name': '240p', 'height': 240, 'video_bitrate': '400k', 'audio_bitrate': '64k', 'profile': 'baseline'},
+    {'name': '480p', 'height': 480, 'video_bitrate': '1000k', 'audio_bitrate': '96k', 'profile': 'main'},
+    {'name': '720p', 'height': 720, 'video_bitrate': '2800k', 'audio_bitrate': '128k', 'profile': 'main'},
+    {'name': '1080p', 'height': 1080, 'video_bitrate': '5000k', 'audio_bitrate': '128k', 'profile': 'high'},
+]
+
+# Seek-preview sprites: one frame every `interval` seconds, `width` px wide, tiled columns x rows per sheet
+DEFAULT_THUMBNAILS = {'interval': 5, 'width': 160, 'columns': 5, 'rows': 5, 'poster_window': 60}
+
+
+class TranscodeError(Exception):
+    """Raised when ffmpeg fails so the job queue can retry the video."""
+
+
+def get_video_duration(input_path):
+    """Get video duration using ffprobe."""
+    try:
+        cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', input_path]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        return float(result.stdout.strip())
+    except:
+        return 0
+
+def probe_video(input_path):
+    """Read duration, video height and whether there is an audio track with a single ffprobe call."""
+    info = {'duration': 0, 'width': 0, 'height': 0, 'has_audio': False}
+    try:
+        cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration:stream=codec_type,width,height',
+               '-of', 'json', input_path]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        data = json.loads(result.stdout or '{}')
+    except Exception:
+        return info
+    info['duration'] = float(data.get('format', {}).get('duration') or 0)
+    for stream in data.get('streams', []):
+        if stream.get('codec_type') == 'video' and not info['height']:
+            info['width'] = int(stream.get('width') or 0)
+            info['height'] = int(stream.get('height') or 0)
+        elif stream.get('codec_type') == 'audio':
+            info['has_audio'] = True
+    return info
+
+def select_ladder(ladder, source_height):
+    """Return the rungs that fit the source. A source smaller than every rung gets one native-height rung."""
+    ladder = sorted(ladder, key=lambda rung: rung['height'])
+    if not source_height:
+        return ladder
+    rungs = [rung for rung in ladder if rung['height'] <= source_height]
+    if not rungs:
+        # Keep the height even, libx264 requires it
+        rungs = [dict(ladder[0], height=source_height - source_height % 2)]
+    return rungs
+
+def _bitrate_kbps(value):
+    value = str(value).lower()
+    if value.endswith('m'):
+        return int(float(value[:-1]) * 1000)
+    return int(float(value.rstrip('k')))
+
+def thumbnail_size(source_width, source_height, width):
+    """Even (width, height) of a sprite tile that keeps the source aspect ratio (16:9 if unknown)."""
+    width -= width % 2
+    if not source_width or not source_height:
+        return width, round(width * 9 / 16 / 2) * 2
+    return width, max(2, round(width * source_height / source_width / 2) * 2)
+
+def build_hls_command(input_path, output_dir, rungs, has_audio, audio_only_bitrate=None, segment_seconds=10,
+                      thumbnails=None):
+    """Build one ffmpeg invocation that decodes the source once and encodes every rung.
+
+    The decoded video is fanned out with a split filter, each branch is scaled and
+    encoded separately, and ffmpeg's HLS muxer writes one media playlist per
+    variant plus a real master playlist (master.m3u8) that references them all.
+    Keyframes are forced on segment boundaries so players can switch rungs cleanly.
+
+    With `thumbnails` (DEFAULT_THUMBNAILS plus 'size' and 'dir'), two more
+    branches of the same decode write the seek-preview sprite sheets
+    (thumbs/sprite_NNN.jpg) and the poster, thumbnail.jpg: the most
+    representative frame of the first poster_window seconds, picked by ffmpeg's
+    thumbnail filter, which also works on clips shorter than the window.
+    """
+    count = len(rungs)
+    branches = count + (2 if thumbnails else 0)
+    outputs = ''.join(f'[v{i}]' for i in range(branches))
+    graph = [f'[0:v]split={branches}{outputs}']
+    for i, rung in enumerate(rungs):
+        graph.append(f"[v{i}]scale=-2:{rung['height']}[v{i}out]")
+    if thumbnails:
+        width, height = thumbnails['size']
+        graph.append(f"[v{count}]fps=1/{thumbnails['interval']},scale={width}:{height},"
+                     f"tile={thumbnails['columns']}x{thumbnails['rows']}[sprites]")
+        graph.append(f"[v{count + 1}]fps=1,thumbnail={thumbnails['poster_window']},"
+                     f"scale=-2:{rungs[-1]['height']}[poster]")
+
+    # Machine-readable key=value progress on stdout; only real errors on stderr
+    cmd = ['ffmpeg', '-y', '-nostats', '-loglevel', 'error', '-progress', 'pipe:1',
+           '-i', input_path, '-filter_complex', ';'.join(graph)]
+    for i, rung in enumerate(rungs):
+        cmd += ['-map', f'[v{i}out]']
+        if has_audio:
+            cmd += ['-map', '0:a:0']
+    if has_audio and audio_only_bitrate:
+        cmd += ['-map', '0:a:0']
+
+    cmd += ['-c:v', 'libx264', '-preset', 'veryfast', '-sc_threshold', '0',
+            '-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})']
+    for i, rung in enumerate(rungs):
+        kbps = _bitrate_kbps(rung['video_bitrate'])
+        cmd += [f'-b:v:{i}', f'{kbps}k', f'-maxrate:v:{i}', f'{int(kbps * 1.07)}k',
+                f'-bufsize:v:{i}', f'{int(kbps * 1.5)}k', f'-profile:v:{i}', rung.get('profile', 'main')]
+
+    stream_map = []
+    if has_audio:
+        cmd += ['-c:a', 'aac', '-ac', '2']
+        for i, rung in enumerate(rungs):
+            cmd += [f'-b:a:{i}', rung.get('audio_bitrate', '128k')]
+            stream_map.append(f"v:{i},a:{i},name:{rung['name']}")
+        if audio_only_bitrate:
+            cmd += [f'-b:a:{count}', audio_only_bitrate]
+            stream_map.append(f'a:{count},name:audio')
+    else:
+        stream_map = [f"v:{i},name:{rung['name']}" for i, rung in enumerate(rungs)]
+
+    cmd += [
+        '-f', 'hls', '-hls_time', str(segment_seconds), '-hls_list_size', '0',
+        '-hls_playlist_type', 'vod', '-start_number', '0',
+        '-hls_segment_filename', os.path.join(output_dir, '%v', 'seg_%03d.ts'),
+        '-master_pl_name', 'master.m3u8',
+        '-var_stream_map', ' '.join(stream_map),
+        os.path.join(output_dir, '%v', 'index.m3u8')
+    ]
+    if thumbnails:
+        cmd += ['-map', '[sprites]', '-c:v', 'mjpeg', '-q:v', '5', '-fps_mode', 'passthrough',
+                '-f', 'image2', '-start_number', '0', os.path.join(thumbnails['dir'], 'sprite_%03d.jpg')]
+        cmd += ['-map', '[poster]', '-frames:v', '1', '-c:v', 'mjpeg', '-q:v', '3', '-update', '1',
+                os.path.join(output_dir, 'thumbnail.jpg')]
+    return cmd, [entry.rsplit('name:', 1)[1] for entry in stream_map]
+
+def _vtt_time(seconds):
+    millis = int(round(seconds * 1000))
+    return f'{millis // 3600000:02d}:{millis // 60000 % 60:02d}:{millis // 1000 % 60:02d}.{millis % 1000:03d}'
+
+def write_preview_track(path, duration, sheets, interval, size, columns, rows):
+    """Write a WebVTT thumbnails track: one cue per sprite tile, pointing at it with a #xywh fragment.
+
+    Sprite URLs are relative to the track, so it must sit next to the sheets.
+    Returns the number of cues written.
+    """
+    width, height = size
+    per_sheet = columns * rows
+    cues = min(sheets * per_sheet, max(1, math.ceil(duration / interval)))
+    lines = ['WEBVTT', '']
+    for i in range(cues):
+        sheet, tile = divmod(i, per_sheet)
+        x, y = tile % columns * width, tile // columns * height
+        lines.append(f'{_vtt_time(i * interval)} --> {_vtt_time(min((i + 1) * interval, duration))}')
+        lines.append(f'sprite_{sheet:03d}.jpg#xywh={x},{y},{width},{height}')
+        lines.append('')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines))
+    return cues
+
+def iter_progress(stream):
+    """Yield one dict per ffmpeg -progress block. Every block ends with a progress=continue|end line."""
+    block = {}
+    for line in stream:
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            continue
+        block[key] = value
+        if key == 'progress':
+            yield block
+            block = {}
+
+def parse_progress(block, duration):
+    """Turn a -progress block into (percent, speed, eta_seconds). Fields ffmpeg reports as N/A become None."""
+    try:
+        # out_time_ms is misnamed by ffmpeg and is also in microseconds
+        elapsed = int(block.get('out_time_us') or block.get('out_time_ms')) / 1000000
+    except (TypeError, ValueError):
+        elapsed = None
+    try:
+        speed = float(block.get('speed', '').rstrip('x'))
+    except ValueError:
+        speed = None
+
+    percent = eta = None
+    if elapsed is not None and duration > 0:
+        percent = max(0, min(98, int(elapsed / duration * 100)))
+        if speed:
+            eta = max(0, int((duration - elapsed) / speed))
+    return percent, speed, eta
+
+def process_video(app, video_id, input_path):
+    """Convert a video to HLS and update progress. Runs inside a queue worker's app context."""
+    video = Video.query.get(video_id)
+    if not video: return
+
+    asset = video.asset
+    if asset is not None:
+        if asset.status == 'completed':
+            # The same bytes were already transcoded for another upload
+            link_video(video, asset)
+            db.session.commit()
+            publish_progress(video)
+            invalidate_catalog()
+            print(f"Video {video_id} reuses the outputs of an identical upload.")
+            _finish(app, video_id, input_path)
+            return
+        # One job at a time owns an asset's encode; the others wait for its outputs
+        if not claim_asset(asset):
+            raise TranscodeDeferred('an identical upload is being transcoded',
+                                    app.config.get('TRANSCODE_DEDUP_WAIT', 30))
+        try:
+            _transcode(app, video, asset, input_path)
+        except Exception:
+            db.session.rollback()
+            unclaim_asset(asset.id)
+            raise
+        return
+    _transcode(app, video, None, input_path)
+
+def _transcode(app, video, asset, input_path):
+    video_id = video.id
+    video.status = 'processing'
+    video.processing_progress = 5
+    db.session.commit()
+    publish_progress(video)
+
+    source = probe_video(input_path)
+    duration = source['duration']
+
+    output_dir = app.config['HLS_FOLDER']
+    # Uploads with a content digest share one output directory per distinct file
+    folder = asset_folder(asset) if asset is not None else str(video_id)
+    video_hls_dir = os.path.join(output_dir, folder)
+    os.makedirs(video_hls_dir, exist_ok=True)
+    output_playlist = os.path.join(video_hls_dir, 'master.m3u8')
+
+    rungs = select_ladder(app.config.get('HLS_LADDER', DEFAULT_HLS_LADDER), source['height'])
+    audio_only_bitrate = app.config.get('HLS_AUDIO_ONLY_BITRATE', '64k') if app.config.get('HLS_AUDIO_ONLY', True) else None
+    thumbs_dir = os.path.join(video_hls_dir, 'thumbs')
+    os.makedirs(thumbs_dir, exist_ok=True)
+    thumbnails = dict(DEFAULT_THUMBNAILS, **app.config.get('THUMBNAILS', {}), dir=thumbs_dir)
+    thumbnails['size'] = thumbnail_size(source['width'], source['height'], thumbnails['width'])
+    cmd, variants = build_hls_command(input_path, video_hls_dir, rungs, source['has_audio'],
+                                      audio_only_bitrate, app.config.get('HLS_SEGMENT_SECONDS', 10), thumbnails)
+    for variant in variants:
+        os.makedirs(os.path.join(video_hls_dir, variant), exist_ok=True)
+
+    # Live progress is pushed to subscribers every PROGRESS_PUBLISH_INTERVAL seconds without
+    # touching the database; a checkpoint is committed only every PROGRESS_CHECKPOINT_INTERVAL.
+    publish_interval = app.config.get('PROGRESS_PUBLISH_INTERVAL', 0.5)
+    checkpoint_interval = app.config.get('PROGRESS_CHECKPOINT_INTERVAL', 30)
+    job = TranscodeJob.query.filter_by(video_id=video_id, status='processing').first()
+    last_publish = last_checkpoint = time.monotonic()
+
+    with tempfile.TemporaryFile(mode='w+') as errors:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=errors, text=True, bufsize=65536)
+        for block in iter_progress(process.stdout):
+            percent, speed, eta = parse_progress(block, duration)
+            if percent is not None and percent > video.processing_progress:
+                video.processing_progress = percent
+            if job:
+                job.speed = speed
+                job.eta_seconds = eta
+
+            now = time.monotonic()
+            if now - last_publish >= publish_interval:
+                publish_progress(video, speed=speed, eta_seconds=eta)
+                last_publish = now
+            if now - last_checkpoint >= checkpoint_interval:
+                db.session.commit()
+                last_checkpoint = now
+
+        process.wait()
+        errors.seek(0)
+        error_tail = errors.read()[-2000:].strip()
+
+    if process.returncode != 0:
+        raise TranscodeError(f"FFmpeg failed with return code {process.returncode}: {error_tail}")
+
+    # Poster and sprite sheets came out of the same ffmpeg run; only the track is left to write
+    thumbnail_path = os.path.join(video_hls_dir, 'thumbnail.jpg')
+    sheets = len(glob.glob(os.path.join(thumbs_dir, 'sprite_*.jpg')))
+    if sheets and duration > 0:
+        write_preview_track(os.path.join(thumbs_dir, 'thumbnails.vtt'), duration, sheets, thumbnails['interval'],
+                            thumbnails['size'], thumbnails['columns'], thumbnails['rows'])
+        video.preview_track_path = f'hls/{folder}/thumbs/thumbnails.vtt'
+
+    # Check if file exists
+    if os.path.exists(output_playlist):
+        video.hls_playlist_path = f'hls/{folder}/master.m3u8'
+
+    if os.path.exists(thumbnail_path):
+        video.thumbnail_path = f'hls/{folder}/thumbnail.jpg'
+
+    video.status = 'completed'
+    video.processing_progress = 100
+    waiting = complete_asset(asset, video) if asset is not None else []
+
+    # Award XP
+    uploader = User.query.get(video.uploader_id)
+    if uploader:
+        uploader.xp += 50
+
+    db.session.commit()
+    for finished in [video, *waiting]:
+        publish_progress(finished)
+    invalidate_catalog()
+    print(f"Video {video_id} processed successfully.")
+    _finish(app, video_id, input_path)
+
+def _finish(app, video_id, input_path):
+    from recommendations import refresh_queue  # Imported here so numpy stays out of startup
+    refresh_queue.add(app, video_id)
+
+    # Delete original video AFTER successful commit
+    try:
+        if os.path.exists(input_path):
+            os.remove(input_path)
+    except Exception as e:
+        print(f"Error deleting original video: {e}")
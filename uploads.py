@@ -0,0 +1,129 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+
+from werkzeug.utils import secure_filename
+
+from extensions import db
+from models import UploadChunk, UploadSession
+
+# Bytes copied per read when streaming a chunk to disk; bounds memory per request
+COPY_BUFFER_SIZE = 1024 * 1024
+ALLOWED_EXTENSIONS = {'mp4', 'mov', 'avi', 'mkv'}
+ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+# Digest that identifies a video's bytes for upload deduplication
+CONTENT_HASH = 'blake2b'
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def allowed_image_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_IMAGE_EXTENSIONS
+
+def timestamped_name(filename):
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    return f"{timestamp}_{secure_filename(filename)}"
+
+def save_stream(stream, path, algorithm=CONTENT_HASH):
+    """Copy an upload stream to `path`, hashing it on the way. Returns (hexdigest, size)."""
+    hasher = hashlib.new(algorithm)
+    size = 0
+    with open(path, 'wb') as f:
+        for block in iter(lambda: stream.read(COPY_BUFFER_SIZE), b''):
+            hasher.update(block)
+            f.write(block)
+            size += len(block)
+    return hasher.hexdigest(), size
+
+
+def part_path(folder, upload_id):
+    return os.path.join(folder, f'{upload_id}.part')
+
+def create_part_file(path, size):
+    """Preallocate a (sparse) file of the final size so chunks can land at any offset."""
+    with open(path, 'wb') as f:
+        f.truncate(size)
+
+def expire_uploads(tmp_folder, hours):
+    """Delete chunked uploads idle for more than `hours` before being finalized, with their part files.
+
+    Returns the number of sessions removed. Finalized sessions are kept; their
+    part file has already been moved into UPLOAD_FOLDER.
+    """
+    cutoff = datetime.utcnow() - timedelta(hours=hours)
+    stale = [upload_id for upload_id, in db.session.query(UploadSession.id).filter(
+        UploadSession.status.in_(['uploading', 'finalizing']), UploadSession.updated_at < cutoff)]
+    for upload_id in stale:
+        path = part_path(tmp_folder, upload_id)
+        if os.path.exists(path): os.remove(path)
+    if stale:
+        UploadChunk.query.filter(UploadChunk.upload_id.in_(stale)).delete(synchronize_session=False)
+        UploadSession.query.filter(UploadSession.id.in_(stale)).delete(synchronize_session=False)
+        db.session.commit()
+    return len(stale)
+
+def write_chunk(path, offset, stream, length):
+    """Copy `length` bytes from a request stream into the part file at `offset`.
+
+    Returns the number of bytes actually written, which is short if the client
+    disconnected mid-chunk.
+    """
+    written = 0
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        while written < length:
+            data = stream.read(min(COPY_BUFFER_SIZE, length - written))
+            if not data:
+                break
+            f.write(data)
+            written += len(data)
+    return written
+
+def merge_ranges(ranges):
+    """Merge (start, end) byte ranges, end exclusive, into a sorted list of disjoint ranges."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def contiguous_offset(ranges):
+    """Length of the unbroken prefix received so far; where a sequential client should resume."""
+    merged = merge_ranges(ranges)
+    return merged[0][1] if merged and merged[0][0] == 0 else 0
+
+def missing_ranges(ranges, total_size):
+    missing = []
+    position = 0
+    for start, end in merge_ranges(ranges):
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < total_size:
+        missing.append([position, total_size])
+    return missing
+
+def parse_checksum(value):
+    """Split 'algorithm:hexdigest' (bare hex means sha256). Raises ValueError if unsupported."""
+    algorithm, sep, digest = value.partition(':')
+    if not sep:
+        algorithm, digest = 'sha256', value
+    algorithm = algorithm.lower()
+    if algorithm not in hashlib.algorithms_guaranteed or algorithm.startswith('shake') or not digest:
+        raise ValueError(f'Unsupported checksum: {value}')
+    return algorithm, digest.lower()
+
+def file_digest(path, algorithm='sha256'):
+    return file_digests(path, algorithm)[algorithm]
+
+def file_digests(path, *algorithms):
+    """{algorithm: hexdigest} for several algorithms in a single read of the file."""
+    hashers = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+            for hasher in hashers.values():
+                hasher.update(block)
+    return {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}